@@ -303,9 +303,22 @@ def register():
                                                                  ('new', 'new', '')))
 
     IDStore.rigify_force_widget_update = bpy.props.BoolProperty(name="Force Widget Update",
-                                                                description="Forces Rigify to delete and rebuild all the rig widgets. if unset, only missing widgets will be created",
+                                                                description="Forces Rigify to rebuild all the rig widgets. If unset, only missing widgets and widgets whose shape changed are built",
                                                                 default=False)
 
+    IDStore.rigify_incremental_update = bpy.props.BoolProperty(name="Incremental Update",
+                                                               description="Only rebuild the rigs whose metarig bones changed since the target rig was last generated",
+                                                               default=True)
+
+    IDStore.rigify_profile = bpy.props.BoolProperty(name="Profile Generation",
+                                                    description="Records time, operator calls and mode switches of every rig during generation, and writes them to a json report",
+                                                    default=False)
+
+    IDStore.rigify_profile_path = bpy.props.StringProperty(name="Profile Report",
+                                                           description="File the json profile report is written to. If unset, 'rigify_profile.json' in the temporary directory is used",
+                                                           subtype='FILE_PATH',
+                                                           default="")
+
     IDStore.rigify_target_rigs = bpy.props.CollectionProperty(type=RigifyName)
     IDStore.rigify_target_rig = bpy.props.StringProperty(name="Rigify Target Rig",
                                                          description="Defines which rig to overwrite. If unset, a new one called 'rig' will be created",
@@ -329,12 +342,16 @@ def register():
         bpy.context.user_preferences.addons['POErigify'].preferences.legacy_mode = True
 
     # Add rig parameters
-    for rig in rig_lists.rig_list:
-        r = utils.get_rig_type(rig)
-        try:
-            r.add_parameters(RigifyParameters)
-        except AttributeError:
-            pass
+    if hasattr(rig_lists, 'register_parameters'):
+        # Added as the rig types are loaded
+        rig_lists.register_parameters(RigifyParameters)
+    else:
+        for rig in rig_lists.rig_list:
+            r = utils.get_rig_type(rig)
+            try:
+                r.add_parameters(RigifyParameters)
+            except AttributeError:
+                pass
 
 
 def unregister():
@@ -348,6 +365,9 @@ def unregister():
     del IDStore.rigify_advanced_generation
     del IDStore.rigify_generate_mode
     del IDStore.rigify_force_widget_update
+    del IDStore.rigify_incremental_update
+    del IDStore.rigify_profile
+    del IDStore.rigify_profile_path
     del IDStore.rigify_target_rig
     del IDStore.rigify_target_rigs
     del IDStore.rigify_rig_uis
@@ -357,6 +377,9 @@ def unregister():
     del IDStore.rigify_transfer_start_frame
     del IDStore.rigify_transfer_end_frame
 
+    if hasattr(rig_lists, 'unregister_parameters'):
+        rig_lists.unregister_parameters()
+
     bpy.utils.unregister_class(RigifyName)
     bpy.utils.unregister_class(RigifyParameters)
 
@@ -0,0 +1,274 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+"""
+Headless batch rig generation.
+
+Generates the rigs of a list of .blend files in background Blender
+processes, using the same generate.generate_rig() as the Generate Rig
+button, and writes one json report of timings and failures:
+
+    blender -b --python batch_generate.py -- [options] JOB [JOB ...]
+
+A JOB is a .blend file, optionally followed by ':' and the name of the
+metarig object (all metarigs of the file are generated otherwise) and
+'=' and the name of the rig to overwrite.  Without a rig name, a file
+with a single metarig overwrites the Rigify target rig saved in the file,
+and the metarigs of a file with several are generated into new rigs.
+Options:
+    -j, --jobs N        number of worker Blender processes (cpu count)
+    -l, --list FILE     read more JOBs from FILE, one per line
+    -o, --output-dir D  save the generated files to D (next to the input,
+                        as <name>_rig.blend, if unset)
+    -r, --report FILE   json report (rigify_batch_report.json)
+    -p, --profile       add a generation profile per metarig to the report
+
+The add-on must be installed, so it can be imported by its folder name.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+ADDON_NAME = os.path.basename(os.path.dirname(os.path.abspath(__file__)))
+
+
+#=============================================
+# Worker, one per .blend file
+#=============================================
+
+def get_metarigs(specs):
+    """ Returns (metarig object, target rig name) pairs for the given
+        'metarig[=rig]' specs, or all armatures with rigify types of the
+        open file if there are none.
+    """
+    import bpy
+
+    if specs:
+        metarigs = []
+        for spec in specs:
+            name, sep, target = spec.partition("=")
+            metarigs.append((bpy.data.objects[name], target if sep else None))
+        return metarigs
+    return [(obj, None) for obj in bpy.data.objects
+            if obj.type == 'ARMATURE' and obj.pose
+            and any(pbone.rigify_type for pbone in obj.pose.bones)]
+
+
+def run_worker(args):
+    """ Generates the rigs of the file Blender was started with, saves it
+        and writes a json result for the batch to collect.
+    """
+    import addon_utils
+    import bpy
+    import importlib
+
+    addon_utils.enable(ADDON_NAME, default_set=True)
+    generate = importlib.import_module(ADDON_NAME + ".generate")
+    profiler_module = importlib.import_module(ADDON_NAME + ".profiler")
+
+    context = bpy.context
+    result = {'file': bpy.data.filepath, 'output': args.output, 'rigs': [], 'error': None}
+
+    id_store = context.window_manager
+    saved_target = id_store.rigify_target_rig
+    saved_mode = id_store.rigify_generate_mode
+
+    try:
+        metarigs = get_metarigs(args.metarig)
+        for metarig, target in metarigs:
+            rig = {'metarig': metarig.name, 'time': 0.0, 'error': None}
+            result['rigs'].append(rig)
+
+            # generate_rig() sets the target rig to the rig it generated,
+            # reset it so metarigs don't overwrite each other's rigs
+            id_store.rigify_generate_mode = saved_mode
+            if target is not None:
+                id_store.rigify_target_rig = target
+            elif len(metarigs) == 1:
+                id_store.rigify_target_rig = saved_target
+            else:
+                id_store.rigify_target_rig = ""
+                id_store.rigify_generate_mode = 'new'
+
+            if context.mode != 'OBJECT':
+                bpy.ops.object.mode_set(mode='OBJECT')
+            context.scene.objects.active = metarig
+            metarig.select = True
+
+            profiler = profiler_module.GenerateProfiler() if args.profile else None
+            start = time.time()
+            try:
+                if profiler:
+                    with profiler:
+                        generate.generate_rig(context, metarig, profiler)
+                    rig['profile'] = profiler.report()
+                else:
+                    generate.generate_rig(context, metarig)
+            except Exception:
+                rig['error'] = traceback.format_exc()
+            rig['time'] = time.time() - start
+            rig['target'] = id_store.rigify_target_rig
+
+        id_store.rigify_generate_mode = saved_mode
+        bpy.ops.wm.save_as_mainfile(filepath=args.output)
+    except Exception:
+        result['error'] = traceback.format_exc()
+
+    with open(args.result, 'w') as f:
+        json.dump(result, f, indent=4)
+
+
+#=============================================
+# Batch, run the workers and collect results
+#=============================================
+
+def parse_job(job):
+    """ Splits a 'file.blend[:metarig[=rig]]' job into (filepath, metarig spec).
+    """
+    filepath, sep, metarig = job.partition(".blend:")
+    if sep:
+        return filepath + ".blend", metarig
+    return job, None
+
+
+def get_output_path(filepath, output_dir):
+    name, ext = os.path.splitext(os.path.basename(filepath))
+    return os.path.join(output_dir or os.path.dirname(filepath), name + "_rig" + ext)
+
+
+def run_job(blender, filepath, metarigs, output, profile):
+    """ Generates the rigs of one .blend file in a background Blender
+        process and returns its result.
+    """
+    fd, result_path = tempfile.mkstemp(prefix="rigify_batch_", suffix=".json")
+    os.close(fd)
+
+    command = [blender, "-b", filepath, "--python", os.path.abspath(__file__), "--",
+               "--worker", "--output", output, "--result", result_path]
+    for name in metarigs:
+        command += ["--metarig", name]
+    if profile:
+        command.append("--profile")
+
+    start = time.time()
+    process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    elapsed = time.time() - start
+
+    try:
+        with open(result_path) as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        result = {'file': filepath, 'output': output, 'rigs': [],
+                  'error': "Blender exited with code %d without a result" % process.returncode}
+    finally:
+        os.remove(result_path)
+
+    result['time'] = elapsed
+    result['returncode'] = process.returncode
+    if result['error'] or any(rig['error'] for rig in result['rigs']):
+        result['log'] = process.stdout.decode(errors='replace')
+    return result
+
+
+def run_batch(args):
+    import bpy
+
+    jobs = list(args.jobs)
+    if args.list:
+        with open(args.list) as f:
+            jobs += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+    # Group metarigs by file, so each file is opened once
+    files = {}
+    for job in jobs:
+        filepath, metarig = parse_job(job)
+        filepath = os.path.abspath(filepath)
+        metarigs = files.setdefault(filepath, [])
+        if metarig:
+            metarigs.append(metarig)
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=args.workers or os.cpu_count()) as pool:
+        futures = [pool.submit(run_job, bpy.app.binary_path, filepath, metarigs,
+                               get_output_path(filepath, args.output_dir), args.profile)
+                   for filepath, metarigs in files.items()]
+        results = []
+        for future in futures:
+            result = future.result()
+            results.append(result)
+            status = "failed" if result['error'] or any(r['error'] for r in result['rigs']) else "ok"
+            print("Rigify batch: %s %s (%.1fs)" % (status, result['file'], result['time']))
+
+    rigs = [rig for result in results for rig in result['rigs']]
+    report = {
+        'time': time.time() - start,
+        'files': len(results),
+        'rigs': len(rigs),
+        'failed_files': [r['file'] for r in results if r['error']],
+        'failed_rigs': ["%s:%s" % (r['file'], rig['metarig']) for r in results for rig in r['rigs'] if rig['error']],
+        'results': results,
+    }
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=4)
+
+    print("Rigify batch: %d rigs of %d files in %.1fs, %d failed, report: %s" % (
+        report['rigs'], report['files'], report['time'],
+        len(report['failed_files']) + len(report['failed_rigs']), args.report))
+    return not (report['failed_files'] or report['failed_rigs'])
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="blender -b --python batch_generate.py --",
+                                     description="Generates the rigs of .blend files in background Blender processes.")
+    parser.add_argument("jobs", nargs="*", metavar="JOB", help="file.blend or file.blend:metarig[=rig]")
+    parser.add_argument("-j", "--jobs", dest="workers", type=int, default=0, help="number of worker processes")
+    parser.add_argument("-l", "--list", help="file with one JOB per line")
+    parser.add_argument("-o", "--output-dir", help="directory for the generated files")
+    parser.add_argument("-r", "--report", default="rigify_batch_report.json", help="json report file")
+    parser.add_argument("-p", "--profile", action="store_true", help="profile every generation")
+    # Worker options, used by the batch itself
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--metarig", action="append", default=[], help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    args = parse_args(argv)
+    if args.worker:
+        run_worker(args)
+    elif not run_batch(args):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
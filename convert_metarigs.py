@@ -0,0 +1,124 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+"""
+Converts Python metarigs, as written by utils.write_metarig(), to the
+compact data format of metarig_data:
+
+    blender -b --python convert_metarigs.py -- [options] [FILE.py ...]
+
+Every metarig is built in an empty armature by its create() function and
+written next to it as FILE.json, which the Add > Armature menu then uses
+instead of the Python module.  Without files, all the metarigs of the
+add-on's metarigs folder are converted.
+Options:
+    -r, --remove    delete the Python files that were converted
+
+The add-on must be installed, so it can be imported by its folder name.
+"""
+
+import argparse
+import importlib
+import importlib.util
+import os
+import sys
+import traceback
+
+ADDON_DIR = os.path.dirname(os.path.abspath(__file__))
+ADDON_NAME = os.path.basename(ADDON_DIR)
+
+
+def get_metarig_files():
+    """ Returns the Python metarig files of the add-on.
+    """
+    metarig_dir = os.path.join(ADDON_DIR, "metarigs")
+    files = []
+    for root, dirs, names in os.walk(metarig_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("_"))
+        files += [os.path.join(root, f) for f in sorted(names)
+                  if f.endswith(".py") and f != "__init__.py"]
+    return files
+
+
+def convert_metarig(filepath, metarig_data):
+    """ Builds the metarig of a Python metarig file and writes it as a
+        data file.  Returns the path of the data file.
+    """
+    import bpy
+
+    spec = importlib.util.spec_from_file_location("rigify_metarig_convert", filepath)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    if bpy.context.mode != 'OBJECT':
+        bpy.ops.object.mode_set(mode='OBJECT')
+    arm = bpy.data.armatures.new("metarig")
+    obj = bpy.data.objects.new("metarig", arm)
+    bpy.context.scene.objects.link(obj)
+    bpy.context.scene.objects.active = obj
+
+    try:
+        module.create(obj)
+        text = metarig_data.write_metarig_data(obj, layers=True, groups=True)
+    finally:
+        if bpy.context.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+        bpy.context.scene.objects.unlink(obj)
+        bpy.data.objects.remove(obj)
+        bpy.data.armatures.remove(arm)
+
+    output = os.path.splitext(filepath)[0] + metarig_data.FILE_EXTENSION
+    with open(output, 'w') as f:
+        f.write(text)
+    return output
+
+
+def main():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(prog="blender -b --python convert_metarigs.py --",
+                                     description="Converts Python metarigs to the compact data format.")
+    parser.add_argument("files", nargs="*", metavar="FILE", help="Python metarig file")
+    parser.add_argument("-r", "--remove", action="store_true", help="delete the converted Python files")
+    args = parser.parse_args(argv)
+
+    import addon_utils
+    addon_utils.enable(ADDON_NAME, default_set=True)
+    rig_lists = importlib.import_module(ADDON_NAME + ".rig_lists")
+    metarig_data = importlib.import_module(ADDON_NAME + ".metarig_data")
+    rig_lists.ensure_rig_parameters()
+
+    failed = 0
+    for filepath in args.files or get_metarig_files():
+        try:
+            output = convert_metarig(os.path.abspath(filepath), metarig_data)
+        except Exception:
+            failed += 1
+            print("Rigify convert: failed %s\n%s" % (filepath, traceback.format_exc()))
+            continue
+        print("Rigify convert: %s -> %s" % (filepath, output))
+        if args.remove:
+            os.remove(filepath)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -19,20 +19,27 @@
 # <pep8 compliant>
 
 import bpy
+import hashlib
+import json
 import re
 import time
 import traceback
 import sys
 from rna_prop_ui import rna_idprop_ui_prop_get
 
-from .utils import MetarigError, new_bone, get_rig_type
-from .utils import ORG_PREFIX, MCH_PREFIX, DEF_PREFIX, WGT_PREFIX, ROOT_NAME, make_original_name
+from .utils import MetarigError, new_bone, copy_armature_bones, get_rig_type, ensure_mode, sort_bones
+from .utils import GenerationContext
+from .utils import ORG_PREFIX, MCH_PREFIX, DEF_PREFIX, WGT_PREFIX, ROOT_NAME, make_original_name, strip_org
 from .utils import RIG_DIR
-from .utils import create_root_widget
+from .utils import create_root_widget, reset_widget_meshes, remove_orphan_widgets
 from .utils import random_id
-from .utils import copy_attributes
+from .utils import copy_attributes, copy_keyframe_points
 from .utils import gamma_correct
-from .rig_ui_template import UI_SLIDERS, layers_ui, UI_REGISTER
+from .profiler import measure, get_rig_type_name
+from .rig_lists import get_rig_parameter_names, ensure_rig_parameters
+from .rig_ui_template import UI_SLIDERS, UI_REGISTER
+from .rig_ui_runtime import UI_DATA_PROP, get_layer_rows, make_ui_data
+from .rigs.utils import LIMB_REGISTRY_PROP, make_limb_registry
 
 
 RIG_MODULE = "rigs"
@@ -42,23 +49,43 @@ DEF_LAYER = [n == 29 for n in range(0, 32)]  # Armature layer that deformation b
 ROOT_LAYER = [n == 28 for n in range(0, 32)]  # Armature layer that root bone should be moved to.
 WGT_LAYERS = [x == 19 for x in range(0, 20)]  # Widgets go on the last scene layer.
 
+# Generation phases in the order they are run, with the armature mode each
+# phase expects.  Rig types opt in to phased generation by defining any of
+# these methods; they are then run for a whole batch of rigs at once, so the
+# armature switches mode once per phase instead of once per rig.
+# Rig types defining none of them are generated through Rig.generate().
+GENERATE_PHASES = (
+    ('plan', 'EDIT'),                    # gather and validate data, no changes
+    ('generate_bones', 'EDIT'),          # create and parent edit bones
+    ('generate_constraints', 'OBJECT'),  # pose bone settings and constraints
+    ('generate_drivers', 'OBJECT'),      # custom properties and drivers
+    ('generate_widgets', 'OBJECT'),      # widgets, and the ui script if any
+)
+
 
 class Timer:
-    def __init__(self):
+    def __init__(self, profiler=None):
         self.timez = time.time()
+        self.profiler = profiler
+        if profiler:
+            self.start = profiler.snapshot()
 
     def tick(self, string):
         t = time.time()
         print(string + "%.3f" % (t - self.timez))
         self.timez = t
+        if self.profiler:
+            self.profiler.add('stage', string.rstrip(": "), self.start)
+            self.start = self.profiler.snapshot()
 
 
 # TODO: generalize to take a group as input instead of an armature.
-def generate_rig(context, metarig):
+def generate_rig(context, metarig, profiler=None):
     """ Generates a rig from a metarig.
-
+        The stages, phases and rigs of the generation are recorded with
+        profiler, a profiler.GenerateProfiler, if given.
     """
-    t = Timer()
+    t = Timer(profiler)
 
     # Random string with time appended so that
     # different rigs don't collide id's
@@ -73,6 +100,10 @@ def generate_rig(context, metarig):
 
     scene = context.scene
     id_store = context.window_manager
+
+    # Load the rig types of the metarig, so their parameters are registered
+    ensure_rig_parameters(set(pbone.rigify_type for pbone in metarig.pose.bones))
+
     #------------------------------------------
     # Create/find the rig object and set it up
 
@@ -107,30 +138,46 @@ def generate_rig(context, metarig):
     id_store.rigify_target_rig = obj.name
     obj.data.pose_position = 'POSE'
 
-    # Get rid of anim data in case the rig already existed
-    print("Clear rig animation data.")
-    obj.animation_data_clear()
+    # Hash every rig of the metarig, so an overwritten rig only needs to
+    # rebuild the rigs that changed since it was last generated.
+    rig_owners = get_rig_owners(metarig)
+    rig_hashes = get_rig_hashes(metarig, rig_owners)
+    metarig_hash = get_metarig_hash(metarig, rig_owners)
+
+    # Rigs to rebuild, None rebuilds the whole armature
+    changed_rigs = None
+    if id_store.rigify_generate_mode == 'overwrite' \
+    and id_store.rigify_incremental_update \
+    and not id_store.rigify_force_widget_update:
+        changed_rigs = get_changed_rigs(obj, metarig_hash, rig_hashes)
+
+    if changed_rigs is None:
+        # Get rid of anim data in case the rig already existed
+        print("Clear rig animation data.")
+        obj.animation_data_clear()
+        stored_bones = {}
+        stored_scripts = {}
+        incoming_bones = None
+    else:
+        print("Incremental update of rigs: " + ", ".join(sorted(changed_rigs)))
+        stored_bones = json.loads(obj.data["rigify_rig_bones"])
+        stored_scripts = json.loads(obj.data["rigify_rig_scripts"])
+        # Metarig bones that have to be copied over again
+        incoming_bones = set(name for name, root in rig_owners.items() if root in changed_rigs)
 
     # Select generated rig object
     metarig.select = False
     obj.select = True
     scene.objects.active = obj
 
-    # Remove wgts if force update is set
+    # Shared widget meshes are looked up again, or rebuilt on force update
+    reset_widget_meshes(release=id_store.rigify_force_widget_update)
+
+    # Widgets are kept, and rebuilt by create_widget() if their shape
+    # changed.  Follow a renamed rig.
     wgts_group_name = "WGTS_" + (rig_old_name or obj.name)
-    if wgts_group_name in scene.objects and id_store.rigify_force_widget_update:
-        bpy.ops.object.select_all(action='DESELECT')
-        for i, lyr in enumerate(WGT_LAYERS):
-            if lyr:
-                context.scene.layers[i] = True
-        for wgt in bpy.data.objects[wgts_group_name].children:
-            wgt.select = True
-        bpy.ops.object.delete(use_global=False)
-        for i, lyr in enumerate(WGT_LAYERS):
-            if lyr:
-                context.scene.layers[i] = False
-        if rig_old_name:
-            bpy.data.objects[wgts_group_name].name = "WGTS_" + obj.name
+    if rig_old_name and wgts_group_name in scene.objects and "WGTS_" + obj.name not in bpy.data.objects:
+        bpy.data.objects[wgts_group_name].name = "WGTS_" + obj.name
 
     wgts_group_name = "WGTS_" + obj.name
 
@@ -139,33 +186,24 @@ def generate_rig(context, metarig):
     for child in obj.children:
         childs[child] = child.parent_bone
 
-    # Remove all bones from the generated rig armature.
-    bpy.ops.object.mode_set(mode='EDIT')
-    for bone in obj.data.edit_bones:
-        obj.data.edit_bones.remove(bone)
-    bpy.ops.object.mode_set(mode='OBJECT')
-
-    # Create temporary duplicates for merging
-    temp_rig_1 = metarig.copy()
-    temp_rig_1.data = metarig.data.copy()
-    scene.objects.link(temp_rig_1)
-
-    temp_rig_2 = metarig.copy()
-    temp_rig_2.data = obj.data
-    scene.objects.link(temp_rig_2)
-
-    # Select the temp rigs for merging
-    for objt in scene.objects:
-        objt.select = False  # deselect all objects
-    temp_rig_1.select = True
-    temp_rig_2.select = True
-    scene.objects.active = temp_rig_2
+    # Remove all bones from the generated rig armature, or only the bones
+    # of the rigs that are rebuilt.
+    if changed_rigs is None:
+        removed_bones = None
+    else:
+        removed_bones = set()
+        for root in changed_rigs:
+            removed_bones.update(stored_bones.pop(root, []))
+        remove_bone_drivers(obj, removed_bones)
 
-    # Merge the temporary rigs
-    bpy.ops.object.join()
+    ensure_mode(obj, 'EDIT')
+    for bone in obj.data.edit_bones:
+        if removed_bones is None or bone.name in removed_bones:
+            obj.data.edit_bones.remove(bone)
 
-    # Delete the second temp rig
-    bpy.ops.object.delete()
+    # Copy the metarig bones, or those of the rigs that are rebuilt,
+    # in the same edit session
+    copy_armature_bones(metarig, obj, incoming_bones)
 
     # Select the generated rig
     for objt in scene.objects:
@@ -175,6 +213,8 @@ def generate_rig(context, metarig):
 
     # Copy over bone properties
     for bone in metarig.data.bones:
+        if incoming_bones is not None and bone.name not in incoming_bones:
+            continue
         bone_gen = obj.data.bones[bone.name]
 
         # B-bone stuff
@@ -184,27 +224,37 @@ def generate_rig(context, metarig):
 
     # Copy over the pose_bone properties
     for bone in metarig.pose.bones:
+        if incoming_bones is not None and bone.name not in incoming_bones:
+            continue
         bone_gen = obj.pose.bones[bone.name]
 
-        # Rotation mode and transform locks
+        # Rotation mode, pose and transform locks
         bone_gen.rotation_mode = bone.rotation_mode
+        bone_gen.location = tuple(bone.location)
+        bone_gen.rotation_quaternion = tuple(bone.rotation_quaternion)
+        bone_gen.rotation_euler = tuple(bone.rotation_euler)
+        bone_gen.rotation_axis_angle = tuple(bone.rotation_axis_angle)
+        bone_gen.scale = tuple(bone.scale)
         bone_gen.lock_rotation = tuple(bone.lock_rotation)
         bone_gen.lock_rotation_w = bone.lock_rotation_w
         bone_gen.lock_rotations_4d = bone.lock_rotations_4d
         bone_gen.lock_location = tuple(bone.lock_location)
         bone_gen.lock_scale = tuple(bone.lock_scale)
 
-        # rigify_type and rigify_parameters
+        # rigify_type and rigify_parameters, only the parameters of the
+        # bone's rig type are copied
         bone_gen.rigify_type = bone.rigify_type
-        for prop in dir(bone_gen.rigify_parameters):
-            if (not prop.startswith("_")) \
-            and (not prop.startswith("bl_")) \
-            and (prop != "rna_type"):
-                try:
-                    setattr(bone_gen.rigify_parameters, prop, \
-                            getattr(bone.rigify_parameters, prop))
-                except AttributeError:
-                    print("FAILED TO COPY PARAMETER: " + str(prop))
+        param_names = get_rig_parameter_names(bone.rigify_type) if bone.rigify_type else []
+        if param_names is None:
+            # Unknown rig type, copy all
+            param_names = [prop for prop in dir(bone_gen.rigify_parameters)
+                           if not prop.startswith("_") and not prop.startswith("bl_") and prop != "rna_type"]
+        for prop in param_names:
+            try:
+                setattr(bone_gen.rigify_parameters, prop, \
+                        getattr(bone.rigify_parameters, prop))
+            except AttributeError:
+                print("FAILED TO COPY PARAMETER: " + str(prop))
 
         # Custom properties
         for prop in bone.keys():
@@ -219,13 +269,16 @@ def generate_rig(context, metarig):
             copy_attributes(con1, con2)
 
             # Set metarig target to rig target
-            if "target" in dir(con2):
+            if hasattr(con2, "target"):
                 if con2.target == metarig:
                     con2.target = obj
 
     # Copy drivers
     if metarig.animation_data:
         for d1 in metarig.animation_data.drivers:
+            # Drivers of rigs that are not rebuilt are still in place
+            if incoming_bones is not None and get_path_bone_name(d1.data_path) not in incoming_bones:
+                continue
             d2 = obj.driver_add(d1.data_path)
             copy_attributes(d1, d2)
             copy_attributes(d1.driver, d2.driver)
@@ -259,16 +312,15 @@ def generate_rig(context, metarig):
                         tar.data_path = "RIGIFY-" + tar.data_path
 
             # Copy key frames
-            for i in range(len(d1.keyframe_points)):
-                d2.keyframe_points.add()
-                k1 = d1.keyframe_points[i]
-                k2 = d2.keyframe_points[i]
-                copy_attributes(k1, k2)
+            copy_keyframe_points(d1, d2)
 
     t.tick("Duplicate rig: ")
     #----------------------------------
     # Make a list of the original bones so we can keep track of them.
-    original_bones = [bone.name for bone in obj.data.bones]
+    if incoming_bones is None:
+        original_bones = [bone.name for bone in obj.data.bones]
+    else:
+        original_bones = [bone.name for bone in metarig.data.bones if bone.name in incoming_bones]
 
     # Add the ORG_PREFIX to the original bones.
     bpy.ops.object.mode_set(mode='OBJECT')
@@ -276,28 +328,40 @@ def generate_rig(context, metarig):
         obj.data.bones[original_bones[i]].name = make_original_name(original_bones[i])
         original_bones[i] = make_original_name(original_bones[i])
 
+    # Merged bones whose metarig parent belongs to a rig that is not rebuilt
+    # lost their parent on the way, hook them up to the existing ORG bone.
+    if incoming_bones is not None:
+        bpy.ops.object.mode_set(mode='EDIT')
+        eb = obj.data.edit_bones
+        for name in incoming_bones:
+            parent = metarig.data.bones[name].parent
+            if parent and parent.name not in incoming_bones \
+            and make_original_name(parent.name) in eb:
+                eb[make_original_name(name)].parent = eb[make_original_name(parent.name)]
+                eb[make_original_name(name)].use_connect = metarig.data.bones[name].use_connect
+        bpy.ops.object.mode_set(mode='OBJECT')
+
     # Create a sorted list of the original bones, sorted in the order we're
     # going to traverse them for rigging.
     # (root-most -> leaf-most, alphabetical)
-    bones_sorted = []
-    for name in original_bones:
-        bones_sorted += [name]
-    bones_sorted.sort()  # first sort by names
-    bones_sorted.sort(key=lambda bone: len(obj.pose.bones[bone].parent_recursive))  # then parents before children
+    bones_sorted = sort_bones(obj.pose.bones, original_bones)
 
     t.tick("Make list of org bones: ")
     #----------------------------------
-    # Create the root bone.
-    bpy.ops.object.mode_set(mode='EDIT')
-    root_bone = new_bone(obj, ROOT_NAME)
-    spread = get_xy_spread(metarig.data.bones) or metarig.data.bones[0].length
-    spread = float('%.3g' % spread)
-    scale = spread/0.589
-    obj.data.edit_bones[root_bone].head = (0, 0, 0)
-    obj.data.edit_bones[root_bone].tail = (0, scale, 0)
-    obj.data.edit_bones[root_bone].roll = 0
-    bpy.ops.object.mode_set(mode='OBJECT')
-    obj.data.bones[root_bone].layers = ROOT_LAYER
+    # Create the root bone, an incremental update keeps the existing one.
+    if ROOT_NAME in obj.data.bones:
+        root_bone = ROOT_NAME
+    else:
+        bpy.ops.object.mode_set(mode='EDIT')
+        root_bone = new_bone(obj, ROOT_NAME)
+        spread = get_xy_spread(metarig.data.bones) or metarig.data.bones[0].length
+        spread = float('%.3g' % spread)
+        scale = spread/0.589
+        obj.data.edit_bones[root_bone].head = (0, 0, 0)
+        obj.data.edit_bones[root_bone].tail = (0, scale, 0)
+        obj.data.edit_bones[root_bone].roll = 0
+        bpy.ops.object.mode_set(mode='OBJECT')
+        obj.data.bones[root_bone].layers = ROOT_LAYER
 
     # Put the rig_name in the armature custom properties
     rna_idprop_ui_prop_get(obj.data, "rig_id", create=True)
@@ -331,24 +395,37 @@ def generate_rig(context, metarig):
 
     #----------------------------------
     try:
-        # Collect/initialize all the rigs.
-        rigs = []
-        for bone in bones_sorted:
-            bpy.ops.object.mode_set(mode='EDIT')
-            rigs += get_bone_rigs(obj, bone)
-        t.tick("Initialize rigs: ")
-
-        # Generate all the rigs.
-        ui_scripts = []
-        for rig in rigs:
-            # Go into editmode in the rig armature
-            bpy.ops.object.mode_set(mode='OBJECT')
-            context.scene.objects.active = obj
-            obj.select = True
-            bpy.ops.object.mode_set(mode='EDIT')
-            scripts = rig.generate()
-            if scripts is not None:
-                ui_scripts += [scripts[0]]
+        # Bone lookups of the rigs go through the generation context
+        with GenerationContext(obj):
+            # Collect/initialize all the rigs, as (metarig bone name, rig) pairs.
+            rigs = []
+            for bone in bones_sorted:
+                ensure_mode(obj, 'EDIT')
+                rigs += [(strip_org(bone), rig) for rig in get_bone_rigs(obj, bone)]
+            t.tick("Initialize rigs: ")
+
+            # Generate all the rigs.
+            # Consecutive phased rigs are generated together, a rig that only
+            # has generate() first completes the pending batch so every rig
+            # still sees the rigs before it fully generated.
+            recorder = RigRecorder(obj, profiler)
+            batch = []
+            for root, rig in rigs:
+                if is_phased_rig(rig):
+                    batch.append((root, rig))
+                    continue
+
+                generate_phases(obj, batch, recorder)
+                batch = []
+
+                with measure(profiler, 'phase', 'generate'):
+                    # Go into editmode in the rig armature
+                    bpy.ops.object.mode_set(mode='OBJECT')
+                    context.scene.objects.active = obj
+                    obj.select = True
+                    bpy.ops.object.mode_set(mode='EDIT')
+                    recorder.call(root, rig.generate)
+            generate_phases(obj, batch, recorder)
         t.tick("Generate rigs: ")
     except Exception as e:
         # Cleanup if something goes wrong
@@ -363,6 +440,27 @@ def generate_rig(context, metarig):
     #----------------------------------
     bpy.ops.object.mode_set(mode='OBJECT')
 
+    # Remember what every rig generated, for the next incremental update.
+    # A rig owns the ORG bones of its metarig bones and the bones it created.
+    rig_order = get_rig_order(metarig, rig_owners)
+    for root in recorder.roots:
+        stored_bones[root] = [make_original_name(name) for name, owner in rig_owners.items() if owner == root]
+        stored_bones[root] += recorder.bones.get(root, [])
+        stored_scripts[root] = recorder.scripts.get(root, [])
+
+    ui_scripts = []
+    for root in rig_order:
+        ui_scripts += stored_scripts.get(root, [])
+
+    obj.data["rigify_metarig_hash"] = metarig_hash
+    obj.data["rigify_rig_hashes"] = rig_hashes
+    # ID properties can't hold lists of strings, keep those as json
+    obj.data["rigify_rig_bones"] = json.dumps({root: stored_bones[root] for root in rig_order if root in stored_bones})
+    rig_scripts = {root: stored_scripts[root] for root in rig_order if root in stored_scripts}
+    obj.data["rigify_rig_scripts"] = json.dumps(rig_scripts)
+    # Limbs of the rig, for the IK/FK animation tools
+    obj.data[LIMB_REGISTRY_PROP] = make_limb_registry(rig_scripts)
+
     # Get a list of all the bones in the armature
     bones = [bone.name for bone in obj.data.bones]
 
@@ -448,18 +546,27 @@ def generate_rig(context, metarig):
     # Create root bone widget
     create_root_widget(obj, "root")
 
+    # Delete the widgets of bones that are gone
+    removed = remove_orphan_widgets(obj, wgts_group_name)
+    if removed:
+        print("Removed %d unused widgets." % removed)
+
     # Assign shapes to bones
     # Object's with name WGT-<bone_name> get used as that bone's shape.
+    # scene.objects can't be indexed by name, so index it once.
+    scene_objects = {ob.name: ob for ob in context.scene.objects}
+    assigned = 0
+    missing = 0
     for bone in bones:
-        wgt_name = (WGT_PREFIX + obj.name + '_' + obj.data.bones[bone].name)[:63]  # Object names are limited to 63 characters... arg
-        if wgt_name in context.scene.objects:
-            # Weird temp thing because it won't let me index by object name
-            for ob in context.scene.objects:
-                if ob.name == wgt_name:
-                    obj.pose.bones[bone].custom_shape = ob
-                    break
-            # This is what it should do:
-            # obj.pose.bones[bone].custom_shape = context.scene.objects[wgt_name]
+        wgt_name = (WGT_PREFIX + obj.name + '_' + bone)[:63]  # Object names are limited to 63 characters... arg
+        wgt = scene_objects.get(wgt_name)
+        if wgt is not None:
+            obj.pose.bones[bone].custom_shape = wgt
+            assigned += 1
+        elif not bone.startswith((ORG_PREFIX, MCH_PREFIX, DEF_PREFIX)) \
+        and obj.pose.bones[bone].custom_shape is None:
+            missing += 1
+    print("Assigned %d bone shapes, %d control bones without a shape." % (assigned, missing))
     # Reveal all the layers with control bones on them
     vis_layers = [False for n in range(0, 32)]
     for bone in bones:
@@ -479,34 +586,58 @@ def generate_rig(context, metarig):
         print(l.name)
         layer_layout += [(l.name, l.row)]
 
-    # Generate the UI script
+    # Store the UI description, drawn by the shared rig UI panels
+    ui_controls = []
+    ui_code = []
+    for s in ui_scripts:
+        if isinstance(s, str):
+            ui_code.append(s)
+        else:
+            ui_controls += s
+    obj.data[UI_DATA_PROP] = make_ui_data(rig_id, ui_controls, get_layer_rows(vis_layers, layer_layout))
+
+    # Rigs returning their UI as code still get a generated UI script
     if id_store.rigify_generate_mode == 'overwrite':
         rig_ui_name = id_store.rigify_rig_ui or 'rig_ui.py'
     else:
         rig_ui_name = 'rig_ui.py'
 
-    if id_store.rigify_generate_mode == 'overwrite' and rig_ui_name in bpy.data.texts.keys():
-        script = bpy.data.texts[rig_ui_name]
-        script.clear()
-    else:
-        script = bpy.data.texts.new("rig_ui.py")
+    if ui_code:
+        if id_store.rigify_generate_mode == 'overwrite' and rig_ui_name in bpy.data.texts.keys():
+            script = bpy.data.texts[rig_ui_name]
+            script.clear()
+        else:
+            script = bpy.data.texts.new("rig_ui.py")
 
-    rig_ui_old_name = ""
-    if id_store.rigify_rig_basename:
-        rig_ui_old_name = script.name
-        script.name = id_store.rigify_rig_basename + "_rig_ui.py"
+        if id_store.rigify_rig_basename:
+            script.name = id_store.rigify_rig_basename + "_rig_ui.py"
 
-    id_store.rigify_rig_ui = script.name
+        id_store.rigify_rig_ui = script.name
 
-    script.write(UI_SLIDERS % rig_id)
-    for s in ui_scripts:
-        script.write("\n        " + s.replace("\n", "\n        ") + "\n")
-    script.write(layers_ui(vis_layers, layer_layout))
-    script.write(UI_REGISTER)
-    script.use_module = True
+        script.write(UI_SLIDERS % rig_id)
+        for s in ui_code:
+            script.write("\n        " + s.replace("\n", "\n        ") + "\n")
+        script.write(UI_REGISTER)
+        script.use_module = True
+
+        # Run UI script
+        exec(script.as_string(), {})
 
-    # Run UI script
-    exec(script.as_string(), {})
+        # Add rig_ui to logic
+        skip = False
+        ctrls = obj.game.controllers
+
+        for c in ctrls:
+            if 'Python' in c.name and c.text.name == script.name:
+                skip = True
+                break
+        if not skip:
+            bpy.ops.logic.controller_add(type='PYTHON', object=obj.name)
+            ctrl = obj.game.controllers[-1]
+            ctrl.text = bpy.data.texts[script.name]
+
+    elif id_store.rigify_generate_mode == 'overwrite' and rig_ui_name in bpy.data.texts.keys():
+        remove_rig_ui_script(obj, bpy.data.texts[rig_ui_name])
 
     # Create Selection Sets
     create_selection_sets(obj, metarig)
@@ -514,20 +645,6 @@ def generate_rig(context, metarig):
     # Create Bone Groups
     create_bone_groups(obj, metarig)
 
-    # Add rig_ui to logic
-    skip = False
-    ctrls = obj.game.controllers
-
-    for c in ctrls:
-        if 'Python' in c.name and c.text.name == script.name:
-            skip = True
-            break
-    if not skip:
-        bpy.ops.logic.controller_add(type='PYTHON', object=obj.name)
-        ctrl = obj.game.controllers[-1]
-        ctrl.text = bpy.data.texts[script.name]
-
-
     t.tick("The rest: ")
     #----------------------------------
     # Deconfigure
@@ -542,6 +659,20 @@ def generate_rig(context, metarig):
             child.parent_bone = sub_parent
             child.matrix_world = mat
 
+
+def remove_rig_ui_script(obj, script):
+    """ Removes the generated UI script of a rig regenerated without one,
+        if it is the script that obj runs from its logic.
+    """
+    ctrls = [c.name for c in obj.game.controllers
+             if c.type == 'PYTHON' and c.text is not None and c.text.name == script.name]
+    if not ctrls:
+        return
+    for name in ctrls:
+        bpy.ops.logic.controller_remove(controller=name, object=obj.name)
+    bpy.data.texts.remove(script, do_unlink=True)
+
+
 def create_selection_sets(obj, metarig):
 
     # Check if selection sets addon is installed
@@ -611,6 +742,290 @@ def create_bone_groups(obj, metarig):
             b.bone_group = obj.pose.bone_groups[name]
 
 
+def is_phased_rig(rig):
+    """ Returns True if the rig implements any of the GENERATE_PHASES.
+    """
+    return any(hasattr(rig, phase) for phase, mode in GENERATE_PHASES)
+
+
+class RigRecorder:
+    """ Runs rig generation methods and keeps track of the bones and the
+        ui scripts each rig generates, by the name of its metarig bone.
+    """
+    def __init__(self, obj, profiler=None):
+        self.obj = obj
+        self.profiler = profiler
+        self.roots = []    # metarig bones of the generated rigs, in order
+        self.bones = {}    # {metarig bone: [generated bone names]}
+        self.scripts = {}  # {metarig bone: [ui scripts]}
+
+    def bone_names(self):
+        if bpy.context.mode == 'EDIT_ARMATURE':
+            return self.obj.data.edit_bones.keys()
+        return self.obj.data.bones.keys()
+
+    def call(self, root, method):
+        """ Calls a generation method of the rig generated from root.
+        """
+        if root not in self.roots:
+            self.roots.append(root)
+
+        before = set(self.bone_names())
+        with measure(self.profiler, 'rig', method.__name__, get_rig_type_name(method.__self__), root):
+            scripts = method()
+        created = [name for name in self.bone_names() if name not in before]
+
+        self.bones.setdefault(root, []).extend(created)
+        if scripts is not None:
+            self.scripts.setdefault(root, []).append(scripts[0])
+
+
+def generate_phases(obj, rigs, recorder):
+    """ Runs the GENERATE_PHASES of a batch of phased rigs, given as
+        (metarig bone name, rig) pairs.
+        Each phase is run for all the rigs before the next phase starts,
+        so the armature only changes mode between phases.
+    """
+    for phase, mode in GENERATE_PHASES:
+        methods = [(root, getattr(rig, phase)) for root, rig in rigs if hasattr(rig, phase)]
+        if not methods:
+            continue
+
+        with measure(recorder.profiler, 'phase', phase):
+            ensure_mode(obj, mode)
+            for root, method in methods:
+                recorder.call(root, method)
+
+
+#=============================================
+# Incremental update
+#=============================================
+
+def get_rig_owners(metarig):
+    """ Maps every metarig bone name to the name of the bone of the rig it
+        belongs to: the closest bone up its parent chain (itself included)
+        that has a rigify_type.  Bones outside any rig map to None.
+    """
+    owners = {}
+    for name in sort_bones(metarig.data.bones):
+        bone = metarig.data.bones[name]
+        if metarig.pose.bones[name].rigify_type.replace(" ", ""):
+            owners[name] = name
+        else:
+            owners[name] = owners[bone.parent.name] if bone.parent else None
+    return owners
+
+
+def get_rig_order(metarig, owners):
+    """ Returns the rig bone names in generation order.
+        (root-most -> leaf-most, alphabetical)
+    """
+    roots = set(owner for owner in owners.values() if owner is not None)
+    return sort_bones(metarig.data.bones, roots)
+
+
+def hashable_value(value):
+    """ Turns an RNA property value into something with a stable repr().
+    """
+    if isinstance(value, float):
+        return round(value, 5)
+    if isinstance(value, (bool, int, str)) or value is None:
+        return value
+    if isinstance(value, bpy.types.ID):
+        return value.name
+    try:
+        return tuple(hashable_value(v) for v in value)
+    except TypeError:
+        return repr(value)
+
+
+def rna_values(struct):
+    """ Returns the (name, value) pairs of the editable properties of an
+        RNA struct, for hashing.  Pointers are reduced to their name.
+    """
+    values = []
+    for prop in struct.bl_rna.properties:
+        if prop.is_readonly or prop.type == 'COLLECTION':
+            continue
+        value = getattr(struct, prop.identifier, None)
+        if prop.type == 'POINTER':
+            value = getattr(value, 'name', None)
+        values.append((prop.identifier, hashable_value(value)))
+    return values
+
+
+def get_rig_hashes(metarig, owners):
+    """ Returns {rig bone name: hash} for all the rigs of the metarig, the
+        hash covering geometry, rig type, parameters, pose settings and
+        constraints of every metarig bone belonging to the rig.
+    """
+    data = {}
+    for bone in metarig.data.bones:
+        root = owners[bone.name]
+        if root is None:
+            continue
+
+        pbone = metarig.pose.bones[bone.name]
+        params = pbone.rigify_parameters
+        data.setdefault(root, []).append((
+            bone.name,
+            bone.parent.name if bone.parent else None,
+            hashable_value(bone.head_local),
+            hashable_value(bone.tail_local),
+            hashable_value(bone.matrix_local),
+            bone.use_connect,
+            hashable_value(bone.layers),
+            (bone.bbone_segments, hashable_value(bone.bbone_in), hashable_value(bone.bbone_out)),
+            pbone.rigify_type,
+            sorted((key, hashable_value(getattr(params, key, None))) for key in params.keys()),
+            pbone.rotation_mode,
+            hashable_value((pbone.lock_location, pbone.lock_rotation, pbone.lock_rotation_w,
+                            pbone.lock_rotations_4d, pbone.lock_scale)),
+            sorted((key, hashable_value(pbone[key])) for key in pbone.keys()
+                   if key not in ("_RNA_UI", "rigify_parameters", "rigify_type")),
+            [(con.type, rna_values(con)) for con in pbone.constraints],
+        ))
+
+    return {root: hashlib.sha1(repr(values).encode()).hexdigest() for root, values in data.items()}
+
+
+def get_metarig_hash(metarig, owners):
+    """ Hashes everything of the metarig that is not part of a single rig:
+        the rig layout, bones outside any rig, layers, colors and drivers.
+        When this changes the whole rig has to be rebuilt.
+    """
+    data = [metarig.name, sorted(owners.items(), key=lambda item: item[0])]
+
+    for bone in metarig.data.bones:
+        if owners[bone.name] is None:
+            data.append((bone.name, hashable_value(bone.matrix_local), hashable_value(bone.tail_local)))
+
+    data.append([(l.name, l.row, l.set, l.group) for l in metarig.data.rigify_layers])
+    data.append([(c.name, hashable_value(c.normal), hashable_value(c.select), hashable_value(c.active))
+                 for c in metarig.data.rigify_colors])
+
+    if metarig.animation_data:
+        for d in metarig.animation_data.drivers:
+            data.append((d.data_path, d.array_index, d.driver.type, d.driver.expression,
+                         [(v.name, v.type, [(hashable_value(t.id), t.data_path, t.bone_target, t.transform_type)
+                                            for t in v.targets])
+                          for v in d.driver.variables],
+                         [hashable_value(k.co) for k in d.keyframe_points]))
+
+    return hashlib.sha1(repr(data).encode()).hexdigest()
+
+
+def get_changed_rigs(obj, metarig_hash, rig_hashes):
+    """ Returns the set of rig bone names that have to be rebuilt in the
+        existing rig obj, or None if the whole rig has to be rebuilt.
+        Rigs that depend on a rebuilt rig, by bone parenting, constraint
+        targets or driver variables, are rebuilt as well.
+    """
+    arm = obj.data
+    if arm.get("rigify_metarig_hash") != metarig_hash \
+    or "rigify_rig_hashes" not in arm \
+    or "rigify_rig_bones" not in arm \
+    or "rigify_rig_scripts" not in arm:
+        return None
+
+    old_hashes = arm["rigify_rig_hashes"].to_dict()
+    if set(old_hashes.keys()) != set(rig_hashes.keys()):
+        return None
+
+    changed = set(root for root in rig_hashes if rig_hashes[root] != old_hashes[root])
+
+    # {bone name: rig bone name}
+    owners = {}
+    for root, names in json.loads(arm["rigify_rig_bones"]).items():
+        for name in names:
+            owners[name] = root
+
+    dependencies = get_bone_dependencies(obj)
+    if dependencies is None:
+        return None
+
+    # {rig bone name: set of rig bone names depending on it}
+    dependents = {}
+    for name, target in dependencies:
+        root = owners.get(name)
+        target_root = owners.get(target)
+        if root is not None and target_root is not None and target_root != root:
+            dependents.setdefault(target_root, set()).add(root)
+
+    stack = list(changed)
+    while stack:
+        root = stack.pop()
+        for dependent in dependents.get(root, ()):
+            if dependent not in changed:
+                changed.add(dependent)
+                stack.append(dependent)
+
+    return changed
+
+
+def get_path_bone_name(data_path):
+    """ Returns the pose bone name in a 'pose.bones["name"]...' data path,
+        or None for other paths.
+    """
+    match = re.match(r'^pose\.bones\["([^"\]]*)"\]', data_path)
+    return match.group(1) if match else None
+
+
+def get_bone_dependencies(obj):
+    """ Returns the (bone name, target bone name) pairs of the bones of obj
+        depending on other bones of obj: their parent, the targets of
+        their constraints and the bones their drivers read.
+        Returns None if a driver reads bones of obj in a way that can't be
+        resolved.
+    """
+    dependencies = []
+    for pbone in obj.pose.bones:
+        if pbone.parent:
+            dependencies.append((pbone.name, pbone.parent.name))
+        for con in pbone.constraints:
+            targets = [con] + list(getattr(con, 'targets', ()))
+            for target in targets:
+                if getattr(target, 'subtarget', ''):
+                    dependencies.append((pbone.name, target.subtarget))
+            if getattr(con, 'pole_subtarget', ''):
+                dependencies.append((pbone.name, con.pole_subtarget))
+
+    if not obj.animation_data:
+        return dependencies
+
+    for fcurve in obj.animation_data.drivers:
+        name = get_path_bone_name(fcurve.data_path)
+        if name is None:
+            continue
+        for variable in fcurve.driver.variables:
+            for target in variable.targets:
+                if target.id not in (obj, obj.data):
+                    continue
+                if target.bone_target:
+                    dependencies.append((name, target.bone_target))
+                if variable.type != 'SINGLE_PROP' or 'bones[' not in target.data_path:
+                    continue
+                target_name = get_path_bone_name(target.data_path)
+                if target_name is None:
+                    match = re.match(r'^bones\["([^"\]]*)"\]', target.data_path)
+                    target_name = match.group(1) if match else None
+                if target_name is None:
+                    return None
+                dependencies.append((name, target_name))
+    return dependencies
+
+
+def remove_bone_drivers(obj, bone_names):
+    """ Removes all drivers of obj driving properties of the named bones.
+    """
+    if not obj.animation_data:
+        return
+    drivers = obj.animation_data.drivers
+    for fcu in list(drivers):
+        if get_path_bone_name(fcu.data_path) in bone_names:
+            drivers.remove(fcu)
+
+
 def get_bone_rigs(obj, bone_name, halt_on_missing=False):
     """ Fetch all the rigs specified on a bone.
     """
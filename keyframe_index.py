@@ -0,0 +1,161 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+""" Keyframe index of actions.
+
+The keyed frames of an action are read once, with foreach_get(), into
+sorted frame arrays per bone and per channel:
+
+    {bone name: {channel: [frames]}}
+
+where the channel is the rest of the F-curve data path after the bone,
+e.g. 'location' or '["IK_FK"]', and its array index.  Whether a bone is
+keyed on a frame is then a bisection.  Indices are cached per action
+and rebuilt when F-curves or keys are added or removed, or the first or
+last key of an F-curve moves.  Keys retimed in between are not noticed:
+operators that need exact frames ask for a rebuilt index once, and the
+add-on invalidates the index of the actions it writes keys into.
+"""
+
+from array import array
+from bisect import bisect_left
+
+BONE_PATH_PREFIX = 'pose.bones["'
+
+_indices = {}  # {action pointer: KeyframeIndex}
+
+
+def split_bone_path(data_path):
+    """ Returns the (bone name, channel) of a pose bone data path, or
+        (None, data_path).
+    """
+    if not data_path.startswith(BONE_PATH_PREFIX):
+        return None, data_path
+    end = data_path.find('"]', len(BONE_PATH_PREFIX))
+    if end < 0:
+        return None, data_path
+    channel = data_path[end + 2:]
+    if channel.startswith('.'):
+        channel = channel[1:]
+    return data_path[len(BONE_PATH_PREFIX):end], channel
+
+
+def read_keyframes(action):
+    """ Returns the [(data path, array index, keyframe frames)] of the
+        F-curves of action, read with foreach_get().
+    """
+    keyframes = []
+    for fcu in action.fcurves:
+        points = fcu.keyframe_points
+        co = array('f', [0.0]) * (len(points) * 2)
+        points.foreach_get('co', co)
+        keyframes.append((fcu.data_path, fcu.array_index, co[0::2]))
+    return keyframes
+
+
+def action_signature(action):
+    """ Returns a value that changes when F-curves or keys are added to or
+        removed from the action, or the first or last key of an F-curve
+        moves, without reading all the keys.
+    """
+    signature = []
+    for fcu in action.fcurves:
+        points = fcu.keyframe_points
+        if points:
+            signature.append((fcu.data_path, fcu.array_index, len(points), points[0].co[0], points[-1].co[0]))
+        else:
+            signature.append((fcu.data_path, fcu.array_index, 0))
+    return tuple(signature)
+
+
+def is_in(frames, frame):
+    """ Returns whether frame is in the sorted frames.
+    """
+    i = bisect_left(frames, frame)
+    return i < len(frames) and frames[i] == frame
+
+
+class KeyframeIndex:
+    """ The keyed frames of an action, per bone and channel.
+    """
+    def __init__(self, action):
+        self.signature = action_signature(action)
+        self.channels = {}     # {bone name: {(channel, array index): sorted frames}}
+        self.bone_frames = {}  # {bone name: sorted frames of all its channels}
+
+        all_frames = set()
+        bone_frames = {}
+        for data_path, array_index, key_frames in read_keyframes(action):
+            frames = sorted(set(key_frames))
+            all_frames.update(frames)
+
+            bone, channel = split_bone_path(data_path)
+            if bone is None:
+                continue
+            self.channels.setdefault(bone, {})[(channel, array_index)] = frames
+            bone_frames.setdefault(bone, set()).update(frames)
+
+        self.frames = sorted(all_frames)
+        self.bone_frames = {bone: sorted(frames) for bone, frames in bone_frames.items()}
+
+    def is_keyed(self, bone, frame):
+        """ Returns whether any channel of bone is keyed on frame.
+        """
+        frames = self.bone_frames.get(bone)
+        return frames is not None and is_in(frames, frame)
+
+    def any_keyed(self, bones, frame):
+        """ Returns whether any of bones is keyed on frame.
+        """
+        return any(self.is_keyed(bone, frame) for bone in bones)
+
+    def get_channel(self, bone, channel, index=0):
+        """ Returns the sorted keyed frames of a channel of bone, or None.
+        """
+        return self.channels.get(bone, {}).get((channel, index))
+
+
+def get_keyframe_index(action, rebuild=False):
+    """ Returns the KeyframeIndex of action, built once and rebuilt when
+        action_signature() changes, or always with rebuild.
+    """
+    key = action.as_pointer()
+    index = _indices.get(key)
+    if rebuild or index is None or index.signature != action_signature(action):
+        index = KeyframeIndex(action)
+        _indices[key] = index
+    return index
+
+
+def get_rig_keyframe_index(rig, rebuild=False):
+    """ Returns the KeyframeIndex of the action of rig, or None.
+    """
+    if rig.animation_data and rig.animation_data.action:
+        return get_keyframe_index(rig.animation_data.action, rebuild)
+    return None
+
+
+def invalidate_keyframe_index(action=None):
+    """ Drops the index of action, or of all the actions.
+    """
+    if action is None:
+        _indices.clear()
+    else:
+        _indices.pop(action.as_pointer(), None)
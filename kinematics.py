@@ -0,0 +1,324 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+""" Offline forward kinematics of bone chains.
+
+The armature-space matrices of bones are computed with NumPy for all
+the frames at once, from their rest matrices, their parents and their
+local transforms, instead of setting every frame and reading
+pose_bone.matrix back from Blender:
+
+    matrix = parent matrix * parent rest^-1 * rest * local
+
+Matrices are (..., 4, 4) arrays, per frame and bone: (frames, bones, 4, 4).
+Constraints and drivers are not evaluated, and the bones are expected to
+inherit the rotation and scale of their parents, so the results only
+hold for plain FK chains.
+
+Only the functions taking Blender objects (Skeleton.from_armature(),
+sample_fcurve(), sample_local_matrices(), evaluate_action()) need bpy
+data, the rest runs without Blender.  NumPy is required, it ships with
+Blender.
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError("The kinematics module requires NumPy")
+
+BONE_PATH = 'pose.bones["%s"].'
+
+ROTATION_CHANNELS = {
+    'QUATERNION': ('rotation_quaternion', 4),
+    'AXIS_ANGLE': ('rotation_axis_angle', 4),
+}
+
+
+#=======================
+# Rotations
+#=======================
+
+def quaternion_to_matrix(quat):
+    """ Returns the (..., 3, 3) rotation matrices of (..., 4) w, x, y, z
+        quaternions.  The quaternions are normalized first.
+    """
+    quat = np.asarray(quat, dtype=float)
+    norm = np.linalg.norm(quat, axis=-1, keepdims=True)
+    quat = quat / np.where(norm == 0.0, 1.0, norm)
+    quat = np.where(norm == 0.0, (1.0, 0.0, 0.0, 0.0), quat)
+    w, x, y, z = np.moveaxis(quat, -1, 0)
+
+    mat = np.empty(quat.shape[:-1] + (3, 3))
+    mat[..., 0, 0] = 1.0 - 2.0 * (y * y + z * z)
+    mat[..., 0, 1] = 2.0 * (x * y - w * z)
+    mat[..., 0, 2] = 2.0 * (x * z + w * y)
+    mat[..., 1, 0] = 2.0 * (x * y + w * z)
+    mat[..., 1, 1] = 1.0 - 2.0 * (x * x + z * z)
+    mat[..., 1, 2] = 2.0 * (y * z - w * x)
+    mat[..., 2, 0] = 2.0 * (x * z - w * y)
+    mat[..., 2, 1] = 2.0 * (y * z + w * x)
+    mat[..., 2, 2] = 1.0 - 2.0 * (x * x + y * y)
+    return mat
+
+
+def axis_angle_to_matrix(axis_angle):
+    """ Returns the (..., 3, 3) rotation matrices of (..., 4) angle, x, y, z
+        axis angle rotations.
+    """
+    axis_angle = np.asarray(axis_angle, dtype=float)
+    angle = axis_angle[..., 0]
+    axis = axis_angle[..., 1:]
+    norm = np.linalg.norm(axis, axis=-1)
+    # Zero axes give no rotation, as in Blender
+    half = np.where(norm == 0.0, 0.0, angle / 2.0)
+    axis = axis / np.where(norm == 0.0, 1.0, norm)[..., np.newaxis]
+    quat = np.concatenate((np.cos(half)[..., np.newaxis], axis * np.sin(half)[..., np.newaxis]), axis=-1)
+    return quaternion_to_matrix(quat)
+
+
+def axis_rotation(axis, angle):
+    """ Returns the (..., 3, 3) rotation matrices of angles, an array,
+        around the 'X', 'Y' or 'Z' axis.
+    """
+    angle = np.asarray(angle, dtype=float)
+    cos = np.cos(angle)
+    sin = np.sin(angle)
+    i, j = {'X': (1, 2), 'Y': (2, 0), 'Z': (0, 1)}[axis]
+
+    mat = np.zeros(angle.shape + (3, 3))
+    mat[..., 'XYZ'.index(axis), 'XYZ'.index(axis)] = 1.0
+    mat[..., i, i] = cos
+    mat[..., i, j] = -sin
+    mat[..., j, i] = sin
+    mat[..., j, j] = cos
+    return mat
+
+
+def euler_to_matrix(euler, order='XYZ'):
+    """ Returns the (..., 3, 3) rotation matrices of (..., 3) x, y, z euler
+        rotations.  The first axis of order is applied first, as in
+        Blender's rotation modes.
+    """
+    euler = np.asarray(euler, dtype=float)
+    mat = None
+    for axis in order:
+        rot = axis_rotation(axis, euler[..., 'XYZ'.index(axis)])
+        mat = rot if mat is None else np.matmul(rot, mat)
+    return mat
+
+
+def rotation_to_matrix(rotation, rotation_mode):
+    """ Returns the (..., 3, 3) rotation matrices of the rotation channel
+        values of a pose bone with rotation_mode.
+    """
+    if rotation_mode == 'QUATERNION':
+        return quaternion_to_matrix(rotation)
+    if rotation_mode == 'AXIS_ANGLE':
+        return axis_angle_to_matrix(rotation)
+    return euler_to_matrix(rotation, rotation_mode)
+
+
+def compose_matrices(location, rotation, scale):
+    """ Returns the (..., 4, 4) matrices of (..., 3) locations, (..., 3, 3)
+        rotation matrices and (..., 3) scales, as location * rotation * scale.
+    """
+    location = np.asarray(location, dtype=float)
+    scale = np.asarray(scale, dtype=float)
+    mat = np.zeros(np.broadcast(location[..., 0], scale[..., 0], rotation[..., 0, 0]).shape + (4, 4))
+    mat[..., :3, :3] = rotation * scale[..., np.newaxis, :]
+    mat[..., :3, 3] = location
+    mat[..., 3, 3] = 1.0
+    return mat
+
+
+#=======================
+# Skeleton
+#=======================
+
+class Skeleton:
+    """ The rest pose and hierarchy of bones.
+        names:          bone names
+        parents:        index of the parent of each bone, or -1
+        rest:           (bones, 4, 4) armature-space rest matrices
+        local_location: whether each bone has a local location, see
+                        Bone.use_local_location, all by default
+    """
+    def __init__(self, names, parents, rest, local_location=None):
+        self.names = list(names)
+        self.parents = [int(p) for p in parents]
+        self.rest = np.asarray(rest, dtype=float).reshape(len(self.names), 4, 4)
+        if local_location is None:
+            local_location = [True] * len(self.names)
+        self.local_location = list(local_location)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.order = self.get_order()
+
+        # Rest of every bone relative to its parent rest
+        self.offsets = self.rest.copy()
+        for i, p in enumerate(self.parents):
+            if p >= 0:
+                self.offsets[i] = np.linalg.inv(self.rest[p]).dot(self.rest[i])
+        self.offsets_inv = np.linalg.inv(self.offsets)
+
+    def get_order(self):
+        """ Returns the bone indices with the parents before their children.
+        """
+        order = []
+        placed = [False] * len(self.names)
+
+        def place(i, path=()):
+            if placed[i]:
+                return
+            if i in path:
+                raise ValueError("Bone parenting loop at '%s'" % self.names[i])
+            p = self.parents[i]
+            if p >= 0:
+                place(p, path + (i,))
+            placed[i] = True
+            order.append(i)
+
+        for i in range(len(self.names)):
+            place(i)
+        return order
+
+    @classmethod
+    def from_armature(cls, obj, bone_names=None):
+        """ Returns the Skeleton of the bones of an armature object, with
+            the parents of bone_names up to their root, or of all bones.
+        """
+        bones = obj.data.bones
+        if bone_names is None:
+            names = [b.name for b in bones]
+        else:
+            names = []
+            for name in bone_names:
+                bone = bones[name]
+                while bone is not None and bone.name not in names:
+                    names.append(bone.name)
+                    bone = bone.parent
+
+        index = {name: i for i, name in enumerate(names)}
+        parents = [index[bones[name].parent.name] if bones[name].parent else -1 for name in names]
+        rest = np.array([[list(row) for row in bones[name].matrix_local] for name in names])
+        local_location = [bones[name].use_local_location for name in names]
+        return cls(names, parents, rest, local_location)
+
+    def get_local_matrices(self, location, rotation, scale):
+        """ Returns the (frames, bones, 4, 4) local matrices of the bones,
+            from (frames, bones, 3) locations, (frames, bones, 3, 3)
+            rotation matrices and (frames, bones, 3) scales.
+        """
+        location = np.array(location, dtype=float)
+        for i, local in enumerate(self.local_location):
+            if not local:
+                # The location is given in the orientation of the parent
+                location[..., i, :] = np.matmul(location[..., i, :], self.offsets[i, :3, :3])
+        return compose_matrices(location, rotation, scale)
+
+    def evaluate(self, local):
+        """ Returns the (frames, bones, 4, 4) armature-space matrices of the
+            bones from their (frames, bones, 4, 4) local matrices.
+        """
+        local = np.asarray(local, dtype=float)
+        matrices = np.empty(local.shape)
+        for i in self.order:
+            mat = np.matmul(self.offsets[i], local[:, i])
+            p = self.parents[i]
+            if p >= 0:
+                mat = np.matmul(matrices[:, p], mat)
+            matrices[:, i] = mat
+        return matrices
+
+    def to_local(self, matrices):
+        """ Returns the (frames, bones, 4, 4) local matrices giving the
+            bones their (frames, bones, 4, 4) armature-space matrices.
+            The inverse of evaluate().
+        """
+        matrices = np.asarray(matrices, dtype=float)
+        local = np.empty(matrices.shape)
+        for i, p in enumerate(self.parents):
+            mat = matrices[:, i]
+            if p >= 0:
+                mat = np.matmul(np.linalg.inv(matrices[:, p]), mat)
+            local[:, i] = np.matmul(self.offsets_inv[i], mat)
+        return local
+
+
+#=======================
+# Blender data
+#=======================
+
+def sample_fcurve(fcurve, frames, default=0.0):
+    """ Returns the values of an F-curve, or default if it is None, on
+        frames as a float array.
+    """
+    if fcurve is None:
+        return np.full(len(frames), default, dtype=float)
+    return np.fromiter((fcurve.evaluate(f) for f in frames), dtype=float, count=len(frames))
+
+
+def sample_channel(action, data_path, frames, defaults):
+    """ Returns the (frames, len(defaults)) values of the array channel
+        data_path of action, the channels without F-curve keep their
+        defaults.
+    """
+    values = np.empty((len(frames), len(defaults)))
+    for index, default in enumerate(defaults):
+        fcurve = action.fcurves.find(data_path, index) if action else None
+        values[:, index] = sample_fcurve(fcurve, frames, default)
+    return values
+
+
+def sample_local_matrices(obj, skeleton, frames, action=None):
+    """ Returns the (frames, bones, 4, 4) local matrices of the bones of
+        skeleton, with their transform channels sampled from the F-curves
+        of action, the action of obj by default.  Channels without
+        F-curve keep their current values.
+    """
+    if action is None and obj.animation_data:
+        action = obj.animation_data.action
+
+    count = len(skeleton.names)
+    location = np.empty((len(frames), count, 3))
+    rotation = np.empty((len(frames), count, 3, 3))
+    scale = np.empty((len(frames), count, 3))
+
+    for i, name in enumerate(skeleton.names):
+        pbone = obj.pose.bones[name]
+        path = BONE_PATH % name
+        mode = pbone.rotation_mode
+        channel = ROTATION_CHANNELS.get(mode, ('rotation_euler', 3))[0]
+
+        location[:, i] = sample_channel(action, path + 'location', frames, pbone.location)
+        values = sample_channel(action, path + channel, frames, getattr(pbone, channel))
+        rotation[:, i] = rotation_to_matrix(values, mode)
+        scale[:, i] = sample_channel(action, path + 'scale', frames, pbone.scale)
+
+    return skeleton.get_local_matrices(location, rotation, scale)
+
+
+def evaluate_action(obj, bone_names, frames, action=None):
+    """ Returns the {bone name: (frames, 4, 4) armature-space matrices} of
+        bone_names of an armature object on frames, evaluated from the
+        F-curves of action, without changing the current frame.
+    """
+    skeleton = Skeleton.from_armature(obj, bone_names)
+    matrices = skeleton.evaluate(sample_local_matrices(obj, skeleton, frames, action))
+    return {name: matrices[:, skeleton.index[name]] for name in bone_names}
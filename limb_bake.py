@@ -0,0 +1,202 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+""" IK/FK bake engine.
+
+Every frame is visited once, all the limbs keyed on it are snapped, and
+the resulting bone transforms are buffered.  The keyframes are written
+at the end, straight into the F-curves of the action, instead of keying
+every limb on every frame with bpy.ops.anim.keyframe_insert_menu().
+"""
+
+import bpy
+
+from .keyframe_index import get_rig_keyframe_index, invalidate_keyframe_index
+from .utils import overwrite_prop_animation
+
+
+class LimbSnap:
+    """ The snapping of one limb.
+        snap:        callable, snaps the limb at the current frame
+        keyed_bones: bones of the limb, the limb is baked on the frames
+                     where one of them is keyed
+        key_bones:   bones to key after snapping
+        props:       (bone name, property name, value) custom properties,
+                     whose existing keys are set to value on baked frames
+    """
+    def __init__(self, snap, keyed_bones, key_bones=(), props=()):
+        self.snap = snap
+        self.keyed_bones = list(keyed_bones)
+        self.key_bones = list(key_bones)
+        self.props = list(props)
+        self.frames = []  # frames the limb was baked on
+
+
+class KeyframeBuffer:
+    """ Collects keyframe values per F-curve, and writes them in bulk.
+    """
+    def __init__(self, rig):
+        self.rig = rig
+        self.channels = {}  # {(data_path, index): (group, {frame: value})}
+
+    def add(self, data_path, index, frame, value, group=None):
+        channel = self.channels.get((data_path, index))
+        if channel is None:
+            channel = self.channels[(data_path, index)] = (group, {})
+        channel[1][frame] = value
+
+    def add_array(self, data_path, frame, values, group=None):
+        for index, value in enumerate(values):
+            self.add(data_path, index, frame, value, group)
+
+    def add_bone_transform(self, frame, pbone, euler_compat=None):
+        """ Buffers the visual location and rotation, and the scale of a
+            pose bone, as the LocRot visual and Scaling keying sets do.
+            Returns the buffered euler rotation, if the bone uses one.
+        """
+        path = 'pose.bones["%s"].' % pbone.name
+        mat = self.rig.convert_space(pose_bone=pbone, matrix=pbone.matrix,
+                                     from_space='POSE', to_space='LOCAL')
+
+        self.add_array(path + 'location', frame, mat.to_translation(), pbone.name)
+        euler = None
+        if pbone.rotation_mode == 'QUATERNION':
+            self.add_array(path + 'rotation_quaternion', frame, mat.to_quaternion(), pbone.name)
+        elif pbone.rotation_mode == 'AXIS_ANGLE':
+            axis, angle = mat.to_quaternion().to_axis_angle()
+            self.add_array(path + 'rotation_axis_angle', frame, [angle] + list(axis), pbone.name)
+        else:
+            euler = mat.to_euler(pbone.rotation_mode, euler_compat or pbone.rotation_euler)
+            self.add_array(path + 'rotation_euler', frame, euler, pbone.name)
+        self.add_array(path + 'scale', frame, pbone.scale, pbone.name)
+        return euler
+
+    def write(self):
+        """ Writes the buffered values into the F-curves of the action of
+            rig, replacing the keys on the same frames.
+        """
+        if not self.channels:
+            return
+        anim_data = self.rig.animation_data_create()
+        if anim_data.action is None:
+            anim_data.action = bpy.data.actions.new(self.rig.name + "Action")
+        action = anim_data.action
+
+        for (data_path, index), (group, values) in self.channels.items():
+            fcurve = action.fcurves.find(data_path, index)
+            if fcurve is None:
+                if group:
+                    fcurve = action.fcurves.new(data_path, index, group)
+                else:
+                    fcurve = action.fcurves.new(data_path, index)
+            write_fcurve_keys(fcurve, values)
+
+        self.channels.clear()
+        invalidate_keyframe_index(action)
+
+
+def write_fcurve_keys(fcurve, values):
+    """ Sets the {frame: value} keys of an F-curve, moving the keys
+        already on those frames, and adding the others in one go.
+    """
+    points = fcurve.keyframe_points
+    count = len(points)
+    co = [0.0] * (count * 2)
+    points.foreach_get('co', co)
+    handles = {}
+    for side in ('handle_left', 'handle_right'):
+        handles[side] = [0.0] * (count * 2)
+        points.foreach_get(side, handles[side])
+
+    # Move the keys on the frames, and their handles along
+    existing = {co[i * 2]: i for i in range(count)}
+    for frame, i in existing.items():
+        if frame in values:
+            offset = values[frame] - co[i * 2 + 1]
+            co[i * 2 + 1] = values[frame]
+            for side in handles.values():
+                side[i * 2 + 1] += offset
+
+    new_frames = sorted(frame for frame in values if frame not in existing)
+    if new_frames:
+        points.add(len(new_frames))
+        for frame in new_frames:
+            co += [frame, values[frame]]
+            for side in handles.values():
+                side += [frame, values[frame]]
+
+    points.foreach_set('co', co)
+    for side, side_values in handles.items():
+        points.foreach_set(side, side_values)
+    # Sorts the keys, and recalculates the automatic handles
+    fcurve.update()
+
+
+def bake_limbs(rig, limbs, frames, keyed_only=True, insert_keys=True):
+    """ Snaps limbs, a list of LimbSnap, on frames.
+        Every frame is set once, for all the limbs to snap on it.
+        With keyed_only, a limb is only snapped on the frames where one of
+        its keyed_bones is keyed.
+        With insert_keys, the key_bones of the snapped limbs are keyed, and
+        the props of the limbs set on their baked frames.
+    """
+    scn = bpy.context.scene
+    start_frame = scn.frame_current
+    buffer = KeyframeBuffer(rig)
+    eulers = {}  # {bone name: last buffered euler}, for compatible eulers
+    index = get_rig_keyframe_index(rig) if keyed_only else None
+    if keyed_only and index is None:
+        return
+
+    visited = []  # frames set
+    try:
+        for f in frames:
+            snapped = [limb for limb in limbs if not keyed_only or index.any_keyed(limb.keyed_bones, f)]
+            if not snapped:
+                continue
+
+            # Set the frame even if it is the current one, so unkeyed changes
+            # to the pose are not snapped and keyed
+            scn.frame_set(int(f))
+            visited.append(f)
+            for limb in snapped:
+                limb.snap()
+                limb.frames.append(f)
+
+            if insert_keys:
+                scn.update()
+                for limb in snapped:
+                    for name in limb.key_bones:
+                        euler = buffer.add_bone_transform(f, rig.pose.bones[name], eulers.get(name))
+                        if euler is not None:
+                            eulers[name] = euler
+
+        if insert_keys:
+            buffer.write()
+            index = get_rig_keyframe_index(rig)
+            for limb in limbs:
+                if limb.frames:
+                    for bone, prop, value in limb.props:
+                        overwrite_prop_animation(rig, rig.pose.bones[bone], prop, value, limb.frames, index)
+    finally:
+        # Go back to the start frame, unless only it was snapped: setting
+        # it again would undo an unkeyed snap
+        if visited and visited != [start_frame]:
+            scn.frame_set(start_frame)
@@ -0,0 +1,249 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+""" Compact metarig format.
+
+A metarig is stored as a json dict of per bone arrays instead of the one
+assignment per line Python code of utils.write_metarig():
+
+    {'version': 1,
+     'colors': [{'name', 'active', 'normal', 'select', 'standard_colors_lock'}],
+     'layers': [{'name', 'row', 'set', 'group'}],
+     'visible_layers': [armature layer indices],
+     'bones': {'name': [...], 'parent': [index or -1], 'use_connect': [...],
+               'head': [x, y, z, ...], 'tail': [...], 'roll': [...],
+               'rigify_type': [...], 'rotation_mode': [...],
+               'lock_location': [...], 'lock_rotation': [...],
+               'lock_rotation_w': [...], 'lock_scale': [...],
+               'layers': [32 booleans per bone], 'parameters': [{name: value}]}}
+
+Bones are listed parents first.  Vector values are flattened, so they can
+be set with foreach_set() on the pose and armature bone collections.
+"""
+
+import json
+import os
+
+import bpy
+
+from .utils import ensure_mode, sort_bones
+
+FORMAT_VERSION = 1
+FILE_EXTENSION = ".json"
+
+# Pose bone properties set with foreach_set(), and their length per bone
+POSE_ARRAYS = (
+    ('lock_location', 3),
+    ('lock_rotation', 3),
+    ('lock_rotation_w', 1),
+    ('lock_scale', 3),
+)
+
+_metarig_files = {}  # {filepath: (mtime, data)}
+
+
+#=======================
+# Writing
+#=======================
+
+def get_parameter_value(params, name):
+    value = getattr(params, name, '')
+    if str(type(value)) == "<class 'bpy_prop_array'>":
+        value = list(value)
+    return value
+
+
+def get_metarig_data(obj, layers=False, groups=False):
+    """ Returns the metarig obj as a json serializable dict.
+    """
+    arm = obj.data
+    data = {'version': FORMAT_VERSION}
+
+    # Rigify bone group colors info
+    if groups:
+        data['colors'] = [{
+            'name': c.name,
+            'active': list(c.active),
+            'normal': list(c.normal),
+            'select': list(c.select),
+            'standard_colors_lock': c.standard_colors_lock,
+        } for c in arm.rigify_colors]
+
+    # Rigify layer layout info
+    if layers:
+        data['layers'] = [{'name': l.name, 'row': l.row, 'set': l.set, 'group': l.group}
+                          for l in arm.rigify_layers]
+
+    ensure_mode(obj, 'EDIT')
+    names = sort_bones(arm.edit_bones)
+    index = {name: i for i, name in enumerate(names)}
+    bones = {'name': names, 'parent': [], 'use_connect': [], 'head': [], 'tail': [], 'roll': []}
+    for name in names:
+        ebone = arm.edit_bones[name]
+        bones['parent'].append(index[ebone.parent.name] if ebone.parent else -1)
+        bones['use_connect'].append(ebone.use_connect)
+        bones['head'].extend(round(v, 4) for v in ebone.head)
+        bones['tail'].extend(round(v, 4) for v in ebone.tail)
+        bones['roll'].append(round(ebone.roll, 4))
+    ensure_mode(obj, 'OBJECT')
+
+    # Rig type and other pose properties
+    bones['rigify_type'] = []
+    bones['rotation_mode'] = []
+    bones['parameters'] = []
+    for prop, size in POSE_ARRAYS:
+        bones[prop] = []
+    if layers:
+        bones['layers'] = []
+    for name in names:
+        pbone = obj.pose.bones[name]
+        bones['rigify_type'].append(pbone.rigify_type)
+        bones['rotation_mode'].append(pbone.rotation_mode)
+        for prop, size in POSE_ARRAYS:
+            value = getattr(pbone, prop)
+            bones[prop].extend(value if size > 1 else [value])
+        if layers:
+            bones['layers'].extend(pbone.bone.layers)
+        params = pbone.rigify_parameters
+        bones['parameters'].append({key: get_parameter_value(params, key) for key in params.keys()})
+    data['bones'] = bones
+
+    # Set appropriate layers visible
+    if layers:
+        data['visible_layers'] = sorted(set(
+            i for name in names for i, used in enumerate(arm.bones[name].layers) if used))
+
+    return data
+
+
+def write_metarig_data(obj, layers=False, groups=False):
+    """ Returns the metarig obj as json text, to be loaded by
+        create_metarig().
+    """
+    return json.dumps(get_metarig_data(obj, layers=layers, groups=groups), separators=(',', ':'))
+
+
+#=======================
+# Loading
+#=======================
+
+def set_bone_arrays(collection, names, prop, size, values):
+    """ Sets prop of the named members of collection from values, a flat
+        list of size values per name, with a single foreach_get/set pair.
+    """
+    order = {name: i for i, name in enumerate(collection.keys())}
+    current = [False] * (len(order) * size)
+    collection.foreach_get(prop, current)
+    for i, name in enumerate(names):
+        j = order[name] * size
+        current[j:j + size] = values[i * size:(i + 1) * size]
+    collection.foreach_set(prop, current)
+
+
+def create_metarig(obj, data):
+    """ Builds the metarig described by data, as returned by
+        get_metarig_data(), in the armature obj.
+        Returns the names of the created bones, as new bones are renamed
+        if the armature already has bones of the same name.
+    """
+    if data.get('version') != FORMAT_VERSION:
+        raise ValueError("Unsupported metarig data version: %r" % data.get('version'))
+
+    arm = obj.data
+    bones = data['bones']
+
+    for c in data.get('colors', []):
+        color = arm.rigify_colors.add()
+        color.name = c['name']
+        color.active = c['active']
+        color.normal = c['normal']
+        color.select = c['select']
+        color.standard_colors_lock = c['standard_colors_lock']
+
+    for l in data.get('layers', []):
+        layer = arm.rigify_layers.add()
+        layer.name = l['name']
+        layer.row = l['row']
+        layer.set = l['set']
+        layer.group = l['group']
+
+    # All edit bones, parents come first
+    ensure_mode(obj, 'EDIT')
+    edit_bones = arm.edit_bones
+    created = []
+    for i, name in enumerate(bones['name']):
+        ebone = edit_bones.new(name)
+        ebone.head = bones['head'][i * 3:i * 3 + 3]
+        ebone.tail = bones['tail'][i * 3:i * 3 + 3]
+        ebone.roll = bones['roll'][i]
+        parent = bones['parent'][i]
+        if parent >= 0:
+            ebone.parent = created[parent]
+        ebone.use_connect = bones['use_connect'][i]
+        created.append(ebone)
+    names = [ebone.name for ebone in created]
+
+    # Pose properties, arrays in bulk
+    ensure_mode(obj, 'OBJECT')
+    pose_bones = obj.pose.bones
+    for prop, size in POSE_ARRAYS:
+        set_bone_arrays(pose_bones, names, prop, size, bones[prop])
+    if 'layers' in bones:
+        set_bone_arrays(arm.bones, names, 'layers', 32, bones['layers'])
+
+    for i, name in enumerate(names):
+        pbone = pose_bones[name]
+        pbone.rigify_type = bones['rigify_type'][i]
+        pbone.rotation_mode = bones['rotation_mode'][i]
+        params = pbone.rigify_parameters
+        for key, value in bones['parameters'][i].items():
+            try:
+                setattr(params, key, value)
+            except AttributeError:
+                pass
+
+    # Select the new bones, like the Python metarigs do
+    ensure_mode(obj, 'EDIT')
+    edit_bones = arm.edit_bones
+    for ebone in edit_bones:
+        ebone.select = ebone.select_head = ebone.select_tail = False
+    for name in names:
+        ebone = edit_bones[name]
+        ebone.select = ebone.select_head = ebone.select_tail = True
+    if names:
+        edit_bones.active = edit_bones[names[-1]]
+
+    if 'visible_layers' in data:
+        visible = set(data['visible_layers'])
+        arm.layers = [(i in visible) for i in range(len(arm.layers))]
+
+    return names
+
+
+def load_metarig_file(filepath):
+    """ Reads a metarig data file, caching it until the file changes.
+    """
+    mtime = os.path.getmtime(filepath)
+    entry = _metarig_files.get(filepath)
+    if entry is None or entry[0] != mtime:
+        with open(filepath) as f:
+            entry = (mtime, json.load(f))
+        _metarig_files[filepath] = entry
+    return entry[1]
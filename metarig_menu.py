@@ -24,6 +24,8 @@ from string import capwords
 import bpy
 
 from . import utils
+from . import rig_lists
+from . import metarig_data
 
 
 class ArmatureSubMenu(bpy.types.Menu):
@@ -38,8 +40,9 @@ class ArmatureSubMenu(bpy.types.Menu):
 
 
 def get_metarig_list(path, depth=0):
-    """ Searches for metarig modules, and returns a list of the
-        imported modules.
+    """ Searches for metarig modules and data files, and returns a list of
+        their (name, package path, data file path or None) entries.
+        Nothing is imported or read.
     """
     metarigs = []
     metarigs_dict = dict()
@@ -57,19 +60,19 @@ def get_metarig_list(path, depth=0):
                 metarigs_dict[f] = get_metarig_list(f, depth=1)
             else:
                 continue
-        elif not f.endswith(".py"):
-            continue
         elif f == "__init__.py":
             continue
-        else:
+        elif f.endswith(".py"):
             module_name = f[:-3]
-            try:
-                if depth == 1:
-                    metarigs += [utils.get_metarig_module(module_name, utils.METARIG_DIR + '.' + path)]
-                else:
-                    metarigs += [utils.get_metarig_module(module_name, utils.METARIG_DIR)]
-            except (ImportError):
-                pass
+            if os.path.isfile(os.path.join(SEARCH_DIR_ABS, module_name + metarig_data.FILE_EXTENSION)):
+                # Converted, the data file is used
+                continue
+            if depth == 1:
+                metarigs += [(module_name, utils.METARIG_DIR + '.' + path, None)]
+            else:
+                metarigs += [(module_name, utils.METARIG_DIR, None)]
+        elif f.endswith(metarig_data.FILE_EXTENSION):
+            metarigs += [(f[:-len(metarig_data.FILE_EXTENSION)], None, complete_path)]
 
     if depth == 1:
         return metarigs
@@ -78,10 +81,21 @@ def get_metarig_list(path, depth=0):
     return metarigs_dict
 
 
-def make_metarig_add_execute(m):
+def make_metarig_add_execute(name, path, filepath):
     """ Create an execute method for a metarig creation operator.
+        The metarig module or data file is only loaded when the operator
+        runs.
     """
     def execute(self, context):
+        try:
+            if filepath:
+                data = metarig_data.load_metarig_file(filepath)
+            else:
+                m = utils.get_metarig_module(name, path)
+        except (ImportError, OSError, ValueError) as e:
+            self.report({'ERROR'}, "Could not load metarig %r: %s" % (name, e))
+            return {'CANCELLED'}
+
         # Add armature object
         bpy.ops.object.armature_add()
         obj = context.active_object
@@ -93,8 +107,12 @@ def make_metarig_add_execute(m):
         bones = context.active_object.data.edit_bones
         bones.remove(bones[0])
 
-        # Create metarig
-        m.create(obj)
+        # Create metarig, all the rig type parameters it may set are needed
+        rig_lists.ensure_rig_parameters()
+        if filepath:
+            metarig_data.create_metarig(obj, data)
+        else:
+            m.create(obj)
 
         bpy.ops.object.mode_set(mode='OBJECT')
         return {'FINISHED'}
@@ -116,7 +134,7 @@ def make_submenu_func(bl_idname, text):
     return metarig_menu
 
 
-# Get the metarig modules
+# Get the metarig module and data file names
 metarigs_dict = get_metarig_list("")
 armature_submenus = []
 
@@ -124,15 +142,13 @@ armature_submenus = []
 metarig_ops = {}
 for metarig_class in metarigs_dict:
     metarig_ops[metarig_class] = []
-    for m in metarigs_dict[metarig_class]:
-        name = m.__name__.rsplit('.', 1)[1]
-
+    for name, path, filepath in metarigs_dict[metarig_class]:
         # Dynamically construct an Operator
         T = type("Add_" + name + "_Metarig", (bpy.types.Operator,), {})
         T.bl_idname = "object.armature_" + name + "_metarig_add"
         T.bl_label = "Add " + name.replace("_", " ").capitalize() + " (metarig)"
         T.bl_options = {'REGISTER', 'UNDO'}
-        T.execute = make_metarig_add_execute(m)
+        T.execute = make_metarig_add_execute(name, path, filepath)
 
         metarig_ops[metarig_class].append((T, name))
 
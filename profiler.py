@@ -0,0 +1,157 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+import json
+import time
+from contextlib import contextmanager
+
+from .utils import add_ops_listener, remove_ops_listener
+
+# bpy.ops passes the python form of the idname to op_call
+MODE_SET_IDNAME = "object.mode_set"
+
+
+class GenerateProfiler:
+    """ Records wall time, bpy.ops calls and mode switches of a rig
+        generation, per stage, per phase and per rig.
+        Used as a context manager around generate.generate_rig(), to count
+        the operator calls.
+    """
+    def __init__(self):
+        self.ops_calls = 0
+        self.mode_sets = 0
+        self.records = []  # [{'kind', 'name', 'rig_type', 'bone', 'time', 'ops', 'mode_sets'}]
+
+    def count_op(self, idname):
+        self.ops_calls += 1
+        if idname == MODE_SET_IDNAME:
+            self.mode_sets += 1
+
+    def __enter__(self):
+        add_ops_listener(self.count_op)
+        return self
+
+    def __exit__(self, *exc):
+        remove_ops_listener(self.count_op)
+        return False
+
+    def add(self, kind, name, start, rig_type="", bone=""):
+        """ Records the time and operator calls since start, a tuple as
+            returned by snapshot().
+        """
+        t, ops, mode_sets = start
+        self.records.append({
+            'kind': kind,
+            'name': name,
+            'rig_type': rig_type,
+            'bone': bone,
+            'time': time.time() - t,
+            'ops': self.ops_calls - ops,
+            'mode_sets': self.mode_sets - mode_sets,
+        })
+
+    def snapshot(self):
+        return (time.time(), self.ops_calls, self.mode_sets)
+
+    def report(self):
+        """ Returns the recorded data as a json serializable dict.
+            Rigs and rig types are sorted by time, slowest first.
+        """
+        def total(records):
+            return {
+                'time': sum(r['time'] for r in records),
+                'ops': sum(r['ops'] for r in records),
+                'mode_sets': sum(r['mode_sets'] for r in records),
+            }
+
+        def grouped(kind, key):
+            groups = {}
+            for r in self.records:
+                if r['kind'] == kind:
+                    groups.setdefault(key(r), []).append(r)
+            return groups
+
+        rigs = []
+        for (rig_type, bone), records in grouped('rig', lambda r: (r['rig_type'], r['bone'])).items():
+            rig = total(records)
+            rig.update(rig_type=rig_type, bone=bone,
+                       phases={r['name']: total([r]) for r in records})
+            rigs.append(rig)
+        rigs.sort(key=lambda r: -r['time'])
+
+        rig_types = []
+        for rig_type, records in grouped('rig', lambda r: r['rig_type']).items():
+            t = total(records)
+            t.update(rig_type=rig_type, count=len(set(r['bone'] for r in records)))
+            rig_types.append(t)
+        rig_types.sort(key=lambda r: -r['time'])
+
+        return {
+            'total': {'time': sum(r['time'] for r in self.records if r['kind'] == 'stage'),
+                      'ops': self.ops_calls,
+                      'mode_sets': self.mode_sets},
+            'stages': [dict(total([r]), name=r['name']) for r in self.records if r['kind'] == 'stage'],
+            'phases': {name: total(records) for name, records in grouped('phase', lambda r: r['name']).items()},
+            'rig_types': rig_types,
+            'rigs': rigs,
+        }
+
+    def write(self, filepath):
+        with open(filepath, 'w') as f:
+            json.dump(self.report(), f, indent=4, sort_keys=True)
+
+    def print_summary(self, count=10):
+        """ Prints the stages and the slowest rig types and rigs.
+        """
+        report = self.report()
+        line = "    %-40s %9.3fs %6d ops %5d mode_set"
+
+        print("Rigify generation profile:")
+        for stage in report['stages']:
+            print(line % (stage['name'], stage['time'], stage['ops'], stage['mode_sets']))
+        print("  Rig types:")
+        for r in report['rig_types'][:count]:
+            print(line % ("%s (%d)" % (r['rig_type'], r['count']), r['time'], r['ops'], r['mode_sets']))
+        print("  Rigs:")
+        for r in report['rigs'][:count]:
+            print(line % ("%s: %s" % (r['rig_type'], r['bone']), r['time'], r['ops'], r['mode_sets']))
+        total = report['total']
+        print(line % ("Total", total['time'], total['ops'], total['mode_sets']))
+
+
+@contextmanager
+def measure(profiler, kind, name, rig_type="", bone=""):
+    """ Records the enclosed block with profiler, if there is one.
+    """
+    if profiler is None:
+        yield
+        return
+    start = profiler.snapshot()
+    try:
+        yield
+    finally:
+        profiler.add(kind, name, start, rig_type, bone)
+
+
+def get_rig_type_name(rig):
+    """ Returns the rigify type of a rig instance, from its module name.
+    """
+    module = type(rig).__module__
+    return module.split(".rigs.", 1)[-1]
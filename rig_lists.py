@@ -16,10 +16,92 @@
 #
 #======================= END GPL LICENSE BLOCK ========================
 
+import ast
+import json
 import os
 
 from . import utils
 
+MANIFEST_VERSION = 1
+MANIFEST_FILE = os.path.join(os.path.dirname(__file__), "rig_manifest.json")
+
+
+#=======================
+# Rig type manifest
+#=======================
+
+def scan_rig_source(filepath):
+    """ Reads what the rig type list needs from the source of a rig module,
+        without importing it: whether it defines a Rig, is an implementation
+        rig, and the names of the parameters its add_parameters() adds.
+    """
+    entry = {'rig': False, 'implementation': False, 'parameters': []}
+    try:
+        with open(filepath, encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filepath)
+    except (OSError, SyntaxError, ValueError) as e:
+        print("Warning: could not scan rig module %r: %s" % (filepath, e))
+        return entry
+
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == "Rig":
+            entry['rig'] = True
+        elif isinstance(node, ast.ImportFrom):
+            if any((alias.asname or alias.name) == "Rig" for alias in node.names):
+                entry['rig'] = True
+        elif isinstance(node, ast.Assign):
+            names = [t.id for t in node.targets if isinstance(t, ast.Name)]
+            if "Rig" in names:
+                entry['rig'] = True
+            if "IMPLEMENTATION" in names:
+                entry['implementation'] = getattr(node.value, 'value', False) is True
+        elif isinstance(node, ast.FunctionDef) and node.name == "add_parameters" and node.args.args:
+            params = node.args.args[0].arg
+            for sub in ast.walk(node):
+                if isinstance(sub, ast.Assign):
+                    for target in sub.targets:
+                        if isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name) \
+                                and target.value.id == params and target.attr not in entry['parameters']:
+                            entry['parameters'].append(target.attr)
+    return entry
+
+
+def load_manifest():
+    """ Returns the saved {module path: entry} manifest, or an empty one.
+    """
+    try:
+        with open(MANIFEST_FILE) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return manifest.get('modules', {})
+
+
+def save_manifest(modules):
+    try:
+        with open(MANIFEST_FILE, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION, 'modules': modules}, f, indent=1, sort_keys=True)
+    except OSError:
+        # Read-only install, the scan is repeated next time
+        pass
+
+
+def get_manifest_entry(filepath):
+    """ Returns the manifest entry of a rig module source file, rescanning
+        it if it changed since it was scanned.
+    """
+    key = os.path.relpath(filepath, RIG_DIR_ABS).replace(os.sep, "/")
+    mtime = os.path.getmtime(filepath)
+    entry = manifest.get(key)
+    if entry is None or entry['mtime'] != mtime:
+        entry = scan_rig_source(filepath)
+        entry['mtime'] = mtime
+        manifest[key] = entry
+        manifest_changes.append(key)
+    return entry
+
 
 def get_rig_list(path):
     """ Recursively searches for rig types, and returns a list.
@@ -27,8 +109,6 @@ def get_rig_list(path):
     rigs_dict = dict()
     rigs = []
     implementation_rigs = []
-    MODULE_DIR = os.path.dirname(__file__)
-    RIG_DIR_ABS = os.path.join(MODULE_DIR, utils.RIG_DIR)
     SEARCH_DIR_ABS = os.path.join(RIG_DIR_ABS, path)
     files = os.listdir(SEARCH_DIR_ABS)
     files.sort()
@@ -45,11 +125,12 @@ def get_rig_list(path):
 
         if is_dir:
             # Check directories
-            module_name = os.path.join(path, f).replace(os.sep, ".")
-            rig = utils.get_rig_type(module_name)
+            init_file = os.path.join(SEARCH_DIR_ABS, f, "__init__.py")
             # Check if it's a rig itself
-            if hasattr(rig, "Rig"):
+            entry = get_manifest_entry(init_file) if os.path.isfile(init_file) else None
+            if entry and entry['rig']:
                 rigs += [f]
+                manifest_types[os.path.join(path, f).replace(os.sep, ".")] = entry
             else:
                 # Check for sub-rigs
                 sub_dict = get_rig_list(os.path.join(path, f, ""))  # "" adds a final slash
@@ -58,11 +139,11 @@ def get_rig_list(path):
         elif f.endswith(".py"):
             # Check straight-up python files
             t = f[:-3]
-            module_name = os.path.join(path, t).replace(os.sep, ".")
-            rig = utils.get_rig_type(module_name)
-            if hasattr(rig, "Rig"):
+            entry = get_manifest_entry(os.path.join(SEARCH_DIR_ABS, f))
+            if entry['rig']:
                 rigs += [t]
-            if hasattr(rig, 'IMPLEMENTATION') and rig.IMPLEMENTATION:
+                manifest_types[os.path.join(path, t).replace(os.sep, ".")] = entry
+            if entry['implementation']:
                 implementation_rigs += [t]
     rigs.sort()
 
@@ -72,6 +153,20 @@ def get_rig_list(path):
     return rigs_dict
 
 
+def get_rig_types_manifest():
+    """ Builds the rig type list from the manifest, updating and saving it
+        if rig modules changed.
+    """
+    rigs_dict = get_rig_list("")
+    stale = [key for key in manifest if not os.path.isfile(os.path.join(RIG_DIR_ABS, key))]
+    for key in stale:
+        del manifest[key]
+    if manifest_changes or stale:
+        save_manifest(manifest)
+        del manifest_changes[:]
+    return rigs_dict
+
+
 def get_collection_list(rig_list):
     collection_list = []
     for r in rig_list:
@@ -81,8 +176,105 @@ def get_collection_list(rig_list):
     return collection_list
 
 
+class ParameterRecorder:
+    """ Stands in for the RigifyParameters class in a rig type's
+        add_parameters(), recording the names of the parameters it adds.
+    """
+    def __init__(self, params):
+        object.__setattr__(self, "params", params)
+        object.__setattr__(self, "names", [])
+
+    def __getattr__(self, name):
+        return getattr(self.params, name)
+
+    def __setattr__(self, name, value):
+        if name not in self.names:
+            self.names.append(name)
+        setattr(self.params, name, value)
+
+
+def add_rig_parameters(rig_type, rig, params):
+    """ Adds the parameters of a rig type module to params, and records
+        them as the parameters of that rig type.
+    """
+    recorder = ParameterRecorder(params)
+    rig.add_parameters(recorder)
+    rig_parameters[rig_type] = recorder.names
+
+
+def get_rig_parameter_names(rig_type):
+    """ Returns the names of the parameters a rig type adds, or None if
+        the rig type is unknown.
+    """
+    rig_type = rig_type.replace(" ", "")
+    names = rig_parameters.get(rig_type)
+    if names is None and rig_type in manifest_types:
+        names = manifest_types[rig_type]['parameters']
+    return names
+
+
+#=======================
+# Lazy parameter registration
+#=======================
+
+def on_module_loaded(name, module):
+    """ Adds the parameters of a rig module when it is (re)loaded through
+        utils.get_rig_type(), if the parameters class is registered.
+    """
+    prefix = ".%s." % utils.RIG_DIR
+    if parameters_class is None or not name.startswith(prefix):
+        return
+    rig_type = name[len(prefix):]
+    if not hasattr(module, "add_parameters"):
+        rig_parameters[rig_type] = []
+        return
+    try:
+        add_rig_parameters(rig_type, module, parameters_class)
+    except AttributeError:
+        pass
+
+
+def register_parameters(params):
+    """ Makes the rig types add their parameters to params when they are
+        first loaded, instead of importing them all at register.
+    """
+    global parameters_class
+    parameters_class = params
+    utils.add_module_listener(on_module_loaded)
+    for name, module in utils.get_cached_modules():
+        on_module_loaded(name, module)
+
+
+def unregister_parameters():
+    global parameters_class
+    utils.remove_module_listener(on_module_loaded)
+    parameters_class = None
+    rig_parameters.clear()
+
+
+def ensure_rig_parameters(rig_types=None):
+    """ Loads the given rig types (all by default), so their parameters are
+        registered.  Needed before parameters are read or set for rig types
+        that may not have been loaded yet, as when generating or adding a
+        metarig.
+    """
+    for rig_type in (rig_list if rig_types is None else rig_types):
+        rig_type = rig_type.replace(" ", "")
+        if rig_type and rig_type not in rig_parameters:
+            try:
+                utils.get_rig_type(rig_type)
+            except ImportError as e:
+                print("Warning: could not load rig type %r: %s" % (rig_type, e))
+
+
 # Public variables
-rigs_dict = get_rig_list("")
+RIG_DIR_ABS = os.path.join(os.path.dirname(__file__), utils.RIG_DIR)
+manifest = load_manifest()  # {module path: {'mtime', 'rig', 'implementation', 'parameters'}}
+manifest_changes = []
+manifest_types = {}  # {rig type: manifest entry}
+parameters_class = None
+rig_parameters = {}  # {rig type: [parameter names]}, filled as rig types are loaded
+rigs_dict = get_rig_types_manifest()
 rig_list = rigs_dict['rig_list']
 implementation_rigs = rigs_dict['implementation_rigs']
 collection_list = get_collection_list(rig_list)
@@ -0,0 +1,428 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+""" Shared rig UI.
+
+Generated rigs describe their UI as json in the UI_DATA_PROP property of
+the armature, instead of a generated rig_ui.py script:
+
+    {'rig_id': rig_id,
+     'controls': [control, ...],
+     'layers': [[[layer name, layer index], ...], ...]}
+
+Every control is a dict with a 'type' and the 'bones' whose selection
+shows it, as made by ui_prop() and ui_limb_snap().  One set of panels and
+snapping operators, registered with the add-on, draws the UI of any rig.
+"""
+
+import json
+
+import bpy
+from bpy.props import StringProperty
+
+from .rig_ui_template import fk2ik_arm, ik2fk_arm, fk2ik_leg, ik2fk_leg, rotPoleToggle
+
+UI_DATA_PROP = "rigify_ui"
+ROOT_LAYER = 28
+
+_rig_uis = {}  # {armature name: (json text, RigUIData)}
+
+
+#=======================
+# UI description
+#=======================
+
+def ui_prop(bones, bone, prop, text=None, slider=True, optional=False):
+    """ A custom property of bone, shown when any of bones is selected.
+        An optional property is only shown if bone has it.
+    """
+    return {'type': 'prop', 'bones': list(bones), 'bone': bone, 'prop': prop,
+            'text': text, 'slider': slider, 'optional': optional}
+
+
+def ui_limb_snap(bones, limb_type, controls, ik_ctrl, fk_ctrl, parent, pole):
+    """ The IK/FK snapping and rotation-pole buttons of an arm or a leg,
+        shown when any of bones is selected.
+    """
+    return {'type': 'limb_snap', 'bones': list(bones), 'limb_type': limb_type,
+            'controls': list(controls), 'ik_ctrl': list(ik_ctrl), 'fk_ctrl': fk_ctrl,
+            'parent': parent, 'pole': pole}
+
+
+def get_layer_rows(layers, layout):
+    """ Returns the layer buttons of the visible layers as rows of at most
+        four [name, index] pairs, from the layer visibility booleans and the
+        (name, row) layer layout of the metarig.
+    """
+    rows = {}
+    for i in range(ROOT_LAYER):
+        if layers[i]:
+            rows.setdefault(layout[i][1], []).append([layout[i][0], i])
+
+    layer_rows = []
+    for key in sorted(rows):
+        row = rows[key]
+        layer_rows += [row[i:i + 4] for i in range(0, len(row), 4)]
+    return layer_rows
+
+
+def make_ui_data(rig_id, controls, layer_rows):
+    """ Returns the json text of a rig UI description.
+    """
+    return json.dumps({'rig_id': rig_id, 'controls': controls, 'layers': layer_rows},
+                      separators=(',', ':'))
+
+
+class RigUIData:
+    """ A parsed rig UI description, with the controls of every bone.
+    """
+    def __init__(self, text):
+        data = json.loads(text)
+        self.rig_id = data.get('rig_id')
+        self.controls = data.get('controls', [])
+        self.layers = data.get('layers', [])
+
+        self.bone_controls = {}  # {bone name: [control indices]}
+        for i, control in enumerate(self.controls):
+            for name in control['bones']:
+                indices = self.bone_controls.setdefault(name, [])
+                if not indices or indices[-1] != i:
+                    indices.append(i)
+
+    def selected_controls(self, bone_names):
+        """ Returns the controls to show for the selected bones, in order.
+        """
+        indices = set()
+        for name in bone_names:
+            indices.update(self.bone_controls.get(name, ()))
+        return [self.controls[i] for i in sorted(indices)]
+
+
+def get_rig_ui(obj):
+    """ Returns the RigUIData of a generated rig, or None.
+        The description is parsed once, and again only when it changes.
+    """
+    if obj is None or obj.type != 'ARMATURE':
+        return None
+    text = obj.data.get(UI_DATA_PROP)
+    if text is None:
+        return None
+
+    entry = _rig_uis.get(obj.data.name)
+    if entry is None or entry[0] != text:
+        entry = (text, RigUIData(text))
+        _rig_uis[obj.data.name] = entry
+    return entry[1]
+
+
+def get_snap_operator(rig, name):
+    """ Returns the snapping operator name ('arm_fk2ik', 'leg_ik2fk', ...)
+        of rig, shared or generated by its rig_ui.py script.
+    """
+    if UI_DATA_PROP in rig.data:
+        return getattr(bpy.ops.pose, 'rigify_' + name)
+    return getattr(bpy.ops.pose, 'rigify_' + name + '_' + rig.data['rig_id'])
+
+
+#=======================
+# Drawing
+#=======================
+
+def draw_prop(layout, pose_bones, control):
+    pbone = pose_bones[control['bone']]
+    if control['optional'] and control['prop'] not in pbone:
+        return
+    path = '["%s"]' % control['prop']
+    if control['text'] is None:
+        layout.prop(pbone, path, slider=control['slider'])
+    else:
+        layout.prop(pbone, path, text=control['text'], slider=control['slider'])
+
+
+def draw_limb_snap(layout, pose_bones, control):
+    controls = control['controls']
+    ik_ctrl = control['ik_ctrl']
+    fk_ctrl = control['fk_ctrl']
+    parent = control['parent']
+    pole = control['pole']
+
+    if control['limb_type'] == 'arm':
+        props = layout.operator("pose.rigify_arm_fk2ik", text="Snap FK->IK (" + fk_ctrl + ")")
+        props.uarm_fk = controls[1]
+        props.farm_fk = controls[2]
+        props.hand_fk = controls[3]
+        props.uarm_ik = controls[0]
+        props.farm_ik = ik_ctrl[1]
+        props.hand_ik = controls[4]
+        props = layout.operator("pose.rigify_arm_ik2fk", text="Snap IK->FK (" + fk_ctrl + ")")
+        props.uarm_fk = controls[1]
+        props.farm_fk = controls[2]
+        props.hand_fk = controls[3]
+        props.uarm_ik = controls[0]
+        props.farm_ik = ik_ctrl[1]
+        props.hand_ik = controls[4]
+        props.pole = pole
+        props.main_parent = parent
+        props = layout.operator("pose.rigify_rot2pole", text="Switch Rotation-Pole")
+    else:
+        props = layout.operator("pose.rigify_leg_fk2ik", text="Snap FK->IK (" + fk_ctrl + ")")
+        props.thigh_fk = controls[1]
+        props.shin_fk = controls[2]
+        props.foot_fk = controls[3]
+        props.mfoot_fk = controls[7]
+        props.thigh_ik = controls[0]
+        props.shin_ik = ik_ctrl[1]
+        props.foot_ik = ik_ctrl[2]
+        props.mfoot_ik = ik_ctrl[2]
+        props = layout.operator("pose.rigify_leg_ik2fk", text="Snap IK->FK (" + fk_ctrl + ")")
+        props.thigh_fk = controls[1]
+        props.shin_fk = controls[2]
+        props.foot_fk = controls[3]
+        props.mfoot_fk = controls[7]
+        props.thigh_ik = controls[0]
+        props.shin_ik = ik_ctrl[1]
+        props.foot_ik = controls[6]
+        props.pole = pole
+        props.footroll = controls[5]
+        props.mfoot_ik = ik_ctrl[2]
+        props.main_parent = parent
+        props = layout.operator("pose.rigify_rot2pole", text="Toggle Rotation and Pole")
+
+    props.bone_name = controls[1]
+    props.limb_type = control['limb_type']
+    props.controls = str(controls)
+    props.ik_ctrl = str(ik_ctrl)
+    props.fk_ctrl = str(fk_ctrl)
+    props.parent = str(parent)
+    props.pole = str(pole)
+
+
+CONTROL_DRAW = {
+    'prop': draw_prop,
+    'limb_snap': draw_limb_snap,
+}
+
+
+class VIEW3D_PT_rigify_rig_ui(bpy.types.Panel):
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'UI'
+    bl_label = "Rig Main Properties"
+
+    @classmethod
+    def poll(cls, context):
+        if context.mode != 'POSE':
+            return False
+        rig_ui = get_rig_ui(context.active_object)
+        return rig_ui is not None and bool(rig_ui.controls)
+
+    def draw(self, context):
+        layout = self.layout
+        rig_ui = get_rig_ui(context.active_object)
+        pose_bones = context.active_object.pose.bones
+
+        selected_bones = set(bone.name for bone in context.selected_pose_bones or ())
+        if context.active_pose_bone:
+            selected_bones.add(context.active_pose_bone.name)
+
+        for control in rig_ui.selected_controls(selected_bones):
+            draw = CONTROL_DRAW.get(control['type'])
+            if draw:
+                draw(layout, pose_bones, control)
+
+
+class VIEW3D_PT_rigify_rig_layers(bpy.types.Panel):
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'UI'
+    bl_label = "Rig Layers"
+
+    @classmethod
+    def poll(cls, context):
+        return get_rig_ui(context.active_object) is not None
+
+    def draw(self, context):
+        layout = self.layout
+        arm = context.active_object.data
+        col = layout.column()
+
+        for layer_row in get_rig_ui(context.active_object).layers:
+            row = col.row()
+            for name, index in layer_row:
+                row.prop(arm, 'layers', index=index, toggle=True, text=name)
+
+        # Root layer
+        row = col.row()
+        row.separator()
+        row = col.row()
+        row.separator()
+        row = col.row()
+        row.prop(arm, 'layers', index=ROOT_LAYER, toggle=True, text='Root')
+
+
+#=======================
+# IK/FK snapping operators
+#=======================
+
+class SnapOperator:
+    bl_options = {'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        return (context.active_object is not None and context.mode == 'POSE')
+
+    def execute(self, context):
+        use_global_undo = context.user_preferences.edit.use_global_undo
+        context.user_preferences.edit.use_global_undo = False
+        try:
+            self.snap(context.active_object)
+        finally:
+            context.user_preferences.edit.use_global_undo = use_global_undo
+        return {'FINISHED'}
+
+
+class POSE_OT_rigify_arm_fk2ik(SnapOperator, bpy.types.Operator):
+    """ Snaps an FK arm to an IK arm.
+    """
+    bl_idname = "pose.rigify_arm_fk2ik"
+    bl_label = "Rigify Snap FK arm to IK"
+
+    uarm_fk = StringProperty(name="Upper Arm FK Name")
+    farm_fk = StringProperty(name="Forerm FK Name")
+    hand_fk = StringProperty(name="Hand FK Name")
+
+    uarm_ik = StringProperty(name="Upper Arm IK Name")
+    farm_ik = StringProperty(name="Forearm IK Name")
+    hand_ik = StringProperty(name="Hand IK Name")
+
+    def snap(self, obj):
+        fk2ik_arm(obj, fk=[self.uarm_fk, self.farm_fk, self.hand_fk],
+                  ik=[self.uarm_ik, self.farm_ik, self.hand_ik])
+
+
+class POSE_OT_rigify_arm_ik2fk(SnapOperator, bpy.types.Operator):
+    """ Snaps an IK arm to an FK arm.
+    """
+    bl_idname = "pose.rigify_arm_ik2fk"
+    bl_label = "Rigify Snap IK arm to FK"
+
+    uarm_fk = StringProperty(name="Upper Arm FK Name")
+    farm_fk = StringProperty(name="Forerm FK Name")
+    hand_fk = StringProperty(name="Hand FK Name")
+
+    uarm_ik = StringProperty(name="Upper Arm IK Name")
+    farm_ik = StringProperty(name="Forearm IK Name")
+    hand_ik = StringProperty(name="Hand IK Name")
+    pole = StringProperty(name="Pole IK Name")
+
+    main_parent = StringProperty(name="Main Parent", default="")
+
+    def snap(self, obj):
+        ik2fk_arm(obj, fk=[self.uarm_fk, self.farm_fk, self.hand_fk],
+                  ik=[self.uarm_ik, self.farm_ik, self.hand_ik, self.pole, self.main_parent])
+
+
+class POSE_OT_rigify_leg_fk2ik(SnapOperator, bpy.types.Operator):
+    """ Snaps an FK leg to an IK leg.
+    """
+    bl_idname = "pose.rigify_leg_fk2ik"
+    bl_label = "Rigify Snap FK leg to IK"
+
+    thigh_fk = StringProperty(name="Thigh FK Name")
+    shin_fk = StringProperty(name="Shin FK Name")
+    foot_fk = StringProperty(name="Foot FK Name")
+    mfoot_fk = StringProperty(name="MFoot FK Name")
+
+    thigh_ik = StringProperty(name="Thigh IK Name")
+    shin_ik = StringProperty(name="Shin IK Name")
+    foot_ik = StringProperty(name="Foot IK Name")
+    mfoot_ik = StringProperty(name="MFoot IK Name")
+
+    def snap(self, obj):
+        fk2ik_leg(obj, fk=[self.thigh_fk, self.shin_fk, self.foot_fk, self.mfoot_fk],
+                  ik=[self.thigh_ik, self.shin_ik, self.foot_ik, self.mfoot_ik])
+
+
+class POSE_OT_rigify_leg_ik2fk(SnapOperator, bpy.types.Operator):
+    """ Snaps an IK leg to an FK leg.
+    """
+    bl_idname = "pose.rigify_leg_ik2fk"
+    bl_label = "Rigify Snap IK leg to FK"
+
+    thigh_fk = StringProperty(name="Thigh FK Name")
+    shin_fk = StringProperty(name="Shin FK Name")
+    mfoot_fk = StringProperty(name="MFoot FK Name")
+    foot_fk = StringProperty(name="Foot FK Name", default="")
+    thigh_ik = StringProperty(name="Thigh IK Name")
+    shin_ik = StringProperty(name="Shin IK Name")
+    foot_ik = StringProperty(name="Foot IK Name")
+    footroll = StringProperty(name="Foot Roll Name")
+    pole = StringProperty(name="Pole IK Name")
+    mfoot_ik = StringProperty(name="MFoot IK Name")
+
+    main_parent = StringProperty(name="Main Parent", default="")
+
+    def snap(self, obj):
+        ik2fk_leg(obj, fk=[self.thigh_fk, self.shin_fk, self.mfoot_fk, self.foot_fk],
+                  ik=[self.thigh_ik, self.shin_ik, self.foot_ik, self.footroll, self.pole,
+                      self.mfoot_ik, self.main_parent])
+
+
+class POSE_OT_rigify_rot2pole(bpy.types.Operator):
+    bl_idname = "pose.rigify_rot2pole"
+    bl_label = "Rotation - Pole toggle"
+    bl_description = "Toggles IK chain between rotation and pole target"
+
+    bone_name = StringProperty(default='')
+    limb_type = StringProperty(name="Limb Type")
+    controls = StringProperty(name="Controls string")
+    ik_ctrl = StringProperty(name="IK Controls string")
+    fk_ctrl = StringProperty(name="FK Controls string")
+    parent = StringProperty(name="Parent name")
+    pole = StringProperty(name="Pole name")
+
+    def execute(self, context):
+        rig = context.object
+
+        if self.bone_name:
+            bpy.ops.pose.select_all(action='DESELECT')
+            rig.pose.bones[self.bone_name].bone.select = True
+
+        rotPoleToggle(rig, self.limb_type, self.controls, self.ik_ctrl, self.fk_ctrl, self.parent, self.pole)
+        return {'FINISHED'}
+
+
+def register():
+    bpy.utils.register_class(POSE_OT_rigify_arm_fk2ik)
+    bpy.utils.register_class(POSE_OT_rigify_arm_ik2fk)
+    bpy.utils.register_class(POSE_OT_rigify_leg_fk2ik)
+    bpy.utils.register_class(POSE_OT_rigify_leg_ik2fk)
+    bpy.utils.register_class(POSE_OT_rigify_rot2pole)
+    bpy.utils.register_class(VIEW3D_PT_rigify_rig_ui)
+    bpy.utils.register_class(VIEW3D_PT_rigify_rig_layers)
+
+
+def unregister():
+    bpy.utils.unregister_class(POSE_OT_rigify_arm_fk2ik)
+    bpy.utils.unregister_class(POSE_OT_rigify_arm_ik2fk)
+    bpy.utils.unregister_class(POSE_OT_rigify_leg_fk2ik)
+    bpy.utils.unregister_class(POSE_OT_rigify_leg_ik2fk)
+    bpy.utils.unregister_class(POSE_OT_rigify_rot2pole)
+    bpy.utils.unregister_class(VIEW3D_PT_rigify_rig_ui)
+    bpy.utils.unregister_class(VIEW3D_PT_rigify_rig_layers)
+    _rig_uis.clear()
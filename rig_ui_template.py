@@ -18,12 +18,13 @@
 
 # <pep8 compliant>
 
-UI_SLIDERS = '''
+import inspect
+
 import bpy
 from mathutils import Matrix, Vector
 from math import acos, pi, radians
 
-rig_id = "%s"
+_rest_matrices = {}  # {(armature name, bone name): (rest matrix, inverse)}
 
 
 ############################
@@ -59,76 +60,47 @@ def rotation_difference(mat1, mat2):
         angle = -angle + (2*pi)
     return angle
 
-def tail_distance(angle,bone_ik,bone_fk):
-    """ Returns the distance between the tails of two bones
-        after rotating bone_ik in AXIS_ANGLE mode.
-    """
-    rot_mod=bone_ik.rotation_mode
-    if rot_mod != 'AXIS_ANGLE':
-        bone_ik.rotation_mode = 'AXIS_ANGLE'
-    bone_ik.rotation_axis_angle[0] = angle
-    bpy.context.scene.update()
-
-    dv = (bone_fk.tail - bone_ik.tail).length
-
-    bone_ik.rotation_mode = rot_mod
-    return dv
 
-def find_min_range(bone_ik,bone_fk,f=tail_distance,delta=pi/8):
-    """ finds the range where lies the minimum of function f applied on bone_ik and bone_fk
-        at a certain angle.
-    """
-    rot_mod=bone_ik.rotation_mode
-    if rot_mod != 'AXIS_ANGLE':
-        bone_ik.rotation_mode = 'AXIS_ANGLE'
-
-    start_angle = bone_ik.rotation_axis_angle[0]
-    angle = start_angle
-    while (angle > (start_angle - 2*pi)) and (angle < (start_angle + 2*pi)):
-        l_dist = f(angle-delta,bone_ik,bone_fk)
-        c_dist = f(angle,bone_ik,bone_fk)
-        r_dist = f(angle+delta,bone_ik,bone_fk)
-        if min((l_dist,c_dist,r_dist)) == c_dist:
-            bone_ik.rotation_mode = rot_mod
-            return (angle-delta,angle+delta)
-        else:
-            angle=angle+delta
+#########################################
+## "Visual Transform" helper functions ##
+#########################################
 
-def ternarySearch(f, left, right, bone_ik, bone_fk, absolutePrecision):
+def get_rest_matrices(bone):
+    """ Returns the rest matrix of an armature bone and its inverse.
+        The inverse is cached until the rest matrix changes.
     """
-    Find minimum of unimodal function f() within [left, right]
-    To find the maximum, revert the if/else statement or revert the comparison.
+    key = (bone.id_data.name, bone.name)
+    rest = bone.matrix_local
+    entry = _rest_matrices.get(key)
+    if entry is None or entry[0] != rest:
+        entry = (rest.copy(), rest.inverted())
+        _rest_matrices[key] = entry
+    return entry
+
+
+def get_parent_matrix(pose_bone, moved=None):
+    """ Returns the armature-space matrix of pose_bone's parent, taken
+        from moved, {bone name: matrix}, if the parent was just posed.
     """
-    while True:
-        #left and right are the current bounds; the maximum is between them
-        if abs(right - left) < absolutePrecision:
-            return (left + right)/2
-
-        leftThird = left + (right - left)/3
-        rightThird = right - (right - left)/3
+    if moved and pose_bone.parent.name in moved:
+        return moved[pose_bone.parent.name]
+    return pose_bone.parent.matrix
 
-        if f(leftThird, bone_ik, bone_fk) > f(rightThird, bone_ik, bone_fk):
-            left = leftThird
-        else:
-            right = rightThird
 
-#########################################
-## "Visual Transform" helper functions ##
-#########################################
-
-def get_pose_matrix_in_other_space(mat, pose_bone):
+def get_pose_matrix_in_other_space(mat, pose_bone, moved=None):
     """ Returns the transform matrix relative to pose_bone's current
         transform space.  In other words, presuming that mat is in
         armature space, slapping the returned matrix onto pose_bone
         should give it the armature-space transforms of mat.
+        moved holds the matrices of the bones posed since the last
+        update, see match_pose_matrix().
         TODO: try to handle cases with axis-scaled parents better.
     """
-    rest = pose_bone.bone.matrix_local.copy()
-    rest_inv = rest.inverted()
+    rest, rest_inv = get_rest_matrices(pose_bone.bone)
     if pose_bone.parent:
-        par_mat = pose_bone.parent.matrix.copy()
+        par_mat = get_parent_matrix(pose_bone, moved)
         par_inv = par_mat.inverted()
-        par_rest = pose_bone.parent.bone.matrix_local.copy()
+        par_rest = get_rest_matrices(pose_bone.parent.bone)[0]
     else:
         par_mat = Matrix()
         par_inv = Matrix()
@@ -145,6 +117,18 @@ def get_pose_matrix_in_other_space(mat, pose_bone):
     return smat
 
 
+def get_posed_matrix(pose_bone, moved=None):
+    """ Returns the armature-space matrix pose_bone gets from its
+        transform channels, without updating the armature.
+        Constraints are not taken into account.
+    """
+    rest = get_rest_matrices(pose_bone.bone)[0]
+    if pose_bone.parent:
+        par_rest_inv = get_rest_matrices(pose_bone.parent.bone)[1]
+        return get_parent_matrix(pose_bone, moved) * (par_rest_inv * rest) * pose_bone.matrix_basis
+    return rest * pose_bone.matrix_basis
+
+
 def get_local_pose_matrix(pose_bone):
     """ Returns the local transform matrix of the given pose bone.
     """
@@ -160,13 +144,13 @@ def set_pose_translation(pose_bone, mat):
     else:
         loc = mat.to_translation()
 
-        rest = pose_bone.bone.matrix_local.copy()
+        rest = get_rest_matrices(pose_bone.bone)[0]
         if pose_bone.bone.parent:
-            par_rest = pose_bone.bone.parent.matrix_local.copy()
+            par_rest_inv = get_rest_matrices(pose_bone.bone.parent)[1]
         else:
-            par_rest = Matrix()
+            par_rest_inv = Matrix()
 
-        q = (par_rest.inverted() * rest).to_quaternion()
+        q = (par_rest_inv * rest).to_quaternion()
         pose_bone.location = q * loc
 
 
@@ -194,106 +178,155 @@ def set_pose_scale(pose_bone, mat):
     pose_bone.scale = mat.to_scale()
 
 
-def match_pose_translation(pose_bone, target_bone):
+def set_pose_matrix(pose_bone, mat, moved=None, translation=True, rotation=True, scale=True):
+    """ Sets the translation, rotation and scale of pose_bone from mat,
+        given in the bone's local space.
+        If moved is given, the armature-space matrix the bone gets is
+        stored in it, so the bones posed after it don't need an update.
+        Bones with constraints can't be predicted, the pose is updated
+        for them instead.
+    """
+    if translation:
+        set_pose_translation(pose_bone, mat)
+    if rotation:
+        set_pose_rotation(pose_bone, mat)
+    if scale:
+        set_pose_scale(pose_bone, mat)
+    if moved is not None:
+        if pose_bone.constraints:
+            update_pose()
+            # All the pose matrices are up to date now
+            moved.clear()
+        else:
+            moved[pose_bone.name] = get_posed_matrix(pose_bone, moved)
+
+
+def match_pose_matrix(pose_bone, mat, moved=None, translation=True, rotation=True, scale=True):
+    """ Matches pose_bone's visual transforms to the armature-space
+        matrix mat.  See set_pose_matrix() for moved.
+    """
+    smat = get_pose_matrix_in_other_space(mat, pose_bone, moved)
+    set_pose_matrix(pose_bone, smat, moved, translation, rotation, scale)
+
+
+def match_pose_translation(pose_bone, target_bone, moved=None):
     """ Matches pose_bone's visual translation to target_bone's visual
         translation.
-        This function assumes you are in pose mode on the relevant armature.
     """
-    mat = get_pose_matrix_in_other_space(target_bone.matrix, pose_bone)
-    set_pose_translation(pose_bone, mat)
-    bpy.ops.object.mode_set(mode='OBJECT')
-    bpy.ops.object.mode_set(mode='POSE')
+    match_pose_matrix(pose_bone, target_bone.matrix, moved, rotation=False, scale=False)
 
 
-def match_pose_rotation(pose_bone, target_bone):
+def match_pose_rotation(pose_bone, target_bone, moved=None):
     """ Matches pose_bone's visual rotation to target_bone's visual
         rotation.
-        This function assumes you are in pose mode on the relevant armature.
     """
-    mat = get_pose_matrix_in_other_space(target_bone.matrix, pose_bone)
-    set_pose_rotation(pose_bone, mat)
-    bpy.ops.object.mode_set(mode='OBJECT')
-    bpy.ops.object.mode_set(mode='POSE')
+    match_pose_matrix(pose_bone, target_bone.matrix, moved, translation=False, scale=False)
 
 
-def match_pose_scale(pose_bone, target_bone):
+def match_pose_scale(pose_bone, target_bone, moved=None):
     """ Matches pose_bone's visual scale to target_bone's visual
         scale.
-        This function assumes you are in pose mode on the relevant armature.
     """
-    mat = get_pose_matrix_in_other_space(target_bone.matrix, pose_bone)
-    set_pose_scale(pose_bone, mat)
-    bpy.ops.object.mode_set(mode='OBJECT')
-    bpy.ops.object.mode_set(mode='POSE')
+    match_pose_matrix(pose_bone, target_bone.matrix, moved, translation=False, rotation=False)
 
-def correct_rotation(bone_ik, bone_fk):
-    """ Corrects the ik rotation in ik2fk snapping functions
-    """
 
-    alfarange = find_min_range(bone_ik,bone_fk)
-    alfamin = ternarySearch(tail_distance,alfarange[0],alfarange[1],bone_ik,bone_fk,0.1)
+def update_pose():
+    """ Updates the pose matrices, once the snapping is done.
+    """
+    bpy.context.scene.update()
 
-    rot_mod = bone_ik.rotation_mode
-    if rot_mod != 'AXIS_ANGLE':
-        bone_ik.rotation_mode = 'AXIS_ANGLE'
-    bone_ik.rotation_axis_angle[0] = alfamin
-    bone_ik.rotation_mode = rot_mod
 
 ##############################
 ## IK/FK snapping functions ##
 ##############################
 
-def match_pole_target(ik_first, ik_last, pole, match_bone, length):
+def get_chain_frame(head, joint, tail):
+    """ Returns the orientation of a two bone chain as a 3x3 matrix,
+        with Y pointing from head to tail and Z towards the joint,
+        or None if the chain is straight.
+    """
+    y = tail - head
+    if y.length < 1e-6:
+        return None
+    y.normalize()
+    z = joint - head
+    z -= y * z.dot(y)
+    if z.length < 1e-5:
+        return None
+    z.normalize()
+    return Matrix((y.cross(z), y, z)).transposed()
+
+
+def get_chain_rotation(ik_first, ik_last, match_bone, match_last):
+    """ Returns the armature-space rotation taking the rest pose of
+        the IK chain ik_first, ik_last to the pose of the matching chain
+        match_bone, match_last, as a 3x3 matrix.
+        Straight chains have no bend plane, they follow match_bone.
+    """
+    rest_frame = get_chain_frame(ik_first.bone.head_local, ik_last.bone.head_local, ik_last.bone.tail_local)
+    frame = None
+    if match_last is not None:
+        frame = get_chain_frame(match_bone.head, match_last.head, match_last.tail)
+    if rest_frame is None or frame is None:
+        rest_inv = get_rest_matrices(match_bone.bone)[1]
+        return match_bone.matrix.to_3x3().normalized() * rest_inv.to_3x3()
+    return frame * rest_frame.transposed()
+
+
+def match_ik_rotation(ik_first, ik_last, match_bone, match_last=None, moved=None):
+    """ Rotates ik_first, the first bone of an IK chain without pole
+        target, so that the chain bends in the plane of the matching
+        chain.  The IK solver then only has to change the bend angle.
+    """
+    rot = get_chain_rotation(ik_first, ik_last, match_bone, match_last)
+    rot = rot * get_rest_matrices(ik_first.bone)[0].to_3x3()
+    scale = match_bone.matrix.to_scale()
+
+    mat = rot.to_4x4()
+    for i in range(3):
+        mat.col[i] *= scale[i]
+    mat.translation = match_bone.head
+    match_pose_matrix(ik_first, mat, moved)
+
+
+def match_pole_target(ik_first, ik_last, pole, match_bone, length, match_last=None, moved=None):
     """ Places an IK chain's pole target to match ik_first's
         transforms to match_bone.  All bones should be given as pose bones.
-        You need to be in pose mode on the relevant armature object.
         ik_first: first bone in the IK chain
         ik_last:  last bone in the IK chain
         pole:  pole target bone for the IK chain
         match_bone:  bone to match ik_first to (probably first bone in a matching FK chain)
         length:  distance pole target should be placed from the chain center
-    """
-    a = ik_first.matrix.to_translation()
-    b = ik_last.matrix.to_translation() + ik_last.vector
+        match_last:  last bone of the matching chain
 
-    # Vector from the head of ik_first to the
-    # tip of ik_last
+        The pole keeps the place it has in the rest pose relative to the
+        bend plane of the chain, computed from the matching chain instead
+        of searched for by updating the IK solution.
+    """
+    a_rest = ik_first.bone.head_local
+    b_rest = ik_last.bone.tail_local
+    axis_rest = (b_rest - a_rest).normalized()
+    pv_rest = pole.bone.head_local - a_rest
+    pv_rest -= axis_rest * pv_rest.dot(axis_rest)
+
+    rot = get_chain_rotation(ik_first, ik_last, match_bone, match_last)
+    a = match_bone.head
+    if match_last is not None:
+        b = match_last.tail
+    else:
+        b = a + rot * (b_rest - a_rest)
     ikv = b - a
 
-    # Get a vector perpendicular to ikv
-    pv = perpendicular_vector(ikv).normalized() * length
-
-    def set_pole(pvi):
-        """ Set pole target's position based on a vector
-            from the arm center line.
-        """
-        # Translate pvi into armature space
-        ploc = a + (ikv/2) + pvi
-
-        # Set pole target to location
-        mat = get_pose_matrix_in_other_space(Matrix.Translation(ploc), pole)
-        set_pose_translation(pole, mat)
-
-        bpy.ops.object.mode_set(mode='OBJECT')
-        bpy.ops.object.mode_set(mode='POSE')
-
-    set_pole(pv)
-
-    # Get the rotation difference between ik_first and match_bone
-    angle = rotation_difference(ik_first.matrix, match_bone.matrix)
+    pv = rot * pv_rest
+    pv -= ikv.normalized() * pv.dot(ikv.normalized())
+    if pv.length < 1e-6:
+        pv = perpendicular_vector(ikv)
 
-    # Try compensating for the rotation difference in both directions
-    pv1 = Matrix.Rotation(angle, 4, ikv) * pv
-    set_pole(pv1)
-    ang1 = rotation_difference(ik_first.matrix, match_bone.matrix)
+    # Translate pv into armature space
+    ploc = a + (ikv / 2) + pv.normalized() * length
 
-    pv2 = Matrix.Rotation(-angle, 4, ikv) * pv
-    set_pole(pv2)
-    ang2 = rotation_difference(ik_first.matrix, match_bone.matrix)
-
-    # Do the one with the smaller angle
-    if ang1 < ang2:
-        set_pole(pv1)
+    # Set pole target to location
+    match_pose_matrix(pole, Matrix.Translation(ploc), moved, rotation=False, scale=False)
 
 
 def fk2ik_arm(obj, fk, ik):
@@ -308,6 +341,7 @@ def fk2ik_arm(obj, fk, ik):
     uarmi = obj.pose.bones[ik[0]]
     farmi = obj.pose.bones[ik[1]]
     handi = obj.pose.bones[ik[2]]
+    moved = {}
 
     if 'auto_stretch' in handi.keys():
         # This is kept for compatibility with legacy rigify Human
@@ -319,31 +353,24 @@ def fk2ik_arm(obj, fk, ik):
             uarm['stretch_length'] *= diff
 
         # Upper arm position
-        match_pose_rotation(uarm, uarmi)
-        match_pose_scale(uarm, uarmi)
+        match_pose_matrix(uarm, uarmi.matrix, moved, translation=False)
 
         # Forearm position
-        match_pose_rotation(farm, farmi)
-        match_pose_scale(farm, farmi)
+        match_pose_matrix(farm, farmi.matrix, moved, translation=False)
 
         # Hand position
-        match_pose_rotation(hand, handi)
-        match_pose_scale(hand, handi)
+        match_pose_matrix(hand, handi.matrix, moved, translation=False)
     else:
         # Upper arm position
-        match_pose_translation(uarm, uarmi)
-        match_pose_rotation(uarm, uarmi)
-        match_pose_scale(uarm, uarmi)
+        match_pose_matrix(uarm, uarmi.matrix, moved)
 
         # Forearm position
-        #match_pose_translation(hand, handi)
-        match_pose_rotation(farm, farmi)
-        match_pose_scale(farm, farmi)
+        match_pose_matrix(farm, farmi.matrix, moved, translation=False)
 
         # Hand position
-        match_pose_translation(hand, handi)
-        match_pose_rotation(hand, handi)
-        match_pose_scale(hand, handi)
+        match_pose_matrix(hand, handi.matrix, moved)
+
+    update_pose()
 
 
 def ik2fk_arm(obj, fk, ik):
@@ -366,30 +393,20 @@ def ik2fk_arm(obj, fk, ik):
     else:
         pole = None
 
+    moved = {}
 
-    if pole:
-        # Stretch
-        # handi['stretch_length'] = uarm['stretch_length']
+    # Hand position
+    match_pose_matrix(handi, hand.matrix, moved)
 
-        # Hand position
-        match_pose_translation(handi, hand)
-        match_pose_rotation(handi, hand)
-        match_pose_scale(handi, hand)
+    if pole:
         # Pole target position
-        match_pole_target(uarmi, farmi, pole, uarm, (uarmi.length + farmi.length))
-
+        match_pole_target(uarmi, farmi, pole, uarm, (uarmi.length + farmi.length), farm, moved)
     else:
-        # Hand position
-        match_pose_translation(handi, hand)
-        match_pose_rotation(handi, hand)
-        match_pose_scale(handi, hand)
+        # Upper Arm position, bent like the FK arm
+        match_ik_rotation(uarmi, farmi, uarm, farm, moved)
+
+    update_pose()
 
-        # Upper Arm position
-        match_pose_translation(uarmi, uarm)
-        match_pose_rotation(uarmi, uarm)
-        match_pose_scale(uarmi, uarm)
-        # Rotation Correction
-        correct_rotation(uarmi, uarm)
 
 def fk2ik_leg(obj, fk, ik):
     """ Matches the fk bones in a leg rig to the ik bones.
@@ -405,6 +422,7 @@ def fk2ik_leg(obj, fk, ik):
     shini  = obj.pose.bones[ik[1]]
     footi  = obj.pose.bones[ik[2]]
     mfooti = obj.pose.bones[ik[3]]
+    moved = {}
 
     if 'auto_stretch' in footi.keys():
         # This is kept for compatibility with legacy rigify Human
@@ -416,38 +434,20 @@ def fk2ik_leg(obj, fk, ik):
             thigh['stretch_length'] *= diff
 
         # Thigh position
-        match_pose_rotation(thigh, thighi)
-        match_pose_scale(thigh, thighi)
-
-        # Shin position
-        match_pose_rotation(shin, shini)
-        match_pose_scale(shin, shini)
-
-        # Foot position
-        mat = mfoot.bone.matrix_local.inverted() * foot.bone.matrix_local
-        footmat = get_pose_matrix_in_other_space(mfooti.matrix, foot) * mat
-        set_pose_rotation(foot, footmat)
-        set_pose_scale(foot, footmat)
-        bpy.ops.object.mode_set(mode='OBJECT')
-        bpy.ops.object.mode_set(mode='POSE')
-
+        match_pose_matrix(thigh, thighi.matrix, moved, translation=False)
     else:
         # Thigh position
-        match_pose_translation(thigh, thighi)
-        match_pose_rotation(thigh, thighi)
-        match_pose_scale(thigh, thighi)
+        match_pose_matrix(thigh, thighi.matrix, moved)
 
-        # Shin position
-        match_pose_rotation(shin, shini)
-        match_pose_scale(shin, shini)
+    # Shin position
+    match_pose_matrix(shin, shini.matrix, moved, translation=False)
 
-        # Foot position
-        mat = mfoot.bone.matrix_local.inverted() * foot.bone.matrix_local
-        footmat = get_pose_matrix_in_other_space(mfooti.matrix, foot) * mat
-        set_pose_rotation(foot, footmat)
-        set_pose_scale(foot, footmat)
-        bpy.ops.object.mode_set(mode='OBJECT')
-        bpy.ops.object.mode_set(mode='POSE')
+    # Foot position
+    mat = get_rest_matrices(mfoot.bone)[1] * get_rest_matrices(foot.bone)[0]
+    footmat = get_pose_matrix_in_other_space(mfooti.matrix, foot, moved) * mat
+    set_pose_matrix(foot, footmat, moved, translation=False)
+
+    update_pose()
 
 
 def ik2fk_leg(obj, fk, ik):
@@ -476,27 +476,20 @@ def ik2fk_leg(obj, fk, ik):
         pole = None
     mfooti   = obj.pose.bones[ik[5]]
 
-    if (not pole) and (foot):
+    moved = {}
 
-        # Clear footroll
-        set_pose_rotation(footroll, Matrix())
+    # Clear footroll
+    set_pose_matrix(footroll, Matrix(), moved, translation=False, scale=False)
 
-        # Foot position
-        mat = mfooti.bone.matrix_local.inverted() * footi.bone.matrix_local
-        footmat = get_pose_matrix_in_other_space(foot.matrix, footi) * mat
-        set_pose_translation(footi, footmat)
-        set_pose_rotation(footi, footmat)
-        set_pose_scale(footi, footmat)
-        bpy.ops.object.mode_set(mode='OBJECT')
-        bpy.ops.object.mode_set(mode='POSE')
+    mat = get_rest_matrices(mfooti.bone)[1] * get_rest_matrices(footi.bone)[0]
 
-        # Thigh position
-        match_pose_translation(thighi, thigh)
-        match_pose_rotation(thighi, thigh)
-        match_pose_scale(thighi, thigh)
+    if (not pole) and (foot):
+        # Foot position
+        footmat = get_pose_matrix_in_other_space(foot.matrix, footi, moved) * mat
+        set_pose_matrix(footi, footmat, moved)
 
-        # Rotation Correction
-        correct_rotation(thighi,thigh)
+        # Thigh position, bent like the FK leg
+        match_ik_rotation(thighi, shini, thigh, shin, moved)
 
     else:
         # Stretch
@@ -504,20 +497,18 @@ def ik2fk_leg(obj, fk, ik):
             # Kept for compat with legacy rigify Human
             footi['stretch_length'] = thigh['stretch_length']
 
-        # Clear footroll
-        set_pose_rotation(footroll, Matrix())
-
         # Foot position
-        mat = mfooti.bone.matrix_local.inverted() * footi.bone.matrix_local
-        footmat = get_pose_matrix_in_other_space(mfoot.matrix, footi) * mat
-        set_pose_translation(footi, footmat)
-        set_pose_rotation(footi, footmat)
-        set_pose_scale(footi, footmat)
-        bpy.ops.object.mode_set(mode='OBJECT')
-        bpy.ops.object.mode_set(mode='POSE')
+        footmat = get_pose_matrix_in_other_space(mfoot.matrix, footi, moved) * mat
+        set_pose_matrix(footi, footmat, moved)
 
-        # Pole target position
-        match_pole_target(thighi, shini, pole, thigh, (thighi.length + shini.length))
+        if pole:
+            # Pole target position
+            match_pole_target(thighi, shini, pole, thigh, (thighi.length + shini.length), shin, moved)
+        else:
+            # Thigh position, bent like the FK leg
+            match_ik_rotation(thighi, shini, thigh, shin, moved)
+
+    update_pose()
 
 
 ################################
@@ -530,13 +521,12 @@ def parse_bone_names(names_string):
     else:
         return names_string
 
-def rotPoleToggle(rig, limb_type, controls, ik_ctrl, fk_ctrl, parent, pole):
+def rotPoleToggle(rig, limb_type, controls, ik_ctrl, fk_ctrl, parent, pole, op_suffix=''):
 
-    rig_id = rig.data['rig_id']
-    leg_fk2ik = eval('bpy.ops.pose.rigify_leg_fk2ik_' + rig_id)
-    arm_fk2ik = eval('bpy.ops.pose.rigify_arm_fk2ik_' + rig_id)
-    leg_ik2fk = eval('bpy.ops.pose.rigify_leg_ik2fk_' + rig_id)
-    arm_ik2fk = eval('bpy.ops.pose.rigify_arm_ik2fk_' + rig_id)
+    leg_fk2ik = getattr(bpy.ops.pose, 'rigify_leg_fk2ik' + op_suffix)
+    arm_fk2ik = getattr(bpy.ops.pose, 'rigify_arm_fk2ik' + op_suffix)
+    leg_ik2fk = getattr(bpy.ops.pose, 'rigify_leg_ik2fk' + op_suffix)
+    arm_ik2fk = getattr(bpy.ops.pose, 'rigify_arm_ik2fk' + op_suffix)
 
     controls = parse_bone_names(controls)
     ik_ctrl = parse_bone_names(ik_ctrl)
@@ -589,6 +579,38 @@ def rotPoleToggle(rig, limb_type, controls, ik_ctrl, fk_ctrl, parent, pole):
 
             bpy.ops.pose.select_all(action='DESELECT')
 
+
+# The functions above are also written into the generated rig_ui.py scripts
+UI_FUNCTIONS = (
+    perpendicular_vector, rotation_difference,
+    get_rest_matrices, get_parent_matrix, get_pose_matrix_in_other_space,
+    get_posed_matrix, get_local_pose_matrix,
+    set_pose_translation, set_pose_rotation, set_pose_scale, set_pose_matrix,
+    match_pose_matrix, match_pose_translation, match_pose_rotation, match_pose_scale,
+    update_pose,
+    get_chain_frame, get_chain_rotation, match_ik_rotation, match_pole_target,
+    fk2ik_arm, ik2fk_arm, fk2ik_leg, ik2fk_leg,
+    parse_bone_names, rotPoleToggle,
+)
+
+
+def get_functions_source(functions=UI_FUNCTIONS):
+    """ Returns the source code of functions, escaped for % formatting.
+    """
+    return "\n\n".join(inspect.getsource(f) for f in functions).replace('%', '%%')
+
+
+UI_SLIDERS = '''
+import bpy
+from mathutils import Matrix, Vector
+from math import acos, pi, radians
+
+rig_id = "%s"
+_rest_matrices = {}
+
+
+''' + get_functions_source() + '''
+
 ##############################
 ## IK/FK snapping operators ##
 ##############################
@@ -741,7 +763,7 @@ class Rigify_Rot2PoleSwitch(bpy.types.Operator):
             bpy.ops.pose.select_all(action='DESELECT')
             rig.pose.bones[self.bone_name].bone.select = True
 
-        rotPoleToggle(rig, self.limb_type, self.controls, self.ik_ctrl, self.fk_ctrl, self.parent, self.pole)
+        rotPoleToggle(rig, self.limb_type, self.controls, self.ik_ctrl, self.fk_ctrl, self.parent, self.pole, '_' + rig_id)
         return {'FINISHED'}
 
 ###################
@@ -786,59 +808,6 @@ class RigUI(bpy.types.Panel):
 '''
 
 
-def layers_ui(layers, layout):
-    """ Turn a list of booleans + a list of names into a layer UI.
-    """
-
-    code = '''
-class RigLayers(bpy.types.Panel):
-    bl_space_type = 'VIEW_3D'
-    bl_region_type = 'UI'
-    bl_label = "Rig Layers"
-    bl_idname = rig_id + "_PT_rig_layers"
-
-    @classmethod
-    def poll(self, context):
-        try:
-            return (context.active_object.data.get("rig_id") == rig_id)
-        except (AttributeError, KeyError, TypeError):
-            return False
-
-    def draw(self, context):
-        layout = self.layout
-        col = layout.column()
-'''
-    rows = {}
-    for i in range(28):
-        if layers[i]:
-            if layout[i][1] not in rows:
-                rows[layout[i][1]] = []
-            rows[layout[i][1]] += [(layout[i][0], i)]
-
-    keys = list(rows.keys())
-    keys.sort()
-
-    for key in keys:
-        code += "\n        row = col.row()\n"
-        i = 0
-        for l in rows[key]:
-            if i > 3:
-                code += "\n        row = col.row()\n"
-                i = 0
-            code += "        row.prop(context.active_object.data, 'layers', index=%s, toggle=True, text='%s')\n" % (str(l[1]), l[0])
-            i += 1
-
-    # Root layer
-    code += "\n        row = col.row()"
-    code += "\n        row.separator()"
-    code += "\n        row = col.row()"
-    code += "\n        row.separator()\n"
-    code += "\n        row = col.row()\n"
-    code += "        row.prop(context.active_object.data, 'layers', index=28, toggle=True, text='Root')\n"
-
-    return code
-
-
 UI_REGISTER = '''
 
 def register():
@@ -848,16 +817,14 @@ def register():
     bpy.utils.register_class(Rigify_Leg_IK2FK)
     bpy.utils.register_class(Rigify_Rot2PoleSwitch)
     bpy.utils.register_class(RigUI)
-    bpy.utils.register_class(RigLayers)
 
 def unregister():
     bpy.utils.unregister_class(Rigify_Arm_FK2IK)
     bpy.utils.unregister_class(Rigify_Arm_IK2FK)
     bpy.utils.unregister_class(Rigify_Leg_FK2IK)
     bpy.utils.unregister_class(Rigify_Leg_IK2FK)
-    bpy.utils.register_class(Rigify_Rot2PoleSwitch)
+    bpy.utils.unregister_class(Rigify_Rot2PoleSwitch)
     bpy.utils.unregister_class(RigUI)
-    bpy.utils.unregister_class(RigLayers)
 
 register()
 '''
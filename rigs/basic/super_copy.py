@@ -20,7 +20,7 @@
 
 import bpy
 
-from ...utils import copy_bone
+from ...utils import copy_bone, copy_pose_bones
 from ...utils import strip_org, make_deformer_name
 from ...utils import create_bone_widget, create_circle_widget
 
@@ -41,51 +41,65 @@ class Rig:
         self.make_control = params.make_control
         self.make_widget  = params.make_widget
         self.make_deform  = params.make_deform
+        self.copies       = []  # [(bone name, copy name)], see copy_pose_bones()
 
-    def generate(self):
-        """ Generate the rig.
-            Do NOT modify any of the original bones, except for adding constraints.
-            The main armature should be selected and active before this is called.
-
+    def generate_bones(self):
+        """ Create the control and deformation bones.
+            Runs in edit mode, the pose bones of the copies are set up in
+            generate_constraints().
         """
-        bpy.ops.object.mode_set(mode='EDIT')
-
         # Make a control bone (copy of original).
         if self.make_control:
-            bone = copy_bone(self.obj, self.org_bone, self.org_name)
+            self.bone = copy_bone(self.obj, self.org_bone, self.org_name, copy_pose=False)
+            self.copies.append((self.org_bone, self.bone))
 
         # Make a deformation bone (copy of original, child of original).
         if self.make_deform:
-            def_bone = copy_bone(self.obj, self.org_bone, make_deformer_name(self.org_name))
-
-        # Get edit bones
-        eb = self.obj.data.edit_bones
-        # UNUSED
-        # if self.make_control:
-        #     bone_e = eb[bone]
-        if self.make_deform:
-            def_bone_e = eb[def_bone]
+            def_bone = copy_bone(self.obj, self.org_bone, make_deformer_name(self.org_name), copy_pose=False)
+            self.copies.append((self.org_bone, def_bone))
 
-        # Parent
-        if self.make_deform:
-            def_bone_e.use_connect = False
-            def_bone_e.parent = eb[self.org_bone]
+            # Parent
+            eb = self.obj.data.edit_bones
+            eb[def_bone].use_connect = False
+            eb[def_bone].parent = eb[self.org_bone]
 
-        bpy.ops.object.mode_set(mode='OBJECT')
-        pb = self.obj.pose.bones
+    def generate_constraints(self):
+        """ Constrain the original bone to the control.
+            Runs in object mode.
+        """
+        copy_pose_bones(self.obj, self.copies)
 
         if self.make_control:
-            # Constrain the original bone.
+            pb = self.obj.pose.bones
             con = pb[self.org_bone].constraints.new('COPY_TRANSFORMS')
             con.name = "copy_transforms"
             con.target = self.obj
-            con.subtarget = bone
+            con.subtarget = self.bone
 
-            # Create control widget
+    def generate_widgets(self):
+        """ Create the control widget.
+            Runs in object mode.
+        """
+        if self.make_control:
             if self.make_widget:
-                create_circle_widget(self.obj, bone, radius=0.5)
+                create_circle_widget(self.obj, self.bone, radius=0.5)
             else:
-                create_bone_widget(self.obj, bone)
+                create_bone_widget(self.obj, self.bone)
+
+    def generate(self):
+        """ Generate the rig.
+            Do NOT modify any of the original bones, except for adding constraints.
+            The main armature should be selected and active before this is called.
+
+            generate_rig() runs the phases above directly, this is kept for
+            callers generating a single rig.
+        """
+        bpy.ops.object.mode_set(mode='EDIT')
+        self.generate_bones()
+
+        bpy.ops.object.mode_set(mode='OBJECT')
+        self.generate_constraints()
+        self.generate_widgets()
 
 
 def add_parameters(params):
@@ -2,6 +2,7 @@ import bpy
 from mathutils import Vector
 from math import pi
 from ...utils import copy_bone, flip_bone, put_bone, org, align_bone_y_axis, align_bone_x_axis, align_bone_z_axis
+from ...utils import get_edit_bones, get_pose_bones
 from ...utils import strip_org, make_deformer_name, connected_children_names
 from ...utils import create_circle_widget, create_sphere_widget, create_widget, create_chain_widget
 from ...utils import MetarigError, make_mechanism_name, create_cube_widget
@@ -128,7 +129,7 @@ class Rig:
         org_bones  = self.org_bones
 
         bpy.ops.object.mode_set(mode='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         if not pivot:
             pivot = int(len(org_bones)/2)
@@ -181,7 +182,7 @@ class Rig:
         pivot_name = org_bones[pivot-1]
 
         bpy.ops.object.mode_set(mode ='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         # Create torso control bone
         torso_name = 'torso'
@@ -214,7 +215,7 @@ class Rig:
         org_bones = self.org_bones
 
         bpy.ops.object.mode_set(mode='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         def_bones = []
         for o in org_bones:
@@ -241,7 +242,7 @@ class Rig:
         org_bones = self.org_bones
 
         bpy.ops.object.mode_set(mode ='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         # Create neck control
         neck    = copy_bone( self.obj, org(neck_bones[0]), 'neck' )
@@ -303,7 +304,7 @@ class Rig:
         org_bones = self.org_bones
 
         bpy.ops.object.mode_set(mode ='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         # get total spine length
 
@@ -342,7 +343,7 @@ class Rig:
         org_bones = self.org_bones
 
         bpy.ops.object.mode_set(mode ='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         # Create hips control bone
         hips = copy_bone( self.obj, org( hip_bones[-1] ), 'hips' )
@@ -389,7 +390,7 @@ class Rig:
         org_bones = self.org_bones
 
         bpy.ops.object.mode_set(mode='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         twk, mch, mch_ctrl, ctrl = [], [], [], []
 
@@ -570,7 +571,7 @@ class Rig:
         org_bones = self.org_bones
 
         bpy.ops.object.mode_set(mode ='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         # Parent deform bones
         for i, b in enumerate(bones['def']):
@@ -705,7 +706,7 @@ class Rig:
 
     def make_constraint(self, bone, constraint):
         bpy.ops.object.mode_set(mode='OBJECT')
-        pb = self.obj.pose.bones
+        pb = get_pose_bones(self.obj)
 
         owner_pb = pb[bone]
         const = owner_pb.constraints.new(constraint['constraint'])
@@ -904,7 +905,7 @@ class Rig:
     def stick_to_bendy_bones(self, bones):
         bpy.ops.object.mode_set(mode='OBJECT')
         deform = bones['def']
-        pb = self.obj.pose.bones
+        pb = get_pose_bones(self.obj)
 
         if len(deform) > 1:  # Only for single bone sup chain
             return
@@ -926,7 +927,7 @@ class Rig:
 
     def create_drivers(self, bones):
         bpy.ops.object.mode_set(mode ='OBJECT')
-        pb = self.obj.pose.bones
+        pb = get_pose_bones(self.obj)
 
         # Setting the torso's props
         torso = pb[ bones['pivot']['ctrl'] ]
@@ -969,7 +970,7 @@ class Rig:
 
     def locks_and_widgets(self, bones):
         bpy.ops.object.mode_set(mode='OBJECT')
-        pb = self.obj.pose.bones
+        pb = get_pose_bones(self.obj)
 
         #Locks
         mch_ctrl = bones['chain']['mch_ctrl']
@@ -1125,7 +1126,7 @@ class Rig:
         self.SINGLE_BONE = (len(self.org_bones) == 1)
 
         bpy.ops.object.mode_set(mode ='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         bones = {}
         if eb[self.org_bones[0]].parent:
@@ -1175,7 +1176,7 @@ class Rig:
 
             # # TEST
             # bpy.ops.object.mode_set(mode ='EDIT')
-            # eb = self.obj.data.edit_bones
+            # eb = get_edit_bones(self.obj)
             #
             # self.parent_bones(      bones )
             # self.constrain_bones(   bones )
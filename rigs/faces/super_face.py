@@ -1,24 +1,15 @@
 import bpy, re
 from   mathutils      import Vector
-from   ...utils       import copy_bone, flip_bone
+from   ...utils       import copy_bone, copy_bones, flip_bone
+from   ...utils       import get_edit_bones, get_pose_bones
 from   ...utils       import org, strip_org, make_deformer_name, connected_children_names, make_mechanism_name
 from   ...utils       import create_circle_widget, create_sphere_widget, create_widget, create_cube_widget
 from   ...utils       import MetarigError
+from   ...rig_ui_runtime import ui_prop
 from   rna_prop_ui    import rna_idprop_ui_prop_get
 from   ..widgets import create_face_widget, create_eye_widget, create_eyes_widget, create_ear_widget, create_jaw_widget, create_teeth_widget
 
 
-script = """
-all_controls   = [%s]
-jaw_ctrl_name  = '%s'
-eyes_ctrl_name = '%s'
-
-if is_selected(all_controls):
-    layout.prop(pose_bones[jaw_ctrl_name],  '["%s"]', slider=True)
-    layout.prop(pose_bones[eyes_ctrl_name], '["%s"]', slider=True)
-"""
-
-
 class Rig:
 
     def __init__(self, obj, bone_name, params):
@@ -64,7 +55,7 @@ class Rig:
     def orient_org_bones(self):
 
         bpy.ops.object.mode_set(mode='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         # Adjust eye bones roll
         eb['ORG-eye.L'].roll = 0.0
@@ -87,9 +78,9 @@ class Rig:
         org_bones = self.org_bones
 
         bpy.ops.object.mode_set(mode='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
-        def_bones = []
+        def_pairs = []
         for org in org_bones:
             # POE 2018-09-23 extra deforms on eyes / teeth
             #if 'face' in org or 'teeth' in org or 'eye' in org:
@@ -101,10 +92,11 @@ class Rig:
             if not self.extra_def_eyes and 'eye' in org:
                 continue
 
-            def_name = make_deformer_name( strip_org( org ) )
-            def_name = copy_bone( self.obj, org, def_name )
-            def_bones.append( def_name )
+            def_pairs.append( ( org, make_deformer_name( strip_org( org ) ) ) )
+
+        def_bones = copy_bones( self.obj, def_pairs )
 
+        for def_name in def_bones:
             eb[def_name].use_connect = False
             eb[def_name].parent      = None
 
@@ -132,7 +124,7 @@ class Rig:
 
         ## create control bones
         bpy.ops.object.mode_set(mode='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         eyeL_ctrl_name = strip_org(bones['eyes'][0])
         eyeR_ctrl_name = strip_org(bones['eyes'][1])
@@ -258,7 +250,7 @@ class Rig:
 
         ## create tweak bones
         bpy.ops.object.mode_set(mode ='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         tweaks = []
 
@@ -308,7 +300,7 @@ class Rig:
                 tweaks.append( tweak_name )
 
         bpy.ops.object.mode_set(mode ='OBJECT')
-        pb = self.obj.pose.bones
+        pb = get_pose_bones(self.obj)
 
         primary_tweaks = [
             "lid.B.L.002", "lid.T.L.002", "lid.B.R.002", "lid.T.R.002",
@@ -379,7 +371,7 @@ class Rig:
     def create_mch(self, jaw_ctrl, tongue_ctrl):
         org_bones = self.org_bones
         bpy.ops.object.mode_set(mode ='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         # Create eyes mch bones
         eyes = [ bone for bone in org_bones if 'eye' in bone ]
@@ -474,7 +466,7 @@ class Rig:
     def parent_bones(self, all_bones, tweak_unique):
         org_bones = self.org_bones
         bpy.ops.object.mode_set(mode ='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         face_name = [ bone for bone in org_bones if 'face' in bone ].pop()
 
@@ -661,7 +653,7 @@ class Rig:
     def make_constraits(self, constraint_type, bone, subtarget, influence = 1):
         org_bones = self.org_bones
         bpy.ops.object.mode_set(mode ='OBJECT')
-        pb = self.obj.pose.bones
+        pb = get_pose_bones(self.obj)
 
         owner_pb = pb[bone]
 
@@ -942,7 +934,7 @@ class Rig:
     def drivers_and_props( self, all_bones ):
 
         bpy.ops.object.mode_set(mode ='OBJECT')
-        pb = self.obj.pose.bones
+        pb = get_pose_bones(self.obj)
 
         jaw_ctrl  = all_bones['ctrls']['jaw'][0]
         eyes_ctrl = all_bones['ctrls']['eyes'][2]
@@ -994,7 +986,7 @@ class Rig:
     def create_bones(self):
         org_bones = self.org_bones
         bpy.ops.object.mode_set(mode ='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         # Clear parents for org bones
         for bone in [ bone for bone in org_bones if 'face' not in bone ]:
@@ -1035,14 +1027,10 @@ class Rig:
             for bone in group:
                 all_ctrls.append( bone )
 
-        controls_string = ", ".join(["'" + x + "'" for x in all_ctrls])
-        return [ script % (
-            controls_string,
-            all_bones['ctrls']['jaw'][0],
-            all_bones['ctrls']['eyes'][2],
-            jaw_prop,
-            eyes_prop )
-            ]
+        return [[
+            ui_prop(all_ctrls, all_bones['ctrls']['jaw'][0], jaw_prop),
+            ui_prop(all_ctrls, all_bones['ctrls']['eyes'][2], eyes_prop),
+            ]]
 
 
 def add_parameters(params):
@@ -2443,8 +2431,9 @@ def create_sample(obj):
         arm.edit_bones.active = bone
 
 
-def create_square_widget(rig, bone_name, size=1.0, bone_transform_name=None):
-    obj = create_widget(rig, bone_name, bone_transform_name)
+def create_square_widget(rig, bone_name, size=1.0, bone_transform_name=None, shared=True):
+    shape_key = widget_shape_key('square', size)
+    obj = create_widget(rig, bone_name, bone_transform_name, shape_key, shared)
     if obj is not None:
         verts = [
             (  0.5 * size, -2.9802322387695312e-08 * size,  0.5 * size ),
@@ -1,10 +1,11 @@
 
 import bpy, re, math
 from ..widgets import create_foot_widget, create_ballsocket_widget, create_gear_widget
-from .ui import create_script
+from .ui import create_ui
 from .limb_utils import *
 from mathutils import Vector
-from ...utils import copy_bone, flip_bone, put_bone, create_cube_widget
+from ...utils import copy_bone, copy_bones, flip_bone, put_bone, create_cube_widget
+from ...utils import get_edit_bones, get_pose_bones
 from ...utils import strip_org, strip_mch, make_deformer_name, create_widget
 from ...utils import create_circle_widget, create_sphere_widget, create_line_widget
 from ...utils import MetarigError, make_mechanism_name, org
@@ -13,21 +14,11 @@ from ...utils import align_bone_y_axis, align_bone_x_axis, align_bone_z_axis
 # POE bones
 from ...utils import copy_bone_simple, strip_def, mch, create_bone_widget
 # over POE bones
+from ...rig_ui_runtime import ui_prop
 from rna_prop_ui import rna_idprop_ui_prop_get
 from ..widgets import create_ikarrow_widget
 from math import trunc, pi
 
-extra_script = """
-controls = [%s]
-ctrl    = '%s'
-
-if is_selected( controls ):
-    layout.prop( pose_bones[ ctrl ], '["%s"]')
-    if '%s' in pose_bones[ctrl].keys():
-        layout.prop( pose_bones[ ctrl ], '["%s"]', slider = True )
-    if '%s' in pose_bones[ctrl].keys():
-        layout.prop( pose_bones[ ctrl ], '["%s"]', slider = True )
-"""
 
 IMPLEMENTATION = True   # Include and set True if Rig is just an implementation for a wrapper class
                         # add_parameters and parameters_ui are unused for implementation classes
@@ -68,7 +59,7 @@ class Rig:
 
         print('limbs.super_limb.leg.orient_org_bones')
         bpy.ops.object.mode_set(mode='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         thigh = self.org_bones[0]
         org_bones = list(
@@ -127,7 +118,7 @@ class Rig:
         org_bones = self.org_bones
 
         bpy.ops.object.mode_set(mode='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         name = get_bone_name( strip_org( org_bones[0] ), 'mch', 'parent' )
 
@@ -158,7 +149,7 @@ class Rig:
         })
 
         # Limb Follow Driver
-        pb = self.obj.pose.bones
+        pb = get_pose_bones(self.obj)
 
         name = 'FK_limb_follow'
 
@@ -193,7 +184,7 @@ class Rig:
         print('limbs.super_limb.leg.create_tweak')
         org_bones = self.org_bones
         bpy.ops.object.mode_set(mode ='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         tweaks         = {}
         tweaks['ctrl'] = []
@@ -299,7 +290,7 @@ class Rig:
                 })
 
         # Ctrl bones Locks and Widgets
-        pb = self.obj.pose.bones
+        pb = get_pose_bones(self.obj)
         for t in tweaks['ctrl']:
             pb[t].lock_rotation = True, False, True
             pb[t].lock_scale    = False, True, False
@@ -317,7 +308,7 @@ class Rig:
         org_bones = self.org_bones
 
         bpy.ops.object.mode_set(mode ='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         def_bones = []
         for i, org in enumerate(org_bones):
@@ -379,7 +370,7 @@ class Rig:
 
 
         # Rubber hose drivers
-        pb = self.obj.pose.bones
+        pb = get_pose_bones(self.obj)
         for i, t in enumerate(tweaks[1:-1]):
             # Create custom property on tweak bone to control rubber hose
             name = 'rubber_tweak'
@@ -426,7 +417,7 @@ class Rig:
         org_bones = self.org_bones
 
         bpy.ops.object.mode_set(mode='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         ctrl = get_bone_name(org_bones[0], 'ctrl', 'ik')
         mch_ik = get_bone_name(org_bones[0], 'mch', 'ik')
@@ -509,7 +500,7 @@ class Rig:
             'subtarget': org_bones[1],
         })
 
-        pb = self.obj.pose.bones
+        pb = get_pose_bones(self.obj)
 
         make_constraint(self, vispole, {
             'constraint': 'STRETCH_TO',
@@ -557,13 +548,9 @@ class Rig:
         org_bones = self.org_bones.copy()
 
         bpy.ops.object.mode_set(mode='EDIT')
-        eb = self.obj.data.edit_bones
-
-        ctrls = []
+        eb = get_edit_bones(self.obj)
 
-        for o in org_bones:
-            bone = copy_bone(self.obj, o, get_bone_name( o, 'ctrl', 'fk'))
-            ctrls.append(bone)
+        ctrls = copy_bones(self.obj, [(o, get_bone_name( o, 'ctrl', 'fk')) for o in org_bones])
 
         # MCH
         mch = copy_bone(
@@ -587,7 +574,7 @@ class Rig:
         })
 
         # Locks and widgets
-        pb = self.obj.pose.bones
+        pb = get_pose_bones(self.obj)
         pb[ctrls[2]].lock_location = True, True, True
 
         create_limb_widget(self.obj, ctrls[0])
@@ -605,7 +592,7 @@ class Rig:
 
         print('limbs.super_limb.leg.org_parenting_and_switch')
         bpy.ops.object.mode_set(mode='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
         # re-parent ORGs in a connected chain
         for i, o in enumerate(org_bones):
             if i > 0:
@@ -614,7 +601,7 @@ class Rig:
                     eb[o].use_connect = True
 
         bpy.ops.object.mode_set(mode='OBJECT')
-        pb = self.obj.pose.bones
+        pb = get_pose_bones(self.obj)
         pb_parent = pb[parent]
 
         # Create ik/fk switch property
@@ -661,7 +648,7 @@ class Rig:
         bones['ik']['ctrl']['terminal'] = []
 
         bpy.ops.object.mode_set(mode='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         # Create toes def bone
         toes_def = get_bone_name(org_bones[-1], 'def')
@@ -931,7 +918,7 @@ class Rig:
                 'owner_space': 'LOCAL'
             })
 
-        pb = self.obj.pose.bones
+        pb = get_pose_bones(self.obj)
         if self.rot_axis == 'x'or self.rot_axis == 'automatic':
             ik_rot_axis = pb[org_bones[0]].x_axis
         elif self.rot_axis == 'z':
@@ -1105,7 +1092,7 @@ class Rig:
         # over POE bones constraints, widgets & Layers
 
         bpy.ops.object.mode_set(mode='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         if len(org_bones) >= 4:
             # Create toes control bone
@@ -1137,7 +1124,7 @@ class Rig:
             })
 
             # Find IK/FK switch property
-            pb = self.obj.pose.bones
+            pb = get_pose_bones(self.obj)
             prop = rna_idprop_ui_prop_get( pb[bones['fk']['ctrl'][-1]], 'IK_FK' )
 
             # Modify rotation mode for ik and tweak controls
@@ -1183,7 +1170,7 @@ class Rig:
 
         print('limbs.super_limb.leg.create_drivers')
         bpy.ops.object.mode_set(mode='OBJECT')
-        pb = self.obj.pose.bones
+        pb = get_pose_bones(self.obj)
 
         ctrl = pb[bones['ik']['mch_foot'][0]]
         ctrl_pole = pb[bones['ik']['mch_foot'][1]]
@@ -1453,7 +1440,7 @@ class Rig:
 
         print('limbs.super_limb.leg.generate')
         bpy.ops.object.mode_set(mode='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         # Adjust org-bones rotation
         self.orient_org_bones()
@@ -1484,13 +1471,12 @@ class Rig:
         controls.append(bones['main_parent'])
 
         # Create UI
-        controls_string = ", ".join(["'" + x + "'" for x in controls])
-
-        script = create_script(bones, 'leg')
-        script += extra_script % (controls_string, bones['main_parent'], 'IK_follow',
-                                  'pole_follow', 'pole_follow', 'root/parent', 'root/parent')
+        ui = create_ui(bones, 'leg')
+        ui.append(ui_prop(controls, bones['main_parent'], 'IK_follow', slider=False))
+        ui.append(ui_prop(controls, bones['main_parent'], 'pole_follow', optional=True))
+        ui.append(ui_prop(controls, bones['main_parent'], 'root/parent', optional=True))
 
-        return [script]
+        return [ui]
 
 
 def add_parameters(params):
@@ -2,17 +2,11 @@ import bpy
 from mathutils import Vector
 from ...utils import copy_bone, flip_bone
 from ...utils import strip_org, make_deformer_name, connected_children_names, make_mechanism_name
-from ...utils import create_circle_widget, create_sphere_widget, create_widget
+from ...utils import create_circle_widget, create_sphere_widget, create_widget, widget_shape_key
 from ...utils import MetarigError
+from ...rig_ui_runtime import ui_prop
 from rna_prop_ui import rna_idprop_ui_prop_get
 
-script = """
-controls    = [%s]
-master_name = '%s'
-if is_selected(controls):
-    layout.prop(pose_bones[master_name], '["%s"]', text="Curvature", slider=True)
-"""
-
 
 class Rig:
 
@@ -279,7 +273,8 @@ class Rig:
             create_circle_widget(self.obj, ctrl, radius=0.3, head_tail=0.5)
 
         # Create ctrl master widget
-        w = create_widget(self.obj, master_name)
+        shape_key = widget_shape_key('finger_master', 'Z' in self.params.primary_rotation_axis)
+        w = create_widget(self.obj, master_name, shape_key=shape_key)
         if w is not None:
             mesh = w.data
             verts = [(0, 0, 0), (0, 1, 0), (0.05, 1, 0), (0.05, 1.1, 0), (-0.05, 1.1, 0), (-0.05, 1, 0)]
@@ -297,10 +292,8 @@ class Rig:
         create_circle_widget(self.obj, tip_name, radius=0.3, head_tail=0.0)
 
         # Create UI
-        controls_string = ", ".join(
-            ["'" + x + "'" for x in ctrl_chain]
-            ) + ", " + "'" + master_name + "'"
-        return [script % (controls_string, master_name, 'finger_curve')]
+        controls = ctrl_chain + [master_name]
+        return [[ui_prop(controls, master_name, 'finger_curve', text="Curvature")]]
 
 
 def add_parameters(params):
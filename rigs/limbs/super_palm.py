@@ -26,7 +26,7 @@ import bpy
 from ...utils import MetarigError
 from ...utils import copy_bone
 from ...utils import strip_org, deformer
-from ...utils import create_widget
+from ...utils import create_widget, widget_shape_key
 
 
 def bone_siblings(obj, bone):
@@ -175,7 +175,7 @@ class Rig:
             i += 1
 
         # Create control widget
-        w = create_widget(self.obj, ctrl)
+        w = create_widget(self.obj, ctrl, shape_key=widget_shape_key('palm', 'Z' in self.palm_rotation_axis))
         if w is not None:
             mesh = w.data
             verts = [
@@ -1,25 +1,14 @@
 import bpy
 from mathutils import Vector
 from ...utils import copy_bone, flip_bone, put_bone, org, align_bone_y_axis, align_bone_x_axis
+from ...utils import get_edit_bones, get_pose_bones
 from ...utils import strip_org, make_deformer_name, connected_children_names
 from ...utils import create_circle_widget, create_sphere_widget, create_neck_bend_widget, create_neck_tweak_widget
 from ..widgets import create_ballsocket_widget
 from ...utils import MetarigError, make_mechanism_name, create_cube_widget
+from ...rig_ui_runtime import ui_prop
 from rna_prop_ui import rna_idprop_ui_prop_get
 
-script = """
-controls = [%s]
-torso    = '%s'
-
-if is_selected( controls ):
-    if hasattr(pose_bones[torso],'["%s"]'):
-        layout.prop( pose_bones[ torso ], '["%s"]', slider = True )
-    if hasattr(pose_bones[torso],'["%s"]'):
-        layout.prop( pose_bones[ torso ], '["%s"]', slider = True )
-    if hasattr(pose_bones[torso],'["%s"]'):
-        layout.prop( pose_bones[ torso ], '["%s"]', slider = True )
-"""
-
 
 class Rig:
 
@@ -104,7 +93,7 @@ class Rig:
                 lower_torso_bones = self.org_bones[:pivot_index ]
 
             torso_bones = upper_torso_bones + lower_torso_bones
-            eb = self.obj.data.edit_bones
+            eb = get_edit_bones(self.obj)
             self.spine_length = sum([eb[b].length for b in torso_bones])
 
             return {
@@ -136,7 +125,7 @@ class Rig:
         pivot_name = org_bones[pivot-1]
 
         bpy.ops.object.mode_set(mode='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         # Create torso control bone
         torso_name = 'torso'
@@ -172,7 +161,7 @@ class Rig:
         org_bones = self.org_bones
 
         bpy.ops.object.mode_set(mode='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         def_bones = []
         for org_b in org_bones:
@@ -186,7 +175,7 @@ class Rig:
         org_bones = self.org_bones
 
         bpy.ops.object.mode_set(mode='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         if not self.use_head:
             return {
@@ -285,7 +274,7 @@ class Rig:
         org_bones = self.org_bones
 
         bpy.ops.object.mode_set(mode='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         # get total spine length
 
@@ -324,7 +313,7 @@ class Rig:
         org_bones = self.org_bones
 
         bpy.ops.object.mode_set(mode='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         # Create hips control bone
         hips = copy_bone(self.obj, org(hip_bones[-1]), 'hips')
@@ -366,7 +355,7 @@ class Rig:
 
     def create_tail(self, tail_bones):
         bpy.ops.object.mode_set(mode='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
         org_bones = self.org_bones
 
         ctrl_chain = []
@@ -433,7 +422,7 @@ class Rig:
     def parent_bones(self, bones):
         org_bones = self.org_bones
         bpy.ops.object.mode_set(mode='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         # Parent deform bones
         for i, b in enumerate(bones['def']):
@@ -565,7 +554,7 @@ class Rig:
 
     def make_constraint(self, bone, constraint):
         bpy.ops.object.mode_set(mode='OBJECT')
-        pb = self.obj.pose.bones
+        pb = get_pose_bones(self.obj)
 
         owner_pb = pb[bone]
         const = owner_pb.constraints.new(constraint['constraint'])
@@ -725,7 +714,7 @@ class Rig:
                     'subtarget': tweaks[tidx + 1],
                 })
 
-        pb = self.obj.pose.bones
+        pb = get_pose_bones(self.obj)
 
         if bones['neck']['neck_bend']:
             pb[bones['neck']['neck_bend']].rotation_mode = 'ZXY'
@@ -751,7 +740,7 @@ class Rig:
 
     def create_drivers(self, bones):
         bpy.ops.object.mode_set(mode='OBJECT')
-        pb = self.obj.pose.bones
+        pb = get_pose_bones(self.obj)
 
         # Setting the torso's props
         torso = pb[bones['pivot']['ctrl']]
@@ -804,7 +793,7 @@ class Rig:
 
     def locks_and_widgets(self, bones):
         bpy.ops.object.mode_set(mode='OBJECT')
-        pb = self.obj.pose.bones
+        pb = get_pose_bones(self.obj)
 
         # deform bones bbone segements
         for bone in bones['def'][:-1]:
@@ -954,7 +943,7 @@ class Rig:
         bone_chains = self.build_bone_structure()
 
         bpy.ops.object.mode_set(mode='EDIT')
-        eb = self.obj.data.edit_bones
+        eb = get_edit_bones(self.obj)
 
         # Clear parents for org bones
         for bone in self.org_bones:
@@ -983,7 +972,7 @@ class Rig:
 
             # TEST
             bpy.ops.object.mode_set(mode='EDIT')
-            eb = self.obj.data.edit_bones
+            eb = get_edit_bones(self.obj)
 
             self.parent_bones(bones)
             self.constrain_bones(bones)
@@ -1001,17 +990,9 @@ class Rig:
             controls.extend(bones['tail']['ctrl'])
 
         # Create UI
-        controls_string = ", ".join(["'" + x + "'" for x in controls])
-        return [script % (
-            controls_string,
-            bones['pivot']['ctrl'],
-            'head_follow',
-            'head_follow',
-            'neck_follow',
-            'neck_follow',
-            'tail_follow',
-            'tail_follow',
-            )]
+        torso = bones['pivot']['ctrl']
+        return [[ui_prop(controls, torso, prop, optional=True)
+                 for prop in ('head_follow', 'neck_follow', 'tail_follow')]]
 
 
 def add_parameters(params):
@@ -1,10 +1,77 @@
 from .limbs.super_limb import Rig as LimbRig
 from ..utils import connected_children_names
+import json
 import re
 
 
+# Generated rigs keep their limbs as json in this armature property:
+# {metarig bone: {'limb_type', 'controls', 'ik_ctrl', 'fk_ctrl', 'parent', 'pole'}}
+LIMB_REGISTRY_PROP = "rigify_limbs"
+LIMB_KEYS = ('limb_type', 'controls', 'ik_ctrl', 'fk_ctrl', 'parent', 'pole')
+
+_limb_registries = {}  # {armature name: (json text, LimbRegistry)}
+
+
+class LimbRegistry:
+    """ The limbs of a generated rig, with the limb of every limb bone.
+    """
+    def __init__(self, limbs):
+        self.limbs = limbs
+        self.bone_limbs = {}  # {bone name: limb key}
+        for key, names in limbs.items():
+            bones = names['controls'] + names['ik_ctrl'] + [names['fk_ctrl'], names['parent'], names['pole']]
+            for name in bones:
+                if name:
+                    self.bone_limbs.setdefault(name, key)
+
+    def get_limbs(self, bone_names):
+        """ Returns the {key: names} of the limbs of bone_names, in the
+            order of the bones.
+        """
+        limbs = {}
+        for name in bone_names:
+            key = self.bone_limbs.get(name)
+            if key is not None and key not in limbs:
+                limbs[key] = self.limbs[key]
+        return limbs
+
+
+def make_limb_registry(ui_scripts):
+    """ Returns the json limb registry of a rig, from the
+        {metarig bone: [ui scripts]} its rigs generated.
+    """
+    limbs = {}
+    for root, scripts in ui_scripts.items():
+        for script in scripts:
+            if isinstance(script, str):
+                continue
+            for control in script:
+                if control['type'] == 'limb_snap':
+                    limbs[root] = {key: control[key] for key in LIMB_KEYS}
+    return json.dumps(limbs, separators=(',', ':'))
+
+
+def get_limb_registry(rig):
+    """ Returns the LimbRegistry of a generated rig, or None for rigs
+        generated without one.
+    """
+    text = rig.data.get(LIMB_REGISTRY_PROP)
+    if text is None:
+        return None
+
+    entry = _limb_registries.get(rig.data.name)
+    if entry is None or entry[0] != text:
+        entry = (text, LimbRegistry(json.loads(text)))
+        _limb_registries[rig.data.name] = entry
+    return entry[1]
+
+
 def get_limb_generated_names(rig):
 
+    registry = get_limb_registry(rig)
+    if registry is not None:
+        return dict(registry.limbs)
+
     pbones = rig.pose.bones
     names = dict()
 
@@ -19,3 +86,23 @@ def get_limb_generated_names(rig):
             names[b.name] = LimbRig.get_future_names(super_limb_orgs)
 
     return names
+
+
+def get_selected_limbs(rig, bone_names):
+    """ Returns the generated names of the limbs of bone_names.
+    """
+    registry = get_limb_registry(rig)
+    if registry is not None:
+        return list(registry.get_limbs(bone_names).values())
+
+    # Rigs generated before the registry, match the bones of every limb
+    limb_generated_names = get_limb_generated_names(rig)
+    limbs = []
+    for name in bone_names:
+        for group in limb_generated_names:
+            names = limb_generated_names[group]
+            if name in names.values() or name in names['controls'] or name in names['ik_ctrl']:
+                limbs.append(names)
+                limb_generated_names.pop(group)
+                break
+    return limbs
@@ -0,0 +1,157 @@
+# <pep8 compliant>
+
+""" Tests of the kinematics module, run without Blender:
+
+    python -m unittest discover -s tests
+"""
+
+import importlib.util
+import os
+import unittest
+
+import numpy as np
+
+# Load the module alone, the add-on package needs bpy
+_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "kinematics.py")
+_spec = importlib.util.spec_from_file_location("kinematics", _path)
+kinematics = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(kinematics)
+
+
+def rot_x(a):
+    c, s = np.cos(a), np.sin(a)
+    return np.array(((1, 0, 0), (0, c, -s), (0, s, c)))
+
+
+def rot_y(a):
+    c, s = np.cos(a), np.sin(a)
+    return np.array(((c, 0, s), (0, 1, 0), (-s, 0, c)))
+
+
+def rot_z(a):
+    c, s = np.cos(a), np.sin(a)
+    return np.array(((c, -s, 0), (s, c, 0), (0, 0, 1)))
+
+
+def translation(x, y, z):
+    mat = np.identity(4)
+    mat[:3, 3] = (x, y, z)
+    return mat
+
+
+def rest_matrix(rot, head):
+    mat = np.identity(4)
+    mat[:3, :3] = rot
+    mat[:3, 3] = head
+    return mat
+
+
+def make_chain(local_location=None):
+    """ Returns a three bone chain, listed children first.
+    """
+    rest = [
+        rest_matrix(rot_x(0.3), (0.0, 2.0, 0.5)),   # hand
+        rest_matrix(rot_z(0.2), (0.0, 1.0, 0.0)),   # forearm
+        rest_matrix(np.identity(3), (0.0, 0.0, 0.0)),  # upper arm
+    ]
+    return kinematics.Skeleton(["hand", "forearm", "upper_arm"], [1, 2, -1], rest, local_location)
+
+
+class RotationTest(unittest.TestCase):
+
+    def test_euler_order(self):
+        x, y, z = 0.3, -0.7, 1.1
+        expected = rot_z(z).dot(rot_y(y)).dot(rot_x(x))
+        np.testing.assert_allclose(kinematics.euler_to_matrix((x, y, z), 'XYZ'), expected, atol=1e-12)
+
+        expected = rot_x(x).dot(rot_y(y)).dot(rot_z(z))
+        np.testing.assert_allclose(kinematics.euler_to_matrix((x, y, z), 'ZYX'), expected, atol=1e-12)
+
+    def test_euler_frames(self):
+        euler = np.array([(0.1, 0.2, 0.3), (-1.0, 0.5, 2.0)])
+        mats = kinematics.euler_to_matrix(euler, 'YXZ')
+        self.assertEqual(mats.shape, (2, 3, 3))
+        for e, mat in zip(euler, mats):
+            expected = rot_z(e[2]).dot(rot_x(e[0])).dot(rot_y(e[1]))
+            np.testing.assert_allclose(mat, expected, atol=1e-12)
+
+    def test_quaternion_axis_angle(self):
+        axis = np.array((1.0, -2.0, 0.5))
+        angle = 0.9
+        unit = axis / np.linalg.norm(axis)
+        quat = np.concatenate(((np.cos(angle / 2),), unit * np.sin(angle / 2)))
+
+        from_quat = kinematics.quaternion_to_matrix(quat)
+        from_axis_angle = kinematics.axis_angle_to_matrix(np.concatenate(((angle,), axis)))
+        np.testing.assert_allclose(from_quat, from_axis_angle, atol=1e-12)
+
+        # Unnormalized quaternions give the same rotation
+        np.testing.assert_allclose(kinematics.quaternion_to_matrix(quat * 3.0), from_quat, atol=1e-12)
+        # The rotation axis is kept
+        np.testing.assert_allclose(from_quat.dot(unit), unit, atol=1e-12)
+
+    def test_zero_rotations(self):
+        np.testing.assert_allclose(kinematics.quaternion_to_matrix((0, 0, 0, 0)), np.identity(3))
+        np.testing.assert_allclose(kinematics.axis_angle_to_matrix((1.0, 0, 0, 0)), np.identity(3))
+
+
+class SkeletonTest(unittest.TestCase):
+
+    def random_local(self, skeleton, frames=5):
+        rng = np.random.RandomState(0)
+        count = len(skeleton.names)
+        location = rng.uniform(-1, 1, (frames, count, 3))
+        rotation = kinematics.euler_to_matrix(rng.uniform(-np.pi, np.pi, (frames, count, 3)))
+        scale = rng.uniform(0.5, 2, (frames, count, 3))
+        return skeleton.get_local_matrices(location, rotation, scale)
+
+    def test_order(self):
+        skeleton = make_chain()
+        self.assertEqual([skeleton.names[i] for i in skeleton.order], ["upper_arm", "forearm", "hand"])
+
+    def test_parenting_loop(self):
+        rest = [np.identity(4)] * 3
+        with self.assertRaises(ValueError):
+            kinematics.Skeleton(["a", "b", "c"], [1, 2, 0], rest)
+
+    def test_rest_pose(self):
+        skeleton = make_chain()
+        local = np.tile(np.identity(4), (2, 3, 1, 1))
+        np.testing.assert_allclose(skeleton.evaluate(local), np.tile(skeleton.rest, (2, 1, 1, 1)), atol=1e-12)
+
+    def test_evaluate(self):
+        skeleton = make_chain()
+        local = self.random_local(skeleton)
+        matrices = skeleton.evaluate(local)
+        rest = skeleton.rest
+
+        upper_arm = rest[2].dot(local[3, 2])
+        forearm = upper_arm.dot(np.linalg.inv(rest[2])).dot(rest[1]).dot(local[3, 1])
+        hand = forearm.dot(np.linalg.inv(rest[1])).dot(rest[0]).dot(local[3, 0])
+        np.testing.assert_allclose(matrices[3], [hand, forearm, upper_arm], atol=1e-12)
+
+    def test_to_local(self):
+        skeleton = make_chain()
+        local = self.random_local(skeleton)
+        np.testing.assert_allclose(skeleton.to_local(skeleton.evaluate(local)), local, atol=1e-9)
+
+    def test_local_location(self):
+        # Without local location, the location moves the bone along the
+        # axes of the parent, not its own
+        skeleton = make_chain([True, False, True])
+        location = np.zeros((1, 3, 3))
+        location[0, 1] = (0.5, 0.0, 0.0)
+        rotation = np.tile(np.identity(3), (1, 3, 1, 1))
+        scale = np.ones((1, 3, 3))
+
+        matrices = skeleton.evaluate(skeleton.get_local_matrices(location, rotation, scale))
+        np.testing.assert_allclose(matrices[0, 1, :3, 3], (0.5, 1.0, 0.0), atol=1e-12)
+
+        local = skeleton.get_local_matrices(location, rotation, scale)
+        np.testing.assert_allclose(local[0, 1, :3, :3], np.identity(3), atol=1e-12)
+        np.testing.assert_allclose(skeleton.rest[1].dot(local[0, 1]), translation(0.5, 0, 0).dot(skeleton.rest[1]),
+                                   atol=1e-12)
+
+
+if __name__ == '__main__':
+    unittest.main()
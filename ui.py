@@ -19,19 +19,27 @@
 # <pep8 compliant>
 
 import bpy
+import os
+from functools import partial
 from bpy.props import StringProperty
 from mathutils import Color
 
 from .utils import get_rig_type, MetarigError
-from .utils import write_metarig, write_widget
+from .utils import clear_module_cache, module_cache_stats
+from .utils import write_metarig
+from .widget_library import add_widget_shape, LIBRARY_FILE
 from .utils import unique_name
 from .utils import upgradeMetarigTypes, outdated_types
-from .utils import get_keyed_frames, bones_in_frame
-from .utils import overwrite_prop_animation
-from .rigs.utils import get_limb_generated_names
+from .utils import get_keyed_frames
+from .rigs.utils import get_limb_generated_names, get_selected_limbs
+from .rig_ui_runtime import get_snap_operator
+from .limb_bake import LimbSnap, bake_limbs
+from .keyframe_index import get_rig_keyframe_index
+from .profiler import GenerateProfiler
 from . import rig_lists
 from . import generate
 from . import rot_mode
+from . import rig_ui_runtime
 # POE 2018-07-27 Pose exporter and importer
 from . import pose_expimp
 # POE 2018-09-08 POE Toolbox (make offset bone)
@@ -160,6 +168,17 @@ class DATA_PT_rigify_buttons(bpy.types.Panel):
                 if id_store.rigify_generate_mode == 'new':
                     row.enabled = False
 
+                row = col.row()
+                row.prop(id_store, "rigify_incremental_update")
+                if id_store.rigify_generate_mode == 'new' or id_store.rigify_force_widget_update:
+                    row.enabled = False
+
+                row = col.row(align=True)
+                row.prop(id_store, "rigify_profile")
+                sub = row.row(align=True)
+                sub.prop(id_store, "rigify_profile_path", text="")
+                sub.enabled = id_store.rigify_profile
+
         elif obj.mode == 'EDIT':
             # Build types list
             collection_name = str(id_store.rigify_collection).replace(" ", "")
@@ -647,11 +666,16 @@ class VIEW3D_PT_tools_rigify_dev(bpy.types.Panel):
                 r = self.layout.row()
                 r.operator("armature.rigify_encode_metarig", text="Encode Metarig to Python")
                 r = self.layout.row()
+                r.operator("armature.rigify_encode_metarig_data", text="Encode Metarig to Data")
+                r = self.layout.row()
                 r.operator("armature.rigify_encode_metarig_sample", text="Encode Sample to Python")
 
             if context.mode == 'EDIT_MESH':
                 r = self.layout.row()
-                r.operator("mesh.rigify_encode_mesh_widget", text="Encode Mesh Widget to Python")
+                r.operator("mesh.rigify_encode_mesh_widget", text="Encode Mesh Widget to Library")
+
+        r = self.layout.row()
+        r.operator("pose.rigify_reload_rig_types", text="Reload Rig Types")
 
 
 class VIEW3D_PT_rigify_animation_tools(bpy.types.Panel):
@@ -758,8 +782,19 @@ class Generate(bpy.types.Operator):
 
         use_global_undo = context.user_preferences.edit.use_global_undo
         context.user_preferences.edit.use_global_undo = False
+        id_store = context.window_manager
+        profiler = GenerateProfiler() if id_store.rigify_profile else None
         try:
-            generate.generate_rig(context, context.object)
+            if profiler:
+                with profiler:
+                    generate.generate_rig(context, context.object, profiler)
+                filepath = bpy.path.abspath(id_store.rigify_profile_path) \
+                    or os.path.join(bpy.app.tempdir, "rigify_profile.json")
+                profiler.write(filepath)
+                profiler.print_summary()
+                self.report({'INFO'}, "Rigify profile written to " + filepath)
+            else:
+                generate.generate_rig(context, context.object)
         except MetarigError as rig_exception:
             rigify_report_exception(self, rig_exception)
         finally:
@@ -777,12 +812,28 @@ class UpgradeMetarigTypes(bpy.types.Operator):
     bl_options = {'UNDO'}
 
     def execute(self, context):
+        rig_lists.ensure_rig_parameters()
         for obj in bpy.data.objects:
             if type(obj.data) == bpy.types.Armature:
                 upgradeMetarigTypes(obj)
         return {'FINISHED'}
 
 
+class ReloadRigTypes(bpy.types.Operator):
+    """Reload all rig type and metarig modules on their next use"""
+
+    bl_idname = "pose.rigify_reload_rig_types"
+    bl_label = "Rigify Reload Rig Types"
+    bl_description = 'Reloads the rig type modules, even if their files did not change'
+
+    def execute(self, context):
+        stats = module_cache_stats
+        self.report({'INFO'}, "Rig type modules: %d hits, %d loads, %d reloads" % (
+            stats['hits'], stats['misses'], stats['reloads']))
+        clear_module_cache()
+        return {'FINISHED'}
+
+
 class SwitchToLegacy(bpy.types.Operator):
     """Switch to Legacy mode"""
 
@@ -851,7 +902,39 @@ class EncodeMetarig(bpy.types.Operator):
         else:
             text_block = bpy.data.texts.new(name)
 
-        text = write_metarig(context.active_object, layers=True, func_name="create", groups=True)
+        obj = context.active_object
+        rig_lists.ensure_rig_parameters(set(pbone.rigify_type for pbone in obj.pose.bones))
+        text = write_metarig(obj, layers=True, func_name="create", groups=True)
+        text_block.write(text)
+        bpy.ops.object.mode_set(mode='EDIT')
+
+        return {'FINISHED'}
+
+
+class EncodeMetarigData(bpy.types.Operator):
+    """ Creates compact json data that will generate the selected metarig,
+        for a metarig file to be added to the metarigs folder.
+    """
+    bl_idname = "armature.rigify_encode_metarig_data"
+    bl_label = "Rigify Encode Metarig Data"
+    bl_options = {'UNDO'}
+
+    @classmethod
+    def poll(self, context):
+        return context.mode == 'EDIT_ARMATURE'
+
+    def execute(self, context):
+        name = "metarig.json"
+
+        if name in bpy.data.texts:
+            text_block = bpy.data.texts[name]
+            text_block.clear()
+        else:
+            text_block = bpy.data.texts.new(name)
+
+        obj = context.active_object
+        rig_lists.ensure_rig_parameters(set(pbone.rigify_type for pbone in obj.pose.bones))
+        text = write_metarig(obj, layers=True, groups=True, compact=True)
         text_block.write(text)
         bpy.ops.object.mode_set(mode='EDIT')
 
@@ -879,7 +962,9 @@ class EncodeMetarigSample(bpy.types.Operator):
         else:
             text_block = bpy.data.texts.new(name)
 
-        text = write_metarig(context.active_object, layers=False, func_name="create_sample")
+        obj = context.active_object
+        rig_lists.ensure_rig_parameters(set(pbone.rigify_type for pbone in obj.pose.bones))
+        text = write_metarig(obj, layers=False, func_name="create_sample")
         text_block.write(text)
         bpy.ops.object.mode_set(mode='EDIT')
 
@@ -887,29 +972,43 @@ class EncodeMetarigSample(bpy.types.Operator):
 
 
 class EncodeWidget(bpy.types.Operator):
-    """ Creates Python code that will generate the selected metarig.
+    """ Stores the selected mesh as a shape of the widget library.
     """
     bl_idname = "mesh.rigify_encode_mesh_widget"
     bl_label = "Rigify Encode Widget"
     bl_options = {'UNDO'}
 
+    widget_name = StringProperty(
+            name="Name",
+            description="Name of the widget shape in the library, replaced if it exists",
+            maxlen=64,
+            )
+
     @classmethod
     def poll(self, context):
         return context.mode == 'EDIT_MESH'
 
-    def execute(self, context):
-        name = "widget.py"
+    def invoke(self, context, event):
+        if not self.widget_name:
+            self.widget_name = context.active_object.name
+        return context.window_manager.invoke_props_dialog(self)
 
-        if name in bpy.data.texts:
-            text_block = bpy.data.texts[name]
-            text_block.clear()
-        else:
-            text_block = bpy.data.texts.new(name)
+    def execute(self, context):
+        if not self.widget_name:
+            self.report({'ERROR'}, "The widget shape needs a name")
+            return {'CANCELLED'}
 
-        text = write_widget(context.active_object)
-        text_block.write(text)
-        bpy.ops.object.mode_set(mode='EDIT')
+        # Flush the edit mesh to the mesh data
+        bpy.ops.object.mode_set(mode='OBJECT')
+        try:
+            add_widget_shape(self.widget_name, context.active_object.data)
+        except OSError as e:
+            self.report({'ERROR'}, "Could not write the widget library: %s" % e)
+            return {'CANCELLED'}
+        finally:
+            bpy.ops.object.mode_set(mode='EDIT')
 
+        self.report({'INFO'}, "Widget %r stored in %s" % (self.widget_name, LIBRARY_FILE))
         return {'FINISHED'}
 
 
@@ -928,156 +1027,91 @@ class OBJECT_OT_GetFrameRange(bpy.types.Operator):
         return {'FINISHED'}
 
 
-def FktoIk(rig, window='ALL'):
-
+def get_transfer_frames(rig, window='ALL'):
+    """ Returns the frames to transfer the animation of rig on.
+    """
     scn = bpy.context.scene
     id_store = bpy.context.window_manager
 
-    rig_id = rig.data['rig_id']
-    leg_ik2fk = eval('bpy.ops.pose.rigify_leg_ik2fk_' + rig_id)
-    arm_ik2fk = eval('bpy.ops.pose.rigify_arm_ik2fk_' + rig_id)
-    limb_generated_names = get_limb_generated_names(rig)
-
     if window == 'ALL':
-        frames = get_keyed_frames(rig)
-        frames = [f for f in frames if f in range(id_store.rigify_transfer_start_frame, id_store.rigify_transfer_end_frame+1)]
-    elif window == 'CURRENT':
-        frames = [scn.frame_current]
-    else:
-        frames = [scn.frame_current]
+        start = id_store.rigify_transfer_start_frame
+        end = id_store.rigify_transfer_end_frame
+        # Rebuilt once per transfer, to see keys retimed since the last one
+        index = get_rig_keyframe_index(rig, rebuild=True)
+        return [f for f in get_keyed_frames(rig, index) if start <= f <= end and f == int(f)]
+    return [scn.frame_current]
+
+
+def get_transfer_limbs(rig):
+    """ Returns the generated names of the limbs to transfer, of all the
+        limbs or of the selected ones, and deselects all the bones.
+    """
+    id_store = bpy.context.window_manager
 
     if not id_store.rigify_transfer_only_selected:
-        pbones = rig.pose.bones
-        bpy.ops.pose.select_all(action='DESELECT')
+        limbs = list(get_limb_generated_names(rig).values())
     else:
-        pbones = bpy.context.selected_pose_bones
-        bpy.ops.pose.select_all(action='DESELECT')
-
-    for b in pbones:
-        for group in limb_generated_names:
-            if b.name in limb_generated_names[group].values() or b.name in limb_generated_names[group]['controls']\
-                    or b.name in limb_generated_names[group]['ik_ctrl']:
-                names = limb_generated_names[group]
-                if names['limb_type'] == 'arm':
-                    func = arm_ik2fk
-                    controls = names['controls']
-                    ik_ctrl = names['ik_ctrl']
-                    fk_ctrl = names['fk_ctrl']
-                    parent = names['parent']
-                    pole = names['pole']
-                    rig.pose.bones[controls[0]].bone.select = True
-                    rig.pose.bones[controls[4]].bone.select = True
-                    rig.pose.bones[pole].bone.select = True
-                    rig.pose.bones[parent].bone.select = True
-                    kwargs = {'uarm_fk': controls[1], 'farm_fk': controls[2], 'hand_fk': controls[3],
-                              'uarm_ik': controls[0], 'farm_ik': ik_ctrl[1], 'hand_ik': controls[4],
-                              'pole': pole, 'main_parent': parent}
-                    args = (controls[0], controls[1], controls[2], controls[3],
-                            controls[4], pole, parent)
-                else:
-                    func = leg_ik2fk
-                    controls = names['controls']
-                    ik_ctrl = names['ik_ctrl']
-                    fk_ctrl = names['fk_ctrl']
-                    parent = names['parent']
-                    pole = names['pole']
-                    rig.pose.bones[controls[0]].bone.select = True
-                    rig.pose.bones[controls[6]].bone.select = True
-                    rig.pose.bones[controls[5]].bone.select = True
-                    rig.pose.bones[pole].bone.select = True
-                    rig.pose.bones[parent].bone.select = True
-                    kwargs = {'thigh_fk': controls[1], 'shin_fk': controls[2], 'foot_fk': controls[3],
-                              'mfoot_fk': controls[7], 'thigh_ik': controls[0], 'shin_ik': ik_ctrl[1],
-                              'foot_ik': controls[6], 'pole': pole, 'footroll': controls[5], 'mfoot_ik': ik_ctrl[2],
-                              'main_parent': parent}
-                    args = (controls[0], controls[1], controls[2], controls[3],
-                            controls[6], controls[5], pole, parent)
-
-                for f in frames:
-                    if not bones_in_frame(f, rig, *args):
-                        continue
-                    scn.frame_set(f)
-                    func(**kwargs)
-                    bpy.ops.anim.keyframe_insert_menu(type='BUILTIN_KSI_VisualLocRot')
-                    bpy.ops.anim.keyframe_insert_menu(type='Scaling')
-
-                bpy.ops.pose.select_all(action='DESELECT')
-                limb_generated_names.pop(group)
-                break
+        limbs = get_selected_limbs(rig, [b.name for b in bpy.context.selected_pose_bones or ()])
+    bpy.ops.pose.select_all(action='DESELECT')
+    return limbs
 
 
-def IktoFk(rig, window='ALL'):
+def FktoIk(rig, window='ALL'):
 
-    scn = bpy.context.scene
-    id_store = bpy.context.window_manager
+    leg_ik2fk = get_snap_operator(rig, 'leg_ik2fk')
+    arm_ik2fk = get_snap_operator(rig, 'arm_ik2fk')
+
+    limbs = []
+    for names in get_transfer_limbs(rig):
+        controls = names['controls']
+        ik_ctrl = names['ik_ctrl']
+        parent = names['parent']
+        pole = names['pole']
+        if names['limb_type'] == 'arm':
+            snap = partial(arm_ik2fk, uarm_fk=controls[1], farm_fk=controls[2], hand_fk=controls[3],
+                           uarm_ik=controls[0], farm_ik=ik_ctrl[1], hand_ik=controls[4],
+                           pole=pole, main_parent=parent)
+            keyed = (controls[0], controls[1], controls[2], controls[3],
+                     controls[4], pole, parent)
+            keys = (controls[0], controls[4], pole, parent)
+        else:
+            snap = partial(leg_ik2fk, thigh_fk=controls[1], shin_fk=controls[2], foot_fk=controls[3],
+                           mfoot_fk=controls[7], thigh_ik=controls[0], shin_ik=ik_ctrl[1],
+                           foot_ik=controls[6], pole=pole, footroll=controls[5], mfoot_ik=ik_ctrl[2],
+                           main_parent=parent)
+            keyed = (controls[0], controls[1], controls[2], controls[3],
+                     controls[6], controls[5], pole, parent)
+            keys = (controls[0], controls[6], controls[5], pole, parent)
+        limbs.append(LimbSnap(snap, keyed, keys))
 
-    rig_id = rig.data['rig_id']
-    leg_fk2ik = eval('bpy.ops.pose.rigify_leg_fk2ik_' + rig_id)
-    arm_fk2ik = eval('bpy.ops.pose.rigify_arm_fk2ik_' + rig_id)
-    limb_generated_names = get_limb_generated_names(rig)
+    bake_limbs(rig, limbs, get_transfer_frames(rig, window))
 
-    if window == 'ALL':
-        frames = get_keyed_frames(rig)
-        frames = [f for f in frames if f in range(id_store.rigify_transfer_start_frame, id_store.rigify_transfer_end_frame+1)]
-    elif window == 'CURRENT':
-        frames = [scn.frame_current]
-    else:
-        frames = [scn.frame_current]
 
-    if not id_store.rigify_transfer_only_selected:
-        bpy.ops.pose.select_all(action='DESELECT')
-        pbones = rig.pose.bones
-    else:
-        pbones = bpy.context.selected_pose_bones
-        bpy.ops.pose.select_all(action='DESELECT')
-
-    for b in pbones:
-        for group in limb_generated_names:
-            if b.name in limb_generated_names[group].values() or b.name in limb_generated_names[group]['controls']\
-                    or b.name in limb_generated_names[group]['ik_ctrl']:
-                names = limb_generated_names[group]
-                if names['limb_type'] == 'arm':
-                    func = arm_fk2ik
-                    controls = names['controls']
-                    ik_ctrl = names['ik_ctrl']
-                    fk_ctrl = names['fk_ctrl']
-                    parent = names['parent']
-                    pole = names['pole']
-                    rig.pose.bones[controls[1]].bone.select = True
-                    rig.pose.bones[controls[2]].bone.select = True
-                    rig.pose.bones[controls[3]].bone.select = True
-                    kwargs = {'uarm_fk': controls[1], 'farm_fk': controls[2], 'hand_fk': controls[3],
-                              'uarm_ik': controls[0], 'farm_ik': ik_ctrl[1],
-                              'hand_ik': controls[4]}
-                    args = (controls[0], controls[1], controls[2], controls[3],
-                            controls[4], pole, parent)
-                else:
-                    func = leg_fk2ik
-                    controls = names['controls']
-                    ik_ctrl = names['ik_ctrl']
-                    fk_ctrl = names['fk_ctrl']
-                    parent = names['parent']
-                    pole = names['pole']
-                    rig.pose.bones[controls[1]].bone.select = True
-                    rig.pose.bones[controls[2]].bone.select = True
-                    rig.pose.bones[controls[3]].bone.select = True
-                    kwargs = {'thigh_fk': controls[1], 'shin_fk': controls[2], 'foot_fk': controls[3],
-                              'mfoot_fk': controls[7], 'thigh_ik': controls[0], 'shin_ik': ik_ctrl[1],
-                              'foot_ik': ik_ctrl[2], 'mfoot_ik': ik_ctrl[2]}
-                    args = (controls[0], controls[1], controls[2], controls[3],
-                            controls[6], controls[5], pole, parent)
-
-                for f in frames:
-                    if not bones_in_frame(f, rig, *args):
-                        continue
-                    scn.frame_set(f)
-                    func(**kwargs)
-                    bpy.ops.anim.keyframe_insert_menu(type='BUILTIN_KSI_VisualLocRot')
-                    bpy.ops.anim.keyframe_insert_menu(type='Scaling')
-
-                bpy.ops.pose.select_all(action='DESELECT')
-                limb_generated_names.pop(group)
-                break
+def IktoFk(rig, window='ALL'):
+
+    leg_fk2ik = get_snap_operator(rig, 'leg_fk2ik')
+    arm_fk2ik = get_snap_operator(rig, 'arm_fk2ik')
+
+    limbs = []
+    for names in get_transfer_limbs(rig):
+        controls = names['controls']
+        ik_ctrl = names['ik_ctrl']
+        parent = names['parent']
+        pole = names['pole']
+        if names['limb_type'] == 'arm':
+            snap = partial(arm_fk2ik, uarm_fk=controls[1], farm_fk=controls[2], hand_fk=controls[3],
+                           uarm_ik=controls[0], farm_ik=ik_ctrl[1], hand_ik=controls[4])
+            keyed = (controls[0], controls[1], controls[2], controls[3],
+                     controls[4], pole, parent)
+        else:
+            snap = partial(leg_fk2ik, thigh_fk=controls[1], shin_fk=controls[2], foot_fk=controls[3],
+                           mfoot_fk=controls[7], thigh_ik=controls[0], shin_ik=ik_ctrl[1],
+                           foot_ik=ik_ctrl[2], mfoot_ik=ik_ctrl[2])
+            keyed = (controls[0], controls[1], controls[2], controls[3],
+                     controls[6], controls[5], pole, parent)
+        limbs.append(LimbSnap(snap, keyed, controls[1:4]))
+
+    bake_limbs(rig, limbs, get_transfer_frames(rig, window))
 
 
 def clearAnimation(act, type, names):
@@ -1117,102 +1151,63 @@ def clearAnimation(act, type, names):
     # updateView3D()
 
 
-def rotPoleToggle(rig, window='ALL', value=False, toggle=False, bake=False):
+def rotPoleSnap(rig, fk2ik, fk2ik_kwargs, ik2fk, ik2fk_kwargs, parent, pole_vector):
+    """ Returns a function switching a limb to rotation or pole, keeping
+        its pose.
+    """
+    def snap():
+        fk2ik(**fk2ik_kwargs)
+        rig.pose.bones[parent]['pole_vector'] = pole_vector
+        ik2fk(**ik2fk_kwargs)
+    return snap
 
-    scn = bpy.context.scene
-    id_store = bpy.context.window_manager
 
-    rig_id = rig.data['rig_id']
-    leg_fk2ik = eval('bpy.ops.pose.rigify_leg_fk2ik_' + rig_id)
-    arm_fk2ik = eval('bpy.ops.pose.rigify_arm_fk2ik_' + rig_id)
-    leg_ik2fk = eval('bpy.ops.pose.rigify_leg_ik2fk_' + rig_id)
-    arm_ik2fk = eval('bpy.ops.pose.rigify_arm_ik2fk_' + rig_id)
-    limb_generated_names = get_limb_generated_names(rig)
+def rotPoleToggle(rig, window='ALL', value=False, toggle=False, bake=False):
 
-    if window == 'ALL':
-        frames = get_keyed_frames(rig)
-        frames = [f for f in frames if f in range(id_store.rigify_transfer_start_frame, id_store.rigify_transfer_end_frame+1)]
-    elif window == 'CURRENT':
-        frames = [scn.frame_current]
-    else:
-        frames = [scn.frame_current]
+    leg_fk2ik = get_snap_operator(rig, 'leg_fk2ik')
+    arm_fk2ik = get_snap_operator(rig, 'arm_fk2ik')
+    leg_ik2fk = get_snap_operator(rig, 'leg_ik2fk')
+    arm_ik2fk = get_snap_operator(rig, 'arm_ik2fk')
 
-    if not id_store.rigify_transfer_only_selected:
-        bpy.ops.pose.select_all(action='DESELECT')
-        pbones = rig.pose.bones
-    else:
-        pbones = bpy.context.selected_pose_bones
-        bpy.ops.pose.select_all(action='DESELECT')
+    limbs = []
+    for names in get_transfer_limbs(rig):
+        controls = names['controls']
+        ik_ctrl = names['ik_ctrl']
+        parent = names['parent']
+        pole = names['pole']
 
-    for b in pbones:
-        for group in limb_generated_names:
-            names = limb_generated_names[group]
+        if toggle:
+            new_pole_vector_value = not rig.pose.bones[parent]['pole_vector']
+        else:
+            new_pole_vector_value = value
+
+        if names['limb_type'] == 'arm':
+            kwargs1 = {'uarm_fk': controls[1], 'farm_fk': controls[2], 'hand_fk': controls[3],
+                       'uarm_ik': controls[0], 'farm_ik': ik_ctrl[1],
+                       'hand_ik': controls[4]}
+            kwargs2 = {'uarm_fk': controls[1], 'farm_fk': controls[2], 'hand_fk': controls[3],
+                       'uarm_ik': controls[0], 'farm_ik': ik_ctrl[1], 'hand_ik': controls[4],
+                       'pole': pole, 'main_parent': parent}
+            snap = rotPoleSnap(rig, arm_fk2ik, kwargs1, arm_ik2fk, kwargs2, parent, new_pole_vector_value)
+            keyed = (controls[0], controls[4], pole, parent)
+            ik_keys = (controls[0], controls[4], parent)
+        else:
+            kwargs1 = {'thigh_fk': controls[1], 'shin_fk': controls[2], 'foot_fk': controls[3],
+                       'mfoot_fk': controls[7], 'thigh_ik': controls[0], 'shin_ik': ik_ctrl[1],
+                       'foot_ik': ik_ctrl[2], 'mfoot_ik': ik_ctrl[2]}
+            kwargs2 = {'thigh_fk': controls[1], 'shin_fk': controls[2], 'foot_fk': controls[3],
+                       'mfoot_fk': controls[7], 'thigh_ik': controls[0], 'shin_ik': ik_ctrl[1],
+                       'foot_ik': controls[6], 'pole': pole, 'footroll': controls[5], 'mfoot_ik': ik_ctrl[2],
+                       'main_parent': parent}
+            snap = rotPoleSnap(rig, leg_fk2ik, kwargs1, leg_ik2fk, kwargs2, parent, new_pole_vector_value)
+            keyed = (controls[0], controls[6], controls[5], pole, parent)
+            ik_keys = (controls[0], controls[6], controls[5], parent)
 
-            if toggle:
-                new_pole_vector_value = not rig.pose.bones[names['parent']]['pole_vector']
-            else:
-                new_pole_vector_value = value
-
-            if b.name in names.values() or b.name in names['controls'] or b.name in names['ik_ctrl']:
-                if names['limb_type'] == 'arm':
-                    func1 = arm_fk2ik
-                    func2 = arm_ik2fk
-                    controls = names['controls']
-                    ik_ctrl = names['ik_ctrl']
-                    fk_ctrl = names['fk_ctrl']
-                    parent = names['parent']
-                    pole = names['pole']
-                    rig.pose.bones[controls[0]].bone.select = not new_pole_vector_value
-                    rig.pose.bones[controls[4]].bone.select = not new_pole_vector_value
-                    rig.pose.bones[parent].bone.select = not new_pole_vector_value
-                    rig.pose.bones[pole].bone.select = new_pole_vector_value
-
-                    kwargs1 = {'uarm_fk': controls[1], 'farm_fk': controls[2], 'hand_fk': controls[3],
-                              'uarm_ik': controls[0], 'farm_ik': ik_ctrl[1],
-                              'hand_ik': controls[4]}
-                    kwargs2 = {'uarm_fk': controls[1], 'farm_fk': controls[2], 'hand_fk': controls[3],
-                              'uarm_ik': controls[0], 'farm_ik': ik_ctrl[1], 'hand_ik': controls[4],
-                              'pole': pole, 'main_parent': parent}
-                    args = (controls[0], controls[4], pole, parent)
-                else:
-                    func1 = leg_fk2ik
-                    func2 = leg_ik2fk
-                    controls = names['controls']
-                    ik_ctrl = names['ik_ctrl']
-                    fk_ctrl = names['fk_ctrl']
-                    parent = names['parent']
-                    pole = names['pole']
-                    rig.pose.bones[controls[0]].bone.select = not new_pole_vector_value
-                    rig.pose.bones[controls[6]].bone.select = not new_pole_vector_value
-                    rig.pose.bones[controls[5]].bone.select = not new_pole_vector_value
-                    rig.pose.bones[parent].bone.select = not new_pole_vector_value
-                    rig.pose.bones[pole].bone.select = new_pole_vector_value
-
-                    kwargs1 = {'thigh_fk': controls[1], 'shin_fk': controls[2], 'foot_fk': controls[3],
-                              'mfoot_fk': controls[7], 'thigh_ik': controls[0], 'shin_ik': ik_ctrl[1],
-                              'foot_ik': ik_ctrl[2], 'mfoot_ik': ik_ctrl[2]}
-                    kwargs2 = {'thigh_fk': controls[1], 'shin_fk': controls[2], 'foot_fk': controls[3],
-                              'mfoot_fk': controls[7], 'thigh_ik': controls[0], 'shin_ik': ik_ctrl[1],
-                              'foot_ik': controls[6], 'pole': pole, 'footroll': controls[5], 'mfoot_ik': ik_ctrl[2],
-                              'main_parent': parent}
-                    args = (controls[0], controls[6], controls[5], pole, parent)
-
-                for f in frames:
-                    if bake and not bones_in_frame(f, rig, *args):
-                        continue
-                    scn.frame_set(f)
-                    func1(**kwargs1)
-                    rig.pose.bones[names['parent']]['pole_vector'] = new_pole_vector_value
-                    func2(**kwargs2)
-                    if bake:
-                        bpy.ops.anim.keyframe_insert_menu(type='BUILTIN_KSI_VisualLocRot')
-                        bpy.ops.anim.keyframe_insert_menu(type='Scaling')
-                        overwrite_prop_animation(rig, rig.pose.bones[parent], 'pole_vector', new_pole_vector_value, [f])
-
-                bpy.ops.pose.select_all(action='DESELECT')
-                limb_generated_names.pop(group)
-                break
-    scn.frame_set(0)
+        # Key the pole with pole_vector on, the IK controls it replaces otherwise
+        keys = (pole,) if new_pole_vector_value else ik_keys
+        limbs.append(LimbSnap(snap, keyed, keys, [(parent, 'pole_vector', new_pole_vector_value)]))
+
+    bake_limbs(rig, limbs, get_transfer_frames(rig, window), keyed_only=bake, insert_keys=bake)
 
 
 class OBJECT_OT_IK2FK(bpy.types.Operator):
@@ -1339,9 +1334,11 @@ def register():
     bpy.utils.register_class(LayerInit)
     bpy.utils.register_class(Generate)
     bpy.utils.register_class(UpgradeMetarigTypes)
+    bpy.utils.register_class(ReloadRigTypes)
     bpy.utils.register_class(SwitchToLegacy)
     bpy.utils.register_class(Sample)
     bpy.utils.register_class(EncodeMetarig)
+    bpy.utils.register_class(EncodeMetarigData)
     bpy.utils.register_class(EncodeMetarigSample)
     bpy.utils.register_class(EncodeWidget)
     bpy.utils.register_class(OBJECT_OT_GetFrameRange)
@@ -1352,6 +1349,7 @@ def register():
     bpy.utils.register_class(OBJECT_OT_ClearAnimation)
     bpy.utils.register_class(OBJECT_OT_Rot2Pole)
 
+    rig_ui_runtime.register()
     rot_mode.register()
     # POE 2018-07-27 Pose exporter and importer
     pose_expimp.register()
@@ -1381,9 +1379,11 @@ def unregister():
     bpy.utils.unregister_class(LayerInit)
     bpy.utils.unregister_class(Generate)
     bpy.utils.unregister_class(UpgradeMetarigTypes)
+    bpy.utils.unregister_class(ReloadRigTypes)
     bpy.utils.unregister_class(SwitchToLegacy)
     bpy.utils.unregister_class(Sample)
     bpy.utils.unregister_class(EncodeMetarig)
+    bpy.utils.unregister_class(EncodeMetarigData)
     bpy.utils.unregister_class(EncodeMetarigSample)
     bpy.utils.unregister_class(EncodeWidget)
     bpy.utils.unregister_class(OBJECT_OT_GetFrameRange)
@@ -1395,6 +1395,7 @@ def unregister():
     bpy.utils.unregister_class(OBJECT_OT_Rot2Pole)
 
     rot_mode.unregister()
+    rig_ui_runtime.unregister()
     # POE 2018-07-27 Pose exporter and importer
     pose_expimp.unregister()
     # POE 2018-09-08 POE Toolbox (make offset bone)
@@ -29,9 +29,13 @@ import random
 import time
 import re
 import os
+import sys
 from mathutils import Vector, Matrix, Color
 from rna_prop_ui import rna_idprop_ui_prop_get
 
+from .widget_library import build_widget_mesh
+from .keyframe_index import get_keyframe_index, get_rig_keyframe_index, is_in
+
 RIG_DIR = "rigs"  # Name of the directory where rig types are kept
 METARIG_DIR = "metarigs"  # Name of the directory where metarigs are kept
 
@@ -203,23 +207,253 @@ def upgradeMetarigTypes(metarig, revert=False):
 
 
 
+#=======================
+# Mode handling
+#=======================
+
+# Maps the modes accepted by bpy.ops.object.mode_set to the corresponding
+# values of bpy.context.mode for armature objects.
+ARMATURE_CONTEXT_MODES = {'EDIT': 'EDIT_ARMATURE', 'POSE': 'POSE', 'OBJECT': 'OBJECT'}
+
+
+def ensure_mode(obj, mode):
+    """ Makes obj the active, selected object and puts it into the given
+        mode ('EDIT', 'POSE' or 'OBJECT').
+        Unlike a plain bpy.ops.object.mode_set() nothing is done if the
+        armature already is in that mode.
+    """
+    scene = bpy.context.scene
+    if scene.objects.active != obj:
+        bpy.ops.object.mode_set(mode='OBJECT')
+        scene.objects.active = obj
+        obj.select = True
+
+    if bpy.context.mode != ARMATURE_CONTEXT_MODES[mode]:
+        bpy.ops.object.mode_set(mode=mode)
+
+
+# Functions called with the idname of every operator run through bpy.ops
+_ops_listeners = []
+_ops_call = None
+
+
+def add_ops_listener(listener):
+    """ Calls listener(idname) before every operator run through bpy.ops,
+        with the python form of the idname, e.g. "object.mode_set",
+        until remove_ops_listener() is called.
+    """
+    global _ops_call
+    if not _ops_listeners:
+        # bpy.ops runs every operator through the module level op_call
+        import bpy.ops
+        ops_module = sys.modules['bpy.ops']
+        _ops_call = ops_module.op_call
+
+        def op_call(idname, *args, **kwargs):
+            for l in list(_ops_listeners):
+                l(idname)
+            return _ops_call(idname, *args, **kwargs)
+
+        ops_module.op_call = op_call
+    _ops_listeners.append(listener)
+
+
+def remove_ops_listener(listener):
+    _ops_listeners.remove(listener)
+    if not _ops_listeners:
+        sys.modules['bpy.ops'].op_call = _ops_call
+
+
+#=======================
+# Generation context
+#=======================
+
+_generation = None  # The active GenerationContext
+
+
+class BoneMap:
+    """ Wraps the edit_bones or pose.bones collection of an armature with
+        a name -> bone dict, as bpy collections look names up linearly.
+        The dict is dropped whenever the generation context is invalidated.
+        Bones must be removed through the map, everything else is passed on
+        to the collection.
+    """
+    def __init__(self, context, get_collection):
+        object.__setattr__(self, "_context", context)
+        object.__setattr__(self, "_get_collection", get_collection)
+        object.__setattr__(self, "_bones", None)
+        object.__setattr__(self, "_serial", -1)
+
+    def _map(self):
+        if self._bones is None or self._serial != self._context.serial:
+            object.__setattr__(self, "_bones", {bone.name: bone for bone in self._get_collection()})
+            object.__setattr__(self, "_serial", self._context.serial)
+        return self._bones
+
+    def get(self, name, default=None):
+        bones = self._map()
+        bone = bones.get(name)
+        if bone is not None and bone.name != name:
+            # Renamed since it was cached
+            del bones[name]
+            bones[bone.name] = bone
+            bone = None
+        if bone is None:
+            # Added to the collection directly
+            bone = self._get_collection().get(name)
+            if bone is None:
+                return default
+            bones[name] = bone
+        return bone
+
+    def __getitem__(self, name):
+        bone = self.get(name)
+        if bone is None:
+            raise KeyError(name)
+        return bone
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def __iter__(self):
+        return iter(self._get_collection())
+
+    def __len__(self):
+        return len(self._get_collection())
+
+    def keys(self):
+        return self._get_collection().keys()
+
+    def new(self, name):
+        bone = self._get_collection().new(name)
+        self._map()[bone.name] = bone
+        return bone
+
+    def remove(self, bone):
+        self._map().pop(bone.name, None)
+        self._get_collection().remove(bone)
+
+    def __getattr__(self, attr):
+        return getattr(self._get_collection(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._get_collection(), attr, value)
+
+
+class GenerationContext:
+    """ Caches name lookups of the bones of the armature being generated.
+        Used as a context manager around the generation, rig types get the
+        cached bones through get_edit_bones() and get_pose_bones().
+        The caches are invalidated whenever an operator runs, as that may
+        switch modes or change bones.
+    """
+    def __init__(self, obj):
+        self.obj = obj
+        self.serial = 0
+        self.edit_bones = BoneMap(self, lambda: obj.data.edit_bones)
+        self.pose_bones = BoneMap(self, lambda: obj.pose.bones)
+        self.name_counters = {}  # {base name: last number used}
+
+    def invalidate(self, idname=None):
+        self.serial += 1
+
+    def __enter__(self):
+        global _generation
+        self.previous = _generation
+        _generation = self
+        add_ops_listener(self.invalidate)
+        return self
+
+    def __exit__(self, *exc):
+        global _generation
+        remove_ops_listener(self.invalidate)
+        _generation = self.previous
+        return False
+
+    def unique_bone_name(self, base_name):
+        """ Returns base_name if it is not used yet, or a numbered name
+            based on it.  Numbers are counted up per base name, so already
+            used names are only probed once.
+        """
+        if bpy.context.mode == 'EDIT_ARMATURE':
+            bones = self.edit_bones
+        else:
+            bones = self.obj.data.bones
+        if base_name not in bones:
+            return base_name
+        base_name = strip_trailing_number(base_name)
+        count = self.name_counters.get(base_name, 0)
+        name = base_name if count == 0 else "%s.%03d" % (base_name, count)
+        while name in bones:
+            count += 1
+            name = "%s.%03d" % (base_name, count)
+        self.name_counters[base_name] = count
+        return name
+
+
+def get_edit_bones(obj):
+    """ Returns the edit bones of obj, by name from the cache of the active
+        generation context if it generates obj.
+    """
+    if _generation is not None and _generation.obj == obj:
+        return _generation.edit_bones
+    return obj.data.edit_bones
+
+
+def get_pose_bones(obj):
+    """ Returns the pose bones of obj, by name from the cache of the active
+        generation context if it generates obj.
+    """
+    if _generation is not None and _generation.obj == obj:
+        return _generation.pose_bones
+    return obj.pose.bones
+
+
+def unique_bone_name(obj, base_name):
+    """ Returns base_name if it is not used in obj, or a numbered name
+        based on it.
+    """
+    if _generation is not None and _generation.obj == obj:
+        return _generation.unique_bone_name(base_name)
+    if bpy.context.mode == 'EDIT_ARMATURE':
+        bones = obj.data.edit_bones
+    else:
+        bones = obj.data.bones
+    if base_name not in bones:
+        return base_name
+    return unique_name(bones, base_name)
+
+
 #=======================
 # Bone manipulation
 #=======================
 
+def new_bones(obj, bone_names):
+    """ Adds new bones to the given armature object, in one edit session.
+        Returns the resulting bones' names.
+    """
+    if obj == bpy.context.active_object and bpy.context.mode == 'EDIT_ARMATURE':
+        names = []
+        for bone_name in bone_names:
+            edit_bone = obj.data.edit_bones.new(unique_bone_name(obj, bone_name))
+            names.append(edit_bone.name)
+            edit_bone.head = (0, 0, 0)
+            edit_bone.tail = (0, 1, 0)
+            edit_bone.roll = 0
+        # Toggle once, so the new bones exist outside of edit mode
+        bpy.ops.object.mode_set(mode='OBJECT')
+        bpy.ops.object.mode_set(mode='EDIT')
+        return names
+    else:
+        raise MetarigError("Can't add new bones '%s' outside of edit mode" % ", ".join(bone_names))
+
+
 def new_bone(obj, bone_name):
     """ Adds a new bone to the given armature object.
         Returns the resulting bone's name.
     """
     if obj == bpy.context.active_object and bpy.context.mode == 'EDIT_ARMATURE':
-        edit_bone = obj.data.edit_bones.new(bone_name)
-        name = edit_bone.name
-        edit_bone.head = (0, 0, 0)
-        edit_bone.tail = (0, 1, 0)
-        edit_bone.roll = 0
-        bpy.ops.object.mode_set(mode='OBJECT')
-        bpy.ops.object.mode_set(mode='EDIT')
-        return name
+        return new_bones(obj, [bone_name])[0]
     else:
         raise MetarigError("Can't add new bone '%s' outside of edit mode" % bone_name)
 
@@ -238,7 +472,7 @@ def copy_bone_simple(obj, bone_name, assign_name=''):
             assign_name = bone_name
         # Copy the edit bone
         edit_bone_1 = obj.data.edit_bones[bone_name]
-        edit_bone_2 = obj.data.edit_bones.new(assign_name)
+        edit_bone_2 = obj.data.edit_bones.new(unique_bone_name(obj, assign_name))
         bone_name_1 = bone_name
         bone_name_2 = edit_bone_2.name
 
@@ -254,44 +488,63 @@ def copy_bone_simple(obj, bone_name, assign_name=''):
         raise MetarigError("Cannot copy bones outside of edit mode")
 
 
-def copy_bone(obj, bone_name, assign_name=''):
-    """ Makes a copy of the given bone in the given armature object.
-        Returns the resulting bone's name.
+def copy_bones(obj, bone_pairs, copy_pose=True):
+    """ Makes copies of bones in the given armature object, from a list of
+        (bone name, new name) pairs; an empty new name keeps the name.
+        All edit bones are created in one edit session and the pose bone
+        attributes are copied in a single object mode pass.
+        Without copy_pose, only the edit bones are copied and edit mode is
+        not left; rigs generated in phases then call copy_pose_bones()
+        from an object mode phase.
+        Returns the resulting bones' names.
     """
-    #if bone_name not in obj.data.bones:
-    if bone_name not in obj.data.edit_bones:
-        raise MetarigError("copy_bone(): bone '%s' not found, cannot copy it" % bone_name)
-
     if obj == bpy.context.active_object and bpy.context.mode == 'EDIT_ARMATURE':
-        if assign_name == '':
-            assign_name = bone_name
-        # Copy the edit bone
-        edit_bone_1 = obj.data.edit_bones[bone_name]
-        edit_bone_2 = obj.data.edit_bones.new(assign_name)
-        bone_name_1 = bone_name
-        bone_name_2 = edit_bone_2.name
-
-        edit_bone_2.parent = edit_bone_1.parent
-        edit_bone_2.use_connect = edit_bone_1.use_connect
-
-        # Copy edit bone attributes
-        edit_bone_2.layers = list(edit_bone_1.layers)
-
-        edit_bone_2.head = Vector(edit_bone_1.head)
-        edit_bone_2.tail = Vector(edit_bone_1.tail)
-        edit_bone_2.roll = edit_bone_1.roll
-
-        edit_bone_2.use_inherit_rotation = edit_bone_1.use_inherit_rotation
-        edit_bone_2.use_inherit_scale = edit_bone_1.use_inherit_scale
-        edit_bone_2.use_local_location = edit_bone_1.use_local_location
+        edit_bones = obj.data.edit_bones
+        copies = []  # [(bone_name_1, bone_name_2)]
+        for bone_name, assign_name in bone_pairs:
+            if bone_name not in edit_bones:
+                raise MetarigError("copy_bone(): bone '%s' not found, cannot copy it" % bone_name)
+
+            # Copy the edit bone
+            edit_bone_1 = edit_bones[bone_name]
+            edit_bone_2 = edit_bones.new(unique_bone_name(obj, assign_name or bone_name))
+            copies.append((bone_name, edit_bone_2.name))
+
+            edit_bone_2.parent = edit_bone_1.parent
+            edit_bone_2.use_connect = edit_bone_1.use_connect
+
+            # Copy edit bone attributes
+            edit_bone_2.layers = list(edit_bone_1.layers)
+
+            edit_bone_2.head = Vector(edit_bone_1.head)
+            edit_bone_2.tail = Vector(edit_bone_1.tail)
+            edit_bone_2.roll = edit_bone_1.roll
+
+            edit_bone_2.use_inherit_rotation = edit_bone_1.use_inherit_rotation
+            edit_bone_2.use_inherit_scale = edit_bone_1.use_inherit_scale
+            edit_bone_2.use_local_location = edit_bone_1.use_local_location
+
+            edit_bone_2.use_deform = edit_bone_1.use_deform
+            edit_bone_2.bbone_segments = edit_bone_1.bbone_segments
+            edit_bone_2.bbone_in = edit_bone_1.bbone_in
+            edit_bone_2.bbone_out = edit_bone_1.bbone_out
+
+        if copy_pose:
+            bpy.ops.object.mode_set(mode='OBJECT')
+            copy_pose_bones(obj, copies)
+            bpy.ops.object.mode_set(mode='EDIT')
+
+        return [bone_name_2 for bone_name_1, bone_name_2 in copies]
+    else:
+        raise MetarigError("Cannot copy bones outside of edit mode")
 
-        edit_bone_2.use_deform = edit_bone_1.use_deform
-        edit_bone_2.bbone_segments = edit_bone_1.bbone_segments
-        edit_bone_2.bbone_in = edit_bone_1.bbone_in
-        edit_bone_2.bbone_out = edit_bone_1.bbone_out
-
-        bpy.ops.object.mode_set(mode='OBJECT')
 
+def copy_pose_bones(obj, bone_pairs):
+    """ Copies the pose bone attributes and custom properties of bones,
+        from a list of (bone name, copy name) pairs.
+        Runs in object mode.
+    """
+    for bone_name_1, bone_name_2 in bone_pairs:
         # Get the pose bones
         pose_bone_1 = obj.pose.bones[bone_name_1]
         pose_bone_2 = obj.pose.bones[bone_name_2]
@@ -319,11 +572,69 @@ def copy_bone(obj, bone_name, assign_name=''):
                 for key in prop1.keys():
                     prop2[key] = prop1[key]
 
-        bpy.ops.object.mode_set(mode='EDIT')
 
-        return bone_name_2
-    else:
-        raise MetarigError("Cannot copy bones outside of edit mode")
+def copy_bone(obj, bone_name, assign_name='', copy_pose=True):
+    """ Makes a copy of the given bone in the given armature object.
+        See copy_bones() for copy_pose.
+        Returns the resulting bone's name.
+    """
+    return copy_bones(obj, [(bone_name, assign_name)], copy_pose)[0]
+
+
+def copy_armature_bones(source, target, names=None):
+    """ Copies the bones of the armature object source into the armature
+        object target, in a single edit session of target, keeping their
+        names and armature space transforms.
+        names restricts the copy to those bones, a bone whose parent is
+        not copied is left without parent.
+        Leaves target active in object mode.
+    """
+    bones = [bone for bone in source.data.bones if names is None or bone.name in names]
+
+    ensure_mode(target, 'EDIT')
+    edit_bones = target.data.edit_bones
+
+    copies = {}
+    for bone in bones:
+        edit_bone = edit_bones.new(bone.name)
+        if edit_bone.name != bone.name:
+            raise MetarigError("copy_armature_bones(): bone '%s' already exists in '%s'" % (bone.name, target.name))
+        copies[bone.name] = edit_bone
+
+        edit_bone.head = bone.head_local
+        edit_bone.tail = bone.tail_local
+        edit_bone.matrix = bone.matrix_local  # sets the roll, keeps the length
+
+        edit_bone.layers = list(bone.layers)
+        edit_bone.hide = bone.hide
+
+        edit_bone.use_inherit_rotation = bone.use_inherit_rotation
+        edit_bone.use_inherit_scale = bone.use_inherit_scale
+        edit_bone.use_local_location = bone.use_local_location
+        edit_bone.use_relative_parent = bone.use_relative_parent
+
+        edit_bone.use_deform = bone.use_deform
+        edit_bone.envelope_distance = bone.envelope_distance
+        edit_bone.envelope_weight = bone.envelope_weight
+        edit_bone.use_envelope_multiply = bone.use_envelope_multiply
+        edit_bone.head_radius = bone.head_radius
+        edit_bone.tail_radius = bone.tail_radius
+
+        edit_bone.bbone_segments = bone.bbone_segments
+        edit_bone.bbone_in = bone.bbone_in
+        edit_bone.bbone_out = bone.bbone_out
+        edit_bone.bbone_x = bone.bbone_x
+        edit_bone.bbone_z = bone.bbone_z
+
+        for key in bone.keys():
+            edit_bone[key] = bone[key]
+
+    for bone in bones:
+        if bone.parent and bone.parent.name in copies:
+            copies[bone.name].parent = copies[bone.parent.name]
+            copies[bone.name].use_connect = bone.use_connect
+
+    ensure_mode(target, 'OBJECT')
 
 
 def flip_bone(obj, bone_name):
@@ -448,8 +759,83 @@ def obj_to_bone(obj, rig, bone_name):
     obj.scale = (bone.length * scl_avg), (bone.length * scl_avg), (bone.length * scl_avg)
 
 
-def create_widget(rig, bone_name, bone_transform_name=None):
+WIDGET_KEY_PROP = "rigify_widget_key"  # Shape key of shared widget meshes
+WIDGET_FINGERPRINT_PROP = "rigify_widget_fingerprint"  # Shape of a widget object
+
+# {shape key: mesh name} of shared widget meshes, None until scanned
+_widget_meshes = None
+
+
+def reset_widget_meshes(release=False):
+    """ Forgets the shared widget meshes, so they are looked up again in
+        bpy.data on next use.  With release the existing meshes aren't
+        shared anymore, so new widgets get newly built meshes.
+    """
+    global _widget_meshes
+    _widget_meshes = None
+
+    if release:
+        for mesh in bpy.data.meshes:
+            if WIDGET_KEY_PROP in mesh:
+                del mesh[WIDGET_KEY_PROP]
+
+
+def widget_shape_key(kind, *params):
+    """ Returns the key a widget mesh of the given kind and parameters is
+        shared by.
+    """
+    params = tuple(round(p, 6) if isinstance(p, float) else p for p in params)
+    return kind + repr(params)
+
+
+def get_widget_mesh(shape_key):
+    """ Returns the shared widget mesh for shape_key, or None.
+    """
+    global _widget_meshes
+    if _widget_meshes is None:
+        _widget_meshes = {}
+        for mesh in bpy.data.meshes:
+            if WIDGET_KEY_PROP in mesh:
+                _widget_meshes[mesh[WIDGET_KEY_PROP]] = mesh.name
+
+    mesh = bpy.data.meshes.get(_widget_meshes.get(shape_key, ""))
+    if mesh is not None and mesh.get(WIDGET_KEY_PROP) == shape_key:
+        return mesh
+    return None
+
+
+def widget_fingerprint(shape_key, bone_transform_name):
+    """ Returns what an existing widget object is compared with, to find
+        out if it has to be rebuilt: its shape and transform bone.
+    """
+    return "%s|%s" % (shape_key, bone_transform_name)
+
+
+def new_widget_mesh(obj_name, shape_key=None):
+    """ Returns (mesh, build) for a widget, the shared mesh of shape_key
+        if it was built already, or a new empty mesh to build.
+    """
+    if shape_key is not None:
+        mesh = get_widget_mesh(shape_key)
+        if mesh is not None:
+            return mesh, False
+        mesh = bpy.data.meshes.new(WGT_PREFIX + shape_key[:40])
+        mesh[WIDGET_KEY_PROP] = shape_key
+        _widget_meshes[shape_key] = mesh.name
+        return mesh, True
+    return bpy.data.meshes.new(obj_name), True
+
+
+def create_widget(rig, bone_name, bone_transform_name=None, shape_key=None, shared=True):
     """ Creates an empty widget object for a bone, and returns the object.
+        shape_key (see widget_shape_key()) identifies the shape: a widget
+        that already exists with the same shape and transform bone is left
+        as it is and None is returned, one whose shape changed gets a new
+        empty mesh to build.  Widgets without a shape_key are only rebuilt
+        on force widget update.
+        With shared, widgets with the same shape_key share one mesh: only
+        the first one is returned to build the mesh, the others get the
+        existing mesh and None is returned.
     """
     if bone_transform_name is None:
         bone_transform_name = bone_name
@@ -457,6 +843,7 @@ def create_widget(rig, bone_name, bone_transform_name=None):
     obj_name = WGT_PREFIX + rig.name + '_' + bone_name
     scene = bpy.context.scene
     id_store = bpy.context.window_manager
+    fingerprint = widget_fingerprint(shape_key, bone_transform_name) if shape_key else None
 
     # Check if it already exists in the scene
     if obj_name in scene.objects:
@@ -464,7 +851,17 @@ def create_widget(rig, bone_name, bone_transform_name=None):
         obj = scene.objects[obj_name]
         obj_to_bone(obj, rig, bone_transform_name)
 
-        return None
+        if not id_store.rigify_force_widget_update \
+        and (fingerprint is None or obj.get(WIDGET_FINGERPRINT_PROP) == fingerprint):
+            return None
+
+        # Rebuild the widget in place
+        old_mesh = obj.data
+        mesh, build = new_widget_mesh(obj_name, shape_key if shared else None)
+        obj.data = mesh
+        obj.modifiers.clear()
+        if old_mesh.users == 0:
+            bpy.data.meshes.remove(old_mesh)
     else:
         # Delete object if it exists in blend data but not scene data.
         # This is necessary so we can then create the object without
@@ -473,8 +870,8 @@ def create_widget(rig, bone_name, bone_transform_name=None):
             bpy.data.objects[obj_name].user_clear()
             bpy.data.objects.remove(bpy.data.objects[obj_name])
 
-        # Create mesh object
-        mesh = bpy.data.meshes.new(obj_name)
+        # Create mesh object, or reuse the shared mesh of its shape
+        mesh, build = new_widget_mesh(obj_name, shape_key if shared else None)
         obj = bpy.data.objects.new(obj_name, mesh)
         scene.objects.link(obj)
 
@@ -485,27 +882,54 @@ def create_widget(rig, bone_name, bone_transform_name=None):
             obj.parent = bpy.data.objects[wgts_group_name]
         obj.layers = WGT_LAYERS
 
+    if fingerprint is not None:
+        obj[WIDGET_FINGERPRINT_PROP] = fingerprint
+
+    if build:
         return obj
+    return None
+
+
+def remove_orphan_widgets(rig, wgts_group_name):
+    """ Deletes the widgets under the WGTS object of rig that no bone of
+        rig uses anymore, e.g. of removed bones or from an old rig name.
+        Returns the number of deleted widgets.
+    """
+    wgts_obj = bpy.data.objects.get(wgts_group_name)
+    if wgts_obj is None:
+        return 0
+
+    used = set(WGT_PREFIX + rig.name + '_' + bone.name for bone in rig.data.bones)
+    orphans = [obj for obj in wgts_obj.children
+               if obj.name.startswith(WGT_PREFIX) and obj.name not in used]
+    for obj in orphans:
+        mesh = obj.data
+        bpy.data.objects.remove(obj, do_unlink=True)
+        if mesh is not None and mesh.users == 0:
+            bpy.data.meshes.remove(mesh)
+    return len(orphans)
 
 
 # Common Widgets
 
-def create_line_widget(rig, bone_name, bone_transform_name=None):
+def create_line_widget(rig, bone_name, bone_transform_name=None, shared=True):
     """ Creates a basic line widget, a line that spans the length of the bone.
     """
-    obj = create_widget(rig, bone_name, bone_transform_name)
+    shape_key = widget_shape_key('line')
+    obj = create_widget(rig, bone_name, bone_transform_name, shape_key, shared)
     if obj is not None:
         mesh = obj.data
         mesh.from_pydata([(0, 0, 0), (0, 1, 0)], [(0, 1)], [])
         mesh.update()
 
 
-def create_circle_widget(rig, bone_name, radius=1.0, head_tail=0.0, with_line=False, bone_transform_name=None):
+def create_circle_widget(rig, bone_name, radius=1.0, head_tail=0.0, with_line=False, bone_transform_name=None, shared=True):
     """ Creates a basic circle widget, a circle around the y-axis.
         radius: the radius of the circle
         head_tail: where along the length of the bone the circle is (0.0=head, 1.0=tail)
     """
-    obj = create_widget(rig, bone_name, bone_transform_name)
+    shape_key = widget_shape_key('circle', radius, head_tail, with_line)
+    obj = create_widget(rig, bone_name, bone_transform_name, shape_key, shared)
     if obj != None:
         v = [(0.7071068286895752, 2.980232238769531e-07, -0.7071065306663513), (0.8314696550369263, 2.980232238769531e-07, -0.5555699467658997), (0.9238795042037964, 2.682209014892578e-07, -0.3826831877231598), (0.9807852506637573, 2.5331974029541016e-07, -0.19509011507034302), (1.0, 2.365559055306221e-07, 1.6105803979371558e-07), (0.9807853698730469, 2.2351741790771484e-07, 0.19509044289588928), (0.9238796234130859, 2.086162567138672e-07, 0.38268351554870605), (0.8314696550369263, 1.7881393432617188e-07, 0.5555704236030579), (0.7071068286895752, 1.7881393432617188e-07, 0.7071070075035095), (0.5555702447891235, 1.7881393432617188e-07, 0.8314698934555054), (0.38268327713012695, 1.7881393432617188e-07, 0.923879861831665), (0.19509008526802063, 1.7881393432617188e-07, 0.9807855486869812), (-3.2584136988589307e-07, 1.1920928955078125e-07, 1.000000238418579), (-0.19509072601795197, 1.7881393432617188e-07, 0.9807854294776917), (-0.3826838731765747, 1.7881393432617188e-07, 0.9238795638084412), (-0.5555707216262817, 1.7881393432617188e-07, 0.8314695358276367), (-0.7071071863174438, 1.7881393432617188e-07, 0.7071065902709961), (-0.8314700126647949, 1.7881393432617188e-07, 0.5555698871612549), (-0.923879861831665, 2.086162567138672e-07, 0.3826829195022583), (-0.9807853698730469, 2.2351741790771484e-07, 0.1950896978378296), (-1.0, 2.365559907957504e-07, -7.290432222362142e-07), (-0.9807850122451782, 2.5331974029541016e-07, -0.195091113448143), (-0.9238790273666382, 2.682209014892578e-07, -0.38268423080444336), (-0.831468939781189, 2.980232238769531e-07, -0.5555710196495056), (-0.7071058750152588, 2.980232238769531e-07, -0.707107424736023), (-0.555569052696228, 2.980232238769531e-07, -0.8314701318740845), (-0.38268208503723145, 2.980232238769531e-07, -0.923879861831665), (-0.19508881866931915, 2.980232238769531e-07, -0.9807853102684021), (1.6053570561780361e-06, 2.980232238769531e-07, -0.9999997615814209), (0.19509197771549225, 2.980232238769531e-07, -0.9807847142219543), (0.3826850652694702, 2.980232238769531e-07, -0.9238786101341248), (0.5555717945098877, 2.980232238769531e-07, -0.8314683437347412)]
         verts = [(a[0] * radius, head_tail, a[2] * radius) for a in v]
@@ -521,10 +945,11 @@ def create_circle_widget(rig, bone_name, radius=1.0, head_tail=0.0, with_line=Fa
         return None
 
 
-def create_cube_widget(rig, bone_name, radius=0.5, bone_transform_name=None):
+def create_cube_widget(rig, bone_name, radius=0.5, bone_transform_name=None, shared=True):
     """ Creates a basic cube widget.
     """
-    obj = create_widget(rig, bone_name, bone_transform_name)
+    shape_key = widget_shape_key('cube', radius)
+    obj = create_widget(rig, bone_name, bone_transform_name, shape_key, shared)
     if obj is not None:
         r = radius
         verts = [(r, r, r), (r, -r, r), (-r, -r, r), (-r, r, r), (r, r, -r), (r, -r, -r), (-r, -r, -r), (-r, r, -r)]
@@ -534,10 +959,11 @@ def create_cube_widget(rig, bone_name, radius=0.5, bone_transform_name=None):
         mesh.update()
 
 
-def create_chain_widget(rig, bone_name, radius=0.5, invert=False, bone_transform_name=None):
+def create_chain_widget(rig, bone_name, radius=0.5, invert=False, bone_transform_name=None, shared=True):
     """Creates a basic chain widget
     """
-    obj = create_widget(rig, bone_name, bone_transform_name)
+    shape_key = widget_shape_key('chain', radius, invert)
+    obj = create_widget(rig, bone_name, bone_transform_name, shape_key, shared)
     if obj != None:
         r = radius
         rh = radius/2
@@ -551,69 +977,55 @@ def create_chain_widget(rig, bone_name, radius=0.5, invert=False, bone_transform
         mesh.update()
 
 
-def create_sphere_widget(rig, bone_name, bone_transform_name=None):
+def create_sphere_widget(rig, bone_name, bone_transform_name=None, shared=True):
     """ Creates a basic sphere widget, three pependicular overlapping circles.
     """
-    obj = create_widget(rig, bone_name, bone_transform_name)
+    shape_key = widget_shape_key('sphere')
+    obj = create_widget(rig, bone_name, bone_transform_name, shape_key, shared)
     if obj != None:
-        verts = [(0.3535533845424652, 0.3535533845424652, 0.0), (0.4619397521018982, 0.19134171307086945, 0.0), (0.5, -2.1855694143368964e-08, 0.0), (0.4619397521018982, -0.19134175777435303, 0.0), (0.3535533845424652, -0.3535533845424652, 0.0), (0.19134174287319183, -0.4619397521018982, 0.0), (7.549790126404332e-08, -0.5, 0.0), (-0.1913416087627411, -0.46193981170654297, 0.0), (-0.35355329513549805, -0.35355350375175476, 0.0), (-0.4619397521018982, -0.19134178757667542, 0.0), (-0.5, 5.962440319251527e-09, 0.0), (-0.4619397222995758, 0.1913418024778366, 0.0), (-0.35355326533317566, 0.35355350375175476, 0.0), (-0.19134148955345154, 0.46193987131118774, 0.0), (3.2584136988589307e-07, 0.5, 0.0), (0.1913420855998993, 0.46193960309028625, 0.0), (7.450580596923828e-08, 0.46193960309028625, 0.19134199619293213), (5.9254205098113744e-08, 0.5, 2.323586443253589e-07), (4.470348358154297e-08, 0.46193987131118774, -0.1913415789604187), (2.9802322387695312e-08, 0.35355350375175476, -0.3535533547401428), (2.9802322387695312e-08, 0.19134178757667542, -0.46193981170654297), (5.960464477539063e-08, -1.1151834122813398e-08, -0.5000000596046448), (5.960464477539063e-08, -0.1913418024778366, -0.46193984150886536), (5.960464477539063e-08, -0.35355350375175476, -0.3535533845424652), (7.450580596923828e-08, -0.46193981170654297, -0.19134166836738586), (9.348272556053416e-08, -0.5, 1.624372103492533e-08), (1.043081283569336e-07, -0.4619397521018982, 0.19134168326854706), (1.1920928955078125e-07, -0.3535533845424652, 0.35355329513549805), (1.1920928955078125e-07, -0.19134174287319183, 0.46193966269493103), (1.1920928955078125e-07, -4.7414250303745575e-09, 0.49999991059303284), (1.1920928955078125e-07, 0.19134172797203064, 0.46193966269493103), (8.940696716308594e-08, 0.3535533845424652, 0.35355329513549805), (0.3535534739494324, 0.0, 0.35355329513549805), (0.1913418173789978, -2.9802322387695312e-08, 0.46193966269493103), (8.303572940349113e-08, -5.005858838558197e-08, 0.49999991059303284), (-0.19134165346622467, -5.960464477539063e-08, 0.46193966269493103), (-0.35355329513549805, -8.940696716308594e-08, 0.35355329513549805), (-0.46193963289260864, -5.960464477539063e-08, 0.19134168326854706), (-0.49999991059303284, -5.960464477539063e-08, 1.624372103492533e-08), (-0.4619397521018982, -2.9802322387695312e-08, -0.19134166836738586), (-0.3535534143447876, -2.9802322387695312e-08, -0.3535533845424652), (-0.19134171307086945, 0.0, -0.46193984150886536), (7.662531942287387e-08, 9.546055501630235e-09, -0.5000000596046448), (0.19134187698364258, 5.960464477539063e-08, -0.46193981170654297), (0.3535535931587219, 5.960464477539063e-08, -0.3535533547401428), (0.4619399905204773, 5.960464477539063e-08, -0.1913415789604187), (0.5000000596046448, 5.960464477539063e-08, 2.323586443253589e-07), (0.4619396924972534, 2.9802322387695312e-08, 0.19134199619293213)]
-        edges = [(0, 1), (1, 2), (2, 3), (3, 4), (4, 5), (5, 6), (6, 7), (7, 8), (8, 9), (9, 10), (10, 11), (11, 12), (12, 13), (13, 14), (14, 15), (0, 15), (16, 31), (16, 17), (17, 18), (18, 19), (19, 20), (20, 21), (21, 22), (22, 23), (23, 24), (24, 25), (25, 26), (26, 27), (27, 28), (28, 29), (29, 30), (30, 31), (32, 33), (33, 34), (34, 35), (35, 36), (36, 37), (37, 38), (38, 39), (39, 40), (40, 41), (41, 42), (42, 43), (43, 44), (44, 45), (45, 46), (46, 47), (32, 47)]
-        mesh = obj.data
-        mesh.from_pydata(verts, edges, [])
-        mesh.update()
+        build_widget_mesh(obj.data, 'sphere')
 
 
-def create_limb_widget(rig, bone_name, bone_transform_name=None):
+def create_limb_widget(rig, bone_name, bone_transform_name=None, shared=True):
     """ Creates a basic limb widget, a line that spans the length of the
         bone, with a circle around the center.
     """
-    obj = create_widget(rig, bone_name, bone_transform_name)
+    shape_key = widget_shape_key('limb')
+    obj = create_widget(rig, bone_name, bone_transform_name, shape_key, shared)
     if obj != None:
-        verts = [(-1.1920928955078125e-07, 1.7881393432617188e-07, 0.0), (3.5762786865234375e-07, 1.0000004768371582, 0.0), (0.1767769455909729, 0.5000001192092896, 0.17677664756774902), (0.20786768198013306, 0.5000001192092896, 0.1388925313949585), (0.23097014427185059, 0.5000001192092896, 0.09567084908485413), (0.24519658088684082, 0.5000001192092896, 0.048772573471069336), (0.2500002384185791, 0.5000001192092896, -2.545945676502015e-09), (0.24519658088684082, 0.5000001192092896, -0.048772573471069336), (0.23097014427185059, 0.5000001192092896, -0.09567084908485413), (0.20786768198013306, 0.5000001192092896, -0.13889259099960327), (0.1767769455909729, 0.5000001192092896, -0.1767767071723938), (0.13889282941818237, 0.5000001192092896, -0.20786744356155396), (0.09567105770111084, 0.5000001192092896, -0.23096990585327148), (0.04877278208732605, 0.5000001192092896, -0.24519634246826172), (1.7279069197684294e-07, 0.5000000596046448, -0.25), (-0.0487724244594574, 0.5000001192092896, -0.24519634246826172), (-0.09567070007324219, 0.5000001192092896, -0.2309698462486267), (-0.13889241218566895, 0.5000001192092896, -0.20786738395690918), (-0.17677652835845947, 0.5000001192092896, -0.17677664756774902), (-0.20786726474761963, 0.5000001192092896, -0.13889244198799133), (-0.23096972703933716, 0.5000001192092896, -0.09567070007324219), (-0.24519610404968262, 0.5000001192092896, -0.04877239465713501), (-0.2499997615814209, 0.5000001192092896, 2.1997936983098043e-07), (-0.24519598484039307, 0.5000001192092896, 0.04877282679080963), (-0.23096948862075806, 0.5000001192092896, 0.09567108750343323), (-0.20786696672439575, 0.5000001192092896, 0.1388927698135376), (-0.1767762303352356, 0.5000001192092896, 0.17677688598632812), (-0.13889199495315552, 0.5000001192092896, 0.2078675627708435), (-0.09567028284072876, 0.5000001192092896, 0.23097002506256104), (-0.048771947622299194, 0.5000001192092896, 0.24519634246826172), (6.555903269145347e-07, 0.5000001192092896, 0.25), (0.04877324402332306, 0.5000001192092896, 0.24519622325897217), (0.09567153453826904, 0.5000001192092896, 0.23096966743469238), (0.13889318704605103, 0.5000001192092896, 0.20786714553833008)]
-        edges = [(0, 1), (2, 3), (4, 3), (5, 4), (5, 6), (6, 7), (8, 7), (8, 9), (10, 9), (10, 11), (11, 12), (13, 12), (14, 13), (14, 15), (16, 15), (16, 17), (17, 18), (19, 18), (19, 20), (21, 20), (21, 22), (22, 23), (24, 23), (25, 24), (25, 26), (27, 26), (27, 28), (29, 28), (29, 30), (30, 31), (32, 31), (32, 33), (2, 33)]
-        mesh = obj.data
-        mesh.from_pydata(verts, edges, [])
-        mesh.update()
+        build_widget_mesh(obj.data, 'limb')
 
 
-def create_bone_widget(rig, bone_name, bone_transform_name=None):
+def create_bone_widget(rig, bone_name, bone_transform_name=None, shared=True):
     """ Creates a basic bone widget, a simple obolisk-esk shape.
     """
-    obj = create_widget(rig, bone_name, bone_transform_name)
+    shape_key = widget_shape_key('bone')
+    obj = create_widget(rig, bone_name, bone_transform_name, shape_key, shared)
     if obj != None:
-        verts = [(0.04, 1.0, -0.04), (0.1, 0.0, -0.1), (-0.1, 0.0, -0.1), (-0.04, 1.0, -0.04), (0.04, 1.0, 0.04), (0.1, 0.0, 0.1), (-0.1, 0.0, 0.1), (-0.04, 1.0, 0.04)]
-        edges = [(1, 2), (0, 1), (0, 3), (2, 3), (4, 5), (5, 6), (6, 7), (4, 7), (1, 5), (0, 4), (2, 6), (3, 7)]
-        mesh = obj.data
-        mesh.from_pydata(verts, edges, [])
-        mesh.update()
+        build_widget_mesh(obj.data, 'bone')
 
 
-def create_compass_widget(rig, bone_name, bone_transform_name=None):
+def create_compass_widget(rig, bone_name, bone_transform_name=None, shared=True):
     """ Creates a compass-shaped widget.
     """
-    obj = create_widget(rig, bone_name, bone_transform_name)
+    shape_key = widget_shape_key('compass')
+    obj = create_widget(rig, bone_name, bone_transform_name, shape_key, shared)
     if obj != None:
-        verts = [(0.0, 1.2000000476837158, 0.0), (0.19509032368659973, 0.9807852506637573, 0.0), (0.3826834559440613, 0.9238795042037964, 0.0), (0.5555702447891235, 0.8314695954322815, 0.0), (0.7071067690849304, 0.7071067690849304, 0.0), (0.8314696550369263, 0.5555701851844788, 0.0), (0.9238795042037964, 0.3826834261417389, 0.0), (0.9807852506637573, 0.19509035348892212, 0.0), (1.2000000476837158, 7.549790126404332e-08, 0.0), (0.9807853102684021, -0.19509020447731018, 0.0), (0.9238795638084412, -0.38268327713012695, 0.0), (0.8314696550369263, -0.5555701851844788, 0.0), (0.7071067690849304, -0.7071067690849304, 0.0), (0.5555701851844788, -0.8314696550369263, 0.0), (0.38268327713012695, -0.9238796234130859, 0.0), (0.19509008526802063, -0.9807853102684021, 0.0), (-3.2584136988589307e-07, -1.2999999523162842, 0.0), (-0.19509072601795197, -0.9807851910591125, 0.0), (-0.3826838731765747, -0.9238793253898621, 0.0), (-0.5555707216262817, -0.8314692974090576, 0.0), (-0.7071072459220886, -0.707106351852417, 0.0), (-0.8314700126647949, -0.5555696487426758, 0.0), (-0.923879861831665, -0.3826826810836792, 0.0), (-0.9807854294776917, -0.1950894594192505, 0.0), (-1.2000000476837158, 9.655991561885457e-07, 0.0), (-0.980785071849823, 0.1950913518667221, 0.0), (-0.923879086971283, 0.38268446922302246, 0.0), (-0.831468939781189, 0.5555712580680847, 0.0), (-0.7071058750152588, 0.707107663154602, 0.0), (-0.5555691123008728, 0.8314703702926636, 0.0), (-0.38268208503723145, 0.9238801002502441, 0.0), (-0.19508881866931915, 0.9807855486869812, 0.0)]
-        edges = [(0, 1), (1, 2), (2, 3), (3, 4), (4, 5), (5, 6), (6, 7), (7, 8), (8, 9), (9, 10), (10, 11), (11, 12), (12, 13), (13, 14), (14, 15), (15, 16), (16, 17), (17, 18), (18, 19), (19, 20), (20, 21), (21, 22), (22, 23), (23, 24), (24, 25), (25, 26), (26, 27), (27, 28), (28, 29), (29, 30), (30, 31), (0, 31)]
-        mesh = obj.data
-        mesh.from_pydata(verts, edges, [])
-        mesh.update()
+        build_widget_mesh(obj.data, 'compass')
 
 
-def create_root_widget(rig, bone_name, bone_transform_name=None):
+def create_root_widget(rig, bone_name, bone_transform_name=None, shared=True):
     """ Creates a widget for the root bone.
     """
-    obj = create_widget(rig, bone_name, bone_transform_name)
+    shape_key = widget_shape_key('root')
+    obj = create_widget(rig, bone_name, bone_transform_name, shape_key, shared)
     if obj != None:
-        verts = [(0.7071067690849304, 0.7071067690849304, 0.0), (0.7071067690849304, -0.7071067690849304, 0.0), (-0.7071067690849304, 0.7071067690849304, 0.0), (-0.7071067690849304, -0.7071067690849304, 0.0), (0.8314696550369263, 0.5555701851844788, 0.0), (0.8314696550369263, -0.5555701851844788, 0.0), (-0.8314696550369263, 0.5555701851844788, 0.0), (-0.8314696550369263, -0.5555701851844788, 0.0), (0.9238795042037964, 0.3826834261417389, 0.0), (0.9238795042037964, -0.3826834261417389, 0.0), (-0.9238795042037964, 0.3826834261417389, 0.0), (-0.9238795042037964, -0.3826834261417389, 0.0), (0.9807852506637573, 0.19509035348892212, 0.0), (0.9807852506637573, -0.19509035348892212, 0.0), (-0.9807852506637573, 0.19509035348892212, 0.0), (-0.9807852506637573, -0.19509035348892212, 0.0), (0.19509197771549225, 0.9807849526405334, 0.0), (0.19509197771549225, -0.9807849526405334, 0.0), (-0.19509197771549225, 0.9807849526405334, 0.0), (-0.19509197771549225, -0.9807849526405334, 0.0), (0.3826850652694702, 0.9238788485527039, 0.0), (0.3826850652694702, -0.9238788485527039, 0.0), (-0.3826850652694702, 0.9238788485527039, 0.0), (-0.3826850652694702, -0.9238788485527039, 0.0), (0.5555717945098877, 0.8314685821533203, 0.0), (0.5555717945098877, -0.8314685821533203, 0.0), (-0.5555717945098877, 0.8314685821533203, 0.0), (-0.5555717945098877, -0.8314685821533203, 0.0), (0.19509197771549225, 1.2807848453521729, 0.0), (0.19509197771549225, -1.2807848453521729, 0.0), (-0.19509197771549225, 1.2807848453521729, 0.0), (-0.19509197771549225, -1.2807848453521729, 0.0), (1.280785322189331, 0.19509035348892212, 0.0), (1.280785322189331, -0.19509035348892212, 0.0), (-1.280785322189331, 0.19509035348892212, 0.0), (-1.280785322189331, -0.19509035348892212, 0.0), (0.3950919806957245, 1.2807848453521729, 0.0), (0.3950919806957245, -1.2807848453521729, 0.0), (-0.3950919806957245, 1.2807848453521729, 0.0), (-0.3950919806957245, -1.2807848453521729, 0.0), (1.280785322189331, 0.39509034156799316, 0.0), (1.280785322189331, -0.39509034156799316, 0.0), (-1.280785322189331, 0.39509034156799316, 0.0), (-1.280785322189331, -0.39509034156799316, 0.0), (0.0, 1.5807849168777466, 0.0), (0.0, -1.5807849168777466, 0.0), (1.5807852745056152, 0.0, 0.0), (-1.5807852745056152, 0.0, 0.0)]
-        edges = [(0, 4), (1, 5), (2, 6), (3, 7), (4, 8), (5, 9), (6, 10), (7, 11), (8, 12), (9, 13), (10, 14), (11, 15), (16, 20), (17, 21), (18, 22), (19, 23), (20, 24), (21, 25), (22, 26), (23, 27), (0, 24), (1, 25), (2, 26), (3, 27), (16, 28), (17, 29), (18, 30), (19, 31), (12, 32), (13, 33), (14, 34), (15, 35), (28, 36), (29, 37), (30, 38), (31, 39), (32, 40), (33, 41), (34, 42), (35, 43), (36, 44), (37, 45), (38, 44), (39, 45), (40, 46), (41, 46), (42, 47), (43, 47)]
-        mesh = obj.data
-        mesh.from_pydata(verts, edges, [])
-        mesh.update()
+        build_widget_mesh(obj.data, 'root')
 
 
-def create_neck_bend_widget(rig, bone_name, radius=1.0, head_tail=0.0, bone_transform_name=None):
-    obj = create_widget(rig, bone_name, bone_transform_name)
+def create_neck_bend_widget(rig, bone_name, radius=1.0, head_tail=0.0, bone_transform_name=None, shared=True):
+    shape_key = widget_shape_key('neck_bend', radius, head_tail)
+    obj = create_widget(rig, bone_name, bone_transform_name, shape_key, shared)
     size = 2.0
     if obj != None:
         v = [(-0.08855080604553223 * size, 0.7388765811920166 * size, -0.3940150737762451 * size),
@@ -681,119 +1093,19 @@ def create_neck_bend_widget(rig, bone_name, radius=1.0, head_tail=0.0, bone_tran
         mesh.update()
 
 
-def create_neck_tweak_widget(rig, bone_name, size=1.0, bone_transform_name=None):
-    obj = create_widget(rig, bone_name, bone_transform_name)
+def create_neck_tweak_widget(rig, bone_name, size=1.0, bone_transform_name=None, shared=True):
+    shape_key = widget_shape_key('neck_tweak', size)
+    obj = create_widget(rig, bone_name, bone_transform_name, shape_key, shared)
 
     if obj != None:
-        verts = [(0.3535533845424652 * size, 0.3535533845424652 * size, 0.0 * size),
-                 (0.4619397521018982 * size, 0.19134171307086945 * size, 0.0 * size),
-                 (0.5 * size, -2.1855694143368964e-08 * size, 0.0 * size),
-                 (0.4619397521018982 * size, -0.19134175777435303 * size, 0.0 * size),
-                 (0.3535533845424652 * size, -0.3535533845424652 * size, 0.0 * size),
-                 (0.19134174287319183 * size, -0.4619397521018982 * size, 0.0 * size),
-                 (7.549790126404332e-08 * size, -0.5 * size, 0.0 * size),
-                 (-0.1913416087627411 * size, -0.46193981170654297 * size, 0.0 * size),
-                 (-0.35355329513549805 * size, -0.35355350375175476 * size, 0.0 * size),
-                 (-0.4619397521018982 * size, -0.19134178757667542 * size, 0.0 * size),
-                 (-0.5 * size, 5.962440319251527e-09 * size, 0.0 * size),
-                 (-0.4619397222995758 * size, 0.1913418024778366 * size, 0.0 * size),
-                 (-0.35355326533317566 * size, 0.35355350375175476 * size, 0.0 * size),
-                 (-0.19134148955345154 * size, 0.46193987131118774 * size, 0.0 * size),
-                 (3.2584136988589307e-07 * size, 0.5 * size, 0.0 * size),
-                 (0.1913420855998993 * size, 0.46193960309028625 * size, 0.0 * size),
-                 (7.450580596923828e-08 * size, 0.46193960309028625 * size, 0.19134199619293213 * size),
-                 (5.9254205098113744e-08 * size, 0.5 * size, 2.323586443253589e-07 * size),
-                 (4.470348358154297e-08 * size, 0.46193987131118774 * size, -0.1913415789604187 * size),
-                 (2.9802322387695312e-08 * size, 0.35355350375175476 * size, -0.3535533547401428 * size),
-                 (2.9802322387695312e-08 * size, 0.19134178757667542 * size, -0.46193981170654297 * size),
-                 (5.960464477539063e-08 * size, -1.1151834122813398e-08 * size, -0.5000000596046448 * size),
-                 (5.960464477539063e-08 * size, -0.1913418024778366 * size, -0.46193984150886536 * size),
-                 (5.960464477539063e-08 * size, -0.35355350375175476 * size, -0.3535533845424652 * size),
-                 (7.450580596923828e-08 * size, -0.46193981170654297 * size, -0.19134166836738586 * size),
-                 (9.348272556053416e-08 * size, -0.5 * size, 1.624372103492533e-08 * size),
-                 (1.043081283569336e-07 * size, -0.4619397521018982 * size, 0.19134168326854706 * size),
-                 (1.1920928955078125e-07 * size, -0.3535533845424652 * size, 0.35355329513549805 * size),
-                 (1.1920928955078125e-07 * size, -0.19134174287319183 * size, 0.46193966269493103 * size),
-                 (1.1920928955078125e-07 * size, -4.7414250303745575e-09 * size, 0.49999991059303284 * size),
-                 (1.1920928955078125e-07 * size, 0.19134172797203064 * size, 0.46193966269493103 * size),
-                 (8.940696716308594e-08 * size, 0.3535533845424652 * size, 0.35355329513549805 * size),
-                 (0.3535534739494324 * size, 0.0 * size, 0.35355329513549805 * size),
-                 (0.1913418173789978 * size, -2.9802322387695312e-08 * size, 0.46193966269493103 * size),
-                 (8.303572940349113e-08 * size, -5.005858838558197e-08 * size, 0.49999991059303284 * size),
-                 (-0.19134165346622467 * size, -5.960464477539063e-08 * size, 0.46193966269493103 * size),
-                 (-0.35355329513549805 * size, -8.940696716308594e-08 * size, 0.35355329513549805 * size),
-                 (-0.46193963289260864 * size, -5.960464477539063e-08 * size, 0.19134168326854706 * size),
-                 (-0.49999991059303284 * size, -5.960464477539063e-08 * size, 1.624372103492533e-08 * size),
-                 (-0.4619397521018982 * size, -2.9802322387695312e-08 * size, -0.19134166836738586 * size),
-                 (-0.3535534143447876 * size, -2.9802322387695312e-08 * size, -0.3535533845424652 * size),
-                 (-0.19134171307086945 * size, 0.0 * size, -0.46193984150886536 * size),
-                 (7.662531942287387e-08 * size, 9.546055501630235e-09 * size, -0.5000000596046448 * size),
-                 (0.19134187698364258 * size, 5.960464477539063e-08 * size, -0.46193981170654297 * size),
-                 (0.3535535931587219 * size, 5.960464477539063e-08 * size, -0.3535533547401428 * size),
-                 (0.4619399905204773 * size, 5.960464477539063e-08 * size, -0.1913415789604187 * size),
-                 (0.5000000596046448 * size, 5.960464477539063e-08 * size, 2.323586443253589e-07 * size),
-                 (0.4619396924972534 * size, 2.9802322387695312e-08 * size, 0.19134199619293213 * size),
-                 (1.563460111618042 * size, 2.778762819843905e-08 * size, 1.5634593963623047 * size),
-                 (0.8461387157440186 * size, -1.0400220418205208e-07 * size, 2.0427582263946533 * size),
-                 (7.321979467178608e-08 * size, -1.9357810288056498e-07 * size, 2.2110657691955566 * size),
-                 (-0.8461385369300842 * size, -2.3579201524626114e-07 * size, 2.0427582263946533 * size),
-                 (-1.5634597539901733 * size, -3.67581861837607e-07 * size, 1.5634593963623047 * size),
-                 (-2.0427584648132324 * size, -2.3579204366797057e-07 * size, 0.8461383581161499 * size),
-                 (-2.211066246032715 * size, -2.3579204366797057e-07 * size, 9.972505665700737e-08 * size),
-                 (-2.0427589416503906 * size, -1.0400223260376151e-07 * size, -0.8461381196975708 * size),
-                 (-1.5634604692459106 * size, -1.040022183929068e-07 * size, -1.563459873199463 * size),
-                 (-0.8461387753486633 * size, 2.77876033294433e-08 * size, -2.042759418487549 * size),
-                 (4.4872678017782164e-08 * size, 7.00015263532805e-08 * size, -2.211066484451294 * size),
-                 (0.8461388349533081 * size, 2.913672290105751e-07 * size, -2.0427591800689697 * size),
-                 (1.5634608268737793 * size, 2.9136725743228453e-07 * size, -1.563459873199463 * size),
-                 (2.042759895324707 * size, 2.9136725743228453e-07 * size, -0.8461377024650574 * size),
-                 (2.211066722869873 * size, 2.9136725743228453e-07 * size, 1.0554133496043505e-06 * size),
-                 (2.0427587032318115 * size, 1.5957746768435754e-07 * size, 0.8461397886276245 * size), ]
-        edges = [(0, 1), (1, 2), (2, 3), (3, 4), (4, 5), (5, 6), (6, 7), (7, 8), (8, 9), (9, 10), (10, 11),
-                 (11, 12), (12, 13), (13, 14), (14, 15), (0, 15), (16, 31), (16, 17), (17, 18), (18, 19), (19, 20),
-                 (20, 21), (21, 22), (22, 23), (23, 24), (24, 25), (25, 26), (26, 27), (27, 28), (28, 29), (29, 30),
-                 (30, 31), (32, 33), (33, 34), (34, 35), (35, 36), (36, 37), (37, 38), (38, 39), (39, 40), (40, 41),
-                 (41, 42), (42, 43), (43, 44), (44, 45), (45, 46), (46, 47), (32, 47), (48, 49), (49, 50), (50, 51),
-                 (51, 52), (52, 53), (53, 54), (54, 55), (55, 56), (56, 57), (57, 58), (58, 59), (59, 60), (60, 61),
-                 (61, 62), (62, 63), (48, 63), (21, 58), (10, 54), (29, 50), (2, 62), ]
-
-        mesh = obj.data
-        mesh.from_pydata(verts, edges, [])
-        mesh.update()
+        build_widget_mesh(obj.data, 'neck_tweak', size)
 
 # POE 2018-07-25 create_dome_widget
-def create_dome_widget(rig, bone_name, size=1.0, bone_transform_name=None):
-    obj = create_widget(rig, bone_name, bone_transform_name)
+def create_dome_widget(rig, bone_name, size=1.0, bone_transform_name=None, shared=True):
+    shape_key = widget_shape_key('dome', size)
+    obj = create_widget(rig, bone_name, bone_transform_name, shape_key, shared)
     if obj != None:
-        verts = [
-            (1.0000*size,-0.0000*size,0.0000*size)
-            , (0.0000*size,-0.0000*size,1.0000*size)
-			, (-1.0000*size, 0.0000*size, -0.0000*size)
-			, (0.0000*size, 0.0000*size, -1.0000*size)
-			, (0.0000*size, 0.3827*size, -0.9239*size)
-			, (0.0000*size, 0.0000*size, -1.0000*size)
-			, (0.0000*size, -0.0000*size, 1.0000*size)
-			, (0.0000*size, 0.3827*size, 0.9239*size)
-			, (0.0000*size, 0.7071*size, 0.7071*size)
-			, (0.0000*size, 0.9239*size, 0.3827*size)
-			, (0.0000*size, 1.0000*size, 0.0000*size)
-			, (0.0000*size, 0.9239*size, -0.3827*size)
-			, (0.0000*size, 0.7071*size, -0.7071*size)
-			, (0.7071*size, 0.7071*size, 0.0000*size)
-			, (0.3827*size, 0.9239*size, 0.0000*size)
-			, (0.0000*size, 1.0000*size, 0.0000*size)
-			, (-0.3827*size, 0.9239*size, 0.0000*size)
-			, (-0.7071*size, 0.7071*size, 0.0000*size)
-			, (-0.9239*size, 0.3827*size, 0.0000*size)
-			, (-1.0000*size, 0.0000*size, 0.0000*size)
-			, (1.0000*size, 0.0000*size, -0.0000*size)
-			, (0.9239*size, 0.3827*size, -0.0000*size)
-			, ]
-        edges = [(4, 12), (4, 5), (6, 7), (7, 8), (8, 9), (9, 10), (10, 11), (11, 12), (13, 14), (14, 15), (15, 16), (16, 17), (17, 18), (18, 19), (20, 21), (13, 21), ]
-        mesh = obj.data
-        mesh.from_pydata(verts, edges, [])
-        mesh.update()
-        mesh.update()
+        build_widget_mesh(obj.data, 'dome', size)
         return obj
     else:
         return None
@@ -941,28 +1253,198 @@ def align_bone_y_axis(obj, bone, vec):
 # Misc
 #=============================================
 
+# Properties copy_attributes() never copies
+COPY_EXCLUDE = {"group", "is_valid", "rna_type"}
+
+# Property types foreach_get()/foreach_set() can transfer
+FOREACH_TYPES = {'BOOLEAN', 'INT', 'FLOAT'}
+
+# {RNA type identifier: [(property identifier, property type, array length)]}
+_copy_plans = {}
+
+
+def is_id_type(srna):
+    """ Returns whether the RNA struct type srna is an ID datablock type.
+    """
+    while srna is not None:
+        if srna.identifier == 'ID':
+            return True
+        srna = srna.base
+    return False
+
+
+def get_copy_plan(struct):
+    """ Returns the writable properties of the RNA type of struct as
+        (identifier, type, array length) tuples, in name order.
+        Pointers are only included if they point to ID datablocks, so
+        nested structs are not shared between owners.
+        The plans are built once per RNA type.
+    """
+    identifier = struct.bl_rna.identifier
+    plan = _copy_plans.get(identifier)
+    if plan is None:
+        plan = []
+        for prop in struct.bl_rna.properties:
+            key = prop.identifier
+            if prop.is_readonly \
+            or prop.type == 'COLLECTION' \
+            or key in COPY_EXCLUDE \
+            or key.startswith("error_"):
+                continue
+            if prop.type == 'POINTER' and not is_id_type(prop.fixed_type):
+                continue
+            plan.append((key, prop.type, getattr(prop, "array_length", 0)))
+        plan.sort()
+        _copy_plans[identifier] = plan
+    return plan
+
+
 def copy_attributes(a, b):
-    keys = dir(a)
-    for key in keys:
-        if not key.startswith("_") \
-        and not key.startswith("error_") \
-        and key != "group" \
-        and key != "is_valid" \
-        and key != "rna_type" \
-        and key != "bl_rna":
+    """ Copies the writable properties of a to b, of the same RNA type.
+    """
+    for key, prop_type, length in get_copy_plan(a):
+        try:
+            setattr(b, key, getattr(a, key))
+        except AttributeError:
+            # Properties that are read-only in the current state
+            pass
+
+
+def copy_collection_attributes(a, b):
+    """ Copies the writable properties of the items of collection a to the
+        items of collection b, which must have as many items of the same
+        type.  Number and boolean properties are transferred in bulk with
+        foreach_get()/foreach_set(), the others item by item.
+    """
+    count = len(a)
+    if count == 0:
+        return
+    if len(b) != count:
+        raise MetarigError("copy_collection_attributes(): collections differ in length")
+
+    per_item = []
+    for key, prop_type, length in get_copy_plan(a[0]):
+        if prop_type in FOREACH_TYPES:
+            values = [0] * (count * max(length, 1))
+            a.foreach_get(key, values)
+            b.foreach_set(key, values)
+        else:
+            per_item.append(key)
+
+    for item_a, item_b in zip(a, b):
+        for key in per_item:
             try:
-                setattr(b, key, getattr(a, key))
+                setattr(item_b, key, getattr(item_a, key))
             except AttributeError:
                 pass
 
 
+def copy_keyframe_points(a, b):
+    """ Replaces the keyframes of F-curve b with copies of the keyframes
+        of F-curve a, adding them all at once and copying them in bulk.
+    """
+    points = b.keyframe_points
+    for point in reversed(list(points)):
+        points.remove(point, fast=True)
+
+    points.add(len(a.keyframe_points))
+    copy_collection_attributes(a.keyframe_points, points)
+    b.update()
+
+
+def add_keyframe_points(fcurve, coords, interpolation=None):
+    """ Adds keyframes at the (frame, value) pairs of coords to fcurve,
+        all at once.  interpolation, if given, is set on all the new
+        keyframes.
+    """
+    points = fcurve.keyframe_points
+    start = len(points)
+    points.add(len(coords))
+
+    values = [0.0] * (2 * len(points))
+    points.foreach_get("co", values)
+    values[2 * start:] = [v for co in coords for v in co]
+    points.foreach_set("co", values)
+
+    if interpolation is not None:
+        for point in points[start:]:
+            point.interpolation = interpolation
+    fcurve.update()
+
+
+# {module name: (module, source file mtime)} of the rig and metarig modules
+_module_cache = {}
+
+# Module cache statistics, misses are first loads, reloads changed sources
+module_cache_stats = {'hits': 0, 'misses': 0, 'reloads': 0}
+_module_listeners = []
+
+
+def get_source_mtime(module):
+    try:
+        return os.path.getmtime(module.__file__)
+    except (AttributeError, TypeError, OSError):
+        return None
+
+
+def get_cached_module(name):
+    """ Imports a module of the add-on by its relative name and returns it.
+        The module is loaded (or reloaded, if it was imported before) on
+        first use, later calls only reload it if its source file changed.
+    """
+    entry = _module_cache.get(name)
+    if entry is not None:
+        module, mtime = entry
+        if get_source_mtime(module) == mtime:
+            module_cache_stats['hits'] += 1
+            return module
+        module_cache_stats['reloads'] += 1
+        importlib.reload(module)
+    else:
+        module_cache_stats['misses'] += 1
+        loaded = (MODULE_NAME + name) in sys.modules
+        module = importlib.import_module(name, package=MODULE_NAME)
+        if loaded:
+            # Imported by an earlier load of the add-on
+            importlib.reload(module)
+
+    _module_cache[name] = (module, get_source_mtime(module))
+    for l in list(_module_listeners):
+        l(name, module)
+    return module
+
+
+def add_module_listener(listener):
+    """ Calls listener(name, module) whenever get_cached_module() loads or
+        reloads a module.
+    """
+    if listener not in _module_listeners:
+        _module_listeners.append(listener)
+
+
+def remove_module_listener(listener):
+    if listener in _module_listeners:
+        _module_listeners.remove(listener)
+
+
+def get_cached_modules():
+    """ Returns (name, module) pairs of the modules loaded so far.
+    """
+    return [(name, entry[0]) for name, entry in _module_cache.items()]
+
+
+def clear_module_cache():
+    """ Makes get_rig_type() and get_metarig_module() reload every module
+        on next use.
+    """
+    _module_cache.clear()
+
+
 def get_rig_type(rig_type):
     """ Fetches a rig module by name, and returns it.
     """
     name = ".%s.%s" % (RIG_DIR, rig_type)
-    submod = importlib.import_module(name, package=MODULE_NAME)
-    importlib.reload(submod)
-    return submod
+    return get_cached_module(name)
 
 
 def get_metarig_module(metarig_name, path=METARIG_DIR):
@@ -970,9 +1452,7 @@ def get_metarig_module(metarig_name, path=METARIG_DIR):
     """
 
     name = ".%s.%s" % (path, metarig_name)
-    submod = importlib.import_module(name, package=MODULE_NAME)
-    importlib.reload(submod)
-    return submod
+    return get_cached_module(name)
 
 
 def connected_children_names(obj, bone_name):
@@ -1001,6 +1481,34 @@ def connected_children_names(obj, bone_name):
     return names
 
 
+def get_bone_depths(bones):
+    """ Returns {bone name: number of parents} for a bone collection
+        (data.bones, edit_bones or pose.bones), visiting every bone once.
+    """
+    depths = {}
+    for bone in bones:
+        chain = []
+        while bone is not None and bone.name not in depths:
+            chain.append(bone.name)
+            bone = bone.parent
+        depth = depths[bone.name] if bone is not None else -1
+        for name in reversed(chain):
+            depth += 1
+            depths[name] = depth
+    return depths
+
+
+def sort_bones(bones, names=None):
+    """ Returns the names of a bone collection, or the given subset of
+        them, with parents before their children.
+        (root-most -> leaf-most, alphabetical)
+    """
+    depths = get_bone_depths(bones)
+    if names is None:
+        names = depths.keys()
+    return sorted(names, key=lambda name: (depths[name], name))
+
+
 def has_connected_children(bone):
     """ Returns true/false whether a bone has connected children or not.
     """
@@ -1035,11 +1543,17 @@ def get_layers(layers):
             return [x in layers for x in range(0, 32)]
 
 
-def write_metarig(obj, layers=False, func_name="create", groups=False):
+def write_metarig(obj, layers=False, func_name="create", groups=False, compact=False):
     """
     Write a metarig as a python script, this rig is to have all info needed for
     generating the real rig with rigify.
+    With compact, the metarig is written as json data for
+    metarig_data.create_metarig() instead.
     """
+    if compact:
+        from .metarig_data import write_metarig_data
+        return write_metarig_data(obj, layers=layers, groups=groups)
+
     code = []
 
     code.append("import bpy\n\n")
@@ -1086,9 +1600,7 @@ def write_metarig(obj, layers=False, func_name="create", groups=False):
             code.append('    arm.rigify_layers[' + str(i) + '].group = ' + str(group))
 
     # write parents first
-    bones = [(len(bone.parent_recursive), bone.name) for bone in arm.edit_bones]
-    bones.sort(key=lambda item: item[0])
-    bones = [item[1] for item in bones]
+    bones = sort_bones(arm.edit_bones)
 
     code.append("\n    bones = {}\n")
 
@@ -1164,52 +1676,6 @@ def write_metarig(obj, layers=False, func_name="create", groups=False):
 
     return "\n".join(code)
 
-# POE 2018-07-25 widgets normally are edge represetants so eliminate faces from
-#                mesh building and nicen Vertex list
-def write_widget(obj):
-    """ Write a mesh object as a python script for widget use.
-    """
-    script = ""
-    script += "def create_thing_widget(rig, bone_name, size=1.0, bone_transform_name=None):\n"
-    script += "\tobj = create_widget(rig, bone_name, bone_transform_name)\n"
-    script += "\tif obj != None:\n"
-
-    # Vertices
-    if len(obj.data.vertices) > 0:
-        script += "\t\tverts = ["
-        for v in obj.data.vertices:
-            script += "(" + ("%.4f" % v.co[0]) + "*size, " + ("%.4f" % v.co[1]) + "*size, " + ("%.4f" % v.co[2]) + "*size)\n\t\t\t, "
-        script += "]\n"
-
-    # Edges
-    if len(obj.data.edges) > 0:
-        script += "\t\tedges = ["
-        for e in obj.data.edges:
-            script += "(" + str(e.vertices[0]) + ", " + str(e.vertices[1]) + "), "
-        script += "]\n"
-
-    # Faces
-    if len(obj.data.polygons) > 0:
-        script += "\t\tfaces = ["
-        for f in obj.data.polygons:
-            script += "("
-            for v in f.vertices:
-                script += str(v) + ", "
-            script += "), "
-        script += "]\n"
-
-    # Build mesh
-    script += "\n\t\tmesh = obj.data\n"
-    script += "\t\tmesh.from_pydata(verts, edges, [])\n"
-    script += "\t\tmesh.update()\n"
-    script += "\t\tmesh.update()\n"
-    script += "\t\treturn obj\n"
-    script += "\telse:\n"
-    script += "\t\treturn None\n"
-
-    return script
-
-
 def random_id(length=8):
     """ Generates a random alphanumeric id string.
     """
@@ -1257,61 +1723,48 @@ def gamma_correct(color):
 #=============================================
 
 
-def get_keyed_frames(rig):
-    frames = []
-    if rig.animation_data:
-        if rig.animation_data.action:
-            fcus = rig.animation_data.action.fcurves
-            for fc in fcus:
-                for kp in fc.keyframe_points:
-                    if kp.co[0] not in frames:
-                        frames.append(kp.co[0])
-
-    frames.sort()
+def get_keyed_frames(rig, index=None):
+    if index is None:
+        index = get_rig_keyframe_index(rig)
+    if index is None:
+        return []
+    return list(index.frames)
 
-    return frames
 
-
-def bones_in_frame(f, rig, *args):
+def bones_in_frame(f, rig, *args, index=None):
     """
     True if one of the bones listed in args is animated at frame f
     :param f: the frame
     :param rig: the rig
     :param args: bone names
+    :param index: KeyframeIndex of the rig action, to reuse across frames
     :return:
     """
 
-    if rig.animation_data and rig.animation_data.action:
-        fcus = rig.animation_data.action.fcurves
-    else:
-        return False
+    if index is None:
+        index = get_rig_keyframe_index(rig)
+    return index is not None and index.any_keyed(args, f)
 
-    for fc in fcus:
-        animated_frames = [kp.co[0] for kp in fc.keyframe_points]
-        for bone in args:
-            if bone in fc.data_path.split('"') and f in animated_frames:
-                return True
 
-    return False
-
-
-def overwrite_prop_animation(rig, bone, prop_name, value, frames):
+def overwrite_prop_animation(rig, bone, prop_name, value, frames, index=None):
     act = rig.animation_data.action
     if not act:
         return
 
-    bone_name = bone.name
-    curve = None
-
-    for fcu in act.fcurves:
-        words = fcu.data_path.split('"')
-        if words[0] == "pose.bones[" and words[1] == bone_name and words[-2] == prop_name:
-            curve = fcu
-            break
-
-    if not curve:
+    channel = '["%s"]' % prop_name
+    if index is None:
+        index = get_keyframe_index(act)
+    keyed = index.get_channel(bone.name, channel)
+    if not keyed or not any(is_in(keyed, f) for f in frames):
         return
 
-    for kp in curve.keyframe_points:
-        if kp.co[0] in frames:
-            kp.co[1] = value
+    curve = act.fcurves.find('pose.bones["%s"]%s' % (bone.name, channel))
+    points = curve.keyframe_points
+    co = [0.0] * (len(points) * 2)
+    points.foreach_get('co', co)
+    frames = set(frames)
+    for i in range(0, len(co), 2):
+        if co[i] in frames:
+            co[i + 1] = value
+    points.foreach_set('co', co)
+    curve.update()
@@ -0,0 +1,191 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+""" Widget shape library.
+
+Named widget shapes are stored in one binary file, little endian:
+
+    header:   b'RWGT', uint16 version, uint16 unused, uint32 shape count
+    shapes:   uint16 name length, utf-8 name,
+              uint32 vertex, edge, face and face corner counts,
+              float32 coordinates[3 * vertices],
+              int32 edge vertices[2 * edges],
+              int32 face sizes[faces], int32 face vertices[corners]
+
+The file is read once, and meshes are built from the packed arrays with
+foreach_set() instead of from_pydata().
+"""
+
+import os
+import struct
+import sys
+from array import array
+from collections import namedtuple
+
+LIBRARY_FILE = os.path.join(os.path.dirname(__file__), "widgets.rwl")
+LIBRARY_MAGIC = b"RWGT"
+LIBRARY_VERSION = 1
+
+_HEADER = struct.Struct("<4sHHI")
+_SHAPE_COUNTS = struct.Struct("<IIII")
+_NAME_LENGTH = struct.Struct("<H")
+
+WidgetShape = namedtuple("WidgetShape", ["co", "edges", "face_sizes", "face_verts"])
+
+_libraries = {}  # {filepath: (mtime, {name: WidgetShape})}
+
+
+def _read_array(typecode, data, offset, count):
+    values = array(typecode)
+    end = offset + count * values.itemsize
+    values.frombytes(data[offset:end])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values, end
+
+
+def _array_bytes(typecode, values):
+    values = array(typecode, values)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tobytes()
+
+
+def read_widget_library(filepath=LIBRARY_FILE):
+    """ Reads a widget library file, and returns its {name: WidgetShape}.
+    """
+    with open(filepath, 'rb') as f:
+        data = f.read()
+
+    magic, version, unused, count = _HEADER.unpack_from(data, 0)
+    if magic != LIBRARY_MAGIC or version != LIBRARY_VERSION:
+        raise ValueError("%r is not a version %d widget library" % (filepath, LIBRARY_VERSION))
+    offset = _HEADER.size
+
+    shapes = {}
+    for i in range(count):
+        length, = _NAME_LENGTH.unpack_from(data, offset)
+        offset += _NAME_LENGTH.size
+        name = data[offset:offset + length].decode('utf-8')
+        offset += length
+        verts, edges, faces, corners = _SHAPE_COUNTS.unpack_from(data, offset)
+        offset += _SHAPE_COUNTS.size
+        co, offset = _read_array('f', data, offset, verts * 3)
+        edge_verts, offset = _read_array('i', data, offset, edges * 2)
+        face_sizes, offset = _read_array('i', data, offset, faces)
+        face_verts, offset = _read_array('i', data, offset, corners)
+        shapes[name] = WidgetShape(co, edge_verts, face_sizes, face_verts)
+    return shapes
+
+
+def write_widget_library(shapes, filepath=LIBRARY_FILE):
+    """ Writes {name: WidgetShape} as a widget library file.
+    """
+    chunks = [_HEADER.pack(LIBRARY_MAGIC, LIBRARY_VERSION, 0, len(shapes))]
+    for name in sorted(shapes):
+        shape = shapes[name]
+        encoded = name.encode('utf-8')
+        chunks.append(_NAME_LENGTH.pack(len(encoded)))
+        chunks.append(encoded)
+        chunks.append(_SHAPE_COUNTS.pack(len(shape.co) // 3, len(shape.edges) // 2,
+                                         len(shape.face_sizes), len(shape.face_verts)))
+        chunks.append(_array_bytes('f', shape.co))
+        chunks.append(_array_bytes('i', shape.edges))
+        chunks.append(_array_bytes('i', shape.face_sizes))
+        chunks.append(_array_bytes('i', shape.face_verts))
+
+    with open(filepath, 'wb') as f:
+        f.write(b"".join(chunks))
+    _libraries.pop(filepath, None)
+
+
+def get_widget_library(filepath=LIBRARY_FILE):
+    """ Returns the {name: WidgetShape} of a library file, read once and
+        cached until the file changes.
+    """
+    mtime = os.path.getmtime(filepath)
+    entry = _libraries.get(filepath)
+    if entry is None or entry[0] != mtime:
+        entry = (mtime, read_widget_library(filepath))
+        _libraries[filepath] = entry
+    return entry[1]
+
+
+def get_widget_shape(name, filepath=LIBRARY_FILE):
+    """ Returns the named WidgetShape of the library.
+    """
+    return get_widget_library(filepath)[name]
+
+
+def get_mesh_shape(mesh):
+    """ Returns the WidgetShape of a mesh.
+    """
+    co = array('f', [0.0] * (len(mesh.vertices) * 3))
+    mesh.vertices.foreach_get("co", co)
+    edges = array('i', [0] * (len(mesh.edges) * 2))
+    mesh.edges.foreach_get("vertices", edges)
+
+    face_sizes = array('i', [0] * len(mesh.polygons))
+    mesh.polygons.foreach_get("loop_total", face_sizes)
+    face_starts = array('i', [0] * len(mesh.polygons))
+    mesh.polygons.foreach_get("loop_start", face_starts)
+    loop_verts = array('i', [0] * len(mesh.loops))
+    mesh.loops.foreach_get("vertex_index", loop_verts)
+    face_verts = array('i')
+    for start, size in zip(face_starts, face_sizes):
+        face_verts.extend(loop_verts[start:start + size])
+
+    return WidgetShape(co, edges, face_sizes, face_verts)
+
+
+def add_widget_shape(name, mesh, filepath=LIBRARY_FILE):
+    """ Stores the shape of a mesh in the library under name, replacing
+        the shape of that name if there is one.
+    """
+    shapes = dict(get_widget_library(filepath)) if os.path.exists(filepath) else {}
+    shapes[name] = get_mesh_shape(mesh)
+    write_widget_library(shapes, filepath)
+
+
+def build_widget_mesh(mesh, name, size=1.0, filepath=LIBRARY_FILE):
+    """ Fills an empty mesh with the named library shape, scaled by size.
+    """
+    shape = get_widget_shape(name, filepath)
+    co = shape.co if size == 1.0 else array('f', (c * size for c in shape.co))
+
+    mesh.vertices.add(len(co) // 3)
+    mesh.vertices.foreach_set("co", co)
+    mesh.edges.add(len(shape.edges) // 2)
+    mesh.edges.foreach_set("vertices", shape.edges)
+
+    if shape.face_sizes:
+        face_starts = array('i')
+        start = 0
+        for face_size in shape.face_sizes:
+            face_starts.append(start)
+            start += face_size
+        mesh.loops.add(len(shape.face_verts))
+        mesh.loops.foreach_set("vertex_index", shape.face_verts)
+        mesh.polygons.add(len(shape.face_sizes))
+        mesh.polygons.foreach_set("loop_start", face_starts)
+        mesh.polygons.foreach_set("loop_total", shape.face_sizes)
+
+    mesh.update(calc_edges=bool(shape.face_sizes))
+    return mesh